@@ -1,13 +1,27 @@
+import asyncio
+import functools
 import json
 import requests
+import requests.adapters
+import ssl
 import time
 import warnings
 
 from base64 import b64encode
 
+from assemblyline_client.common.circuit import CircuitBreaker  # noqa: F401
+from assemblyline_client.common.classification_cache import ClassificationCache  # noqa: F401
+from assemblyline_client.common.content_cache import ContentCache  # noqa: F401
+from assemblyline_client.common.rate_limit import RateLimiter  # noqa: F401
+from assemblyline_client.common.response_cache import ResponseCache  # noqa: F401
+from assemblyline_client.common.retry import RETRY_FOREVER, RetryPolicy  # noqa: F401
 from assemblyline_client.v3_client import Client as Client3
 from assemblyline_client.v4_client.client import Client as Client4
-from assemblyline_client.v4_client.common.utils import ClientError
+from assemblyline_client.v4_client.common.json_stream import async_json_lines_stream_output, \
+    async_json_stream_output, json_lines_stream_output, json_stream_output
+from assemblyline_client.v4_client.common.multipart import AsyncMultipartBody, MultipartEncoder
+from assemblyline_client.v4_client.common.submit_utils import KnownHashes
+from assemblyline_client.v4_client.common.utils import CircuitOpenError, ClientError  # noqa: F401
 
 try:
     from importlib import metadata
@@ -15,8 +29,16 @@ try:
 except metadata.PackageNotFoundError:
     __version__ = "4.0.0.dev0"
 
-RETRY_FOREVER = 0
 SUPPORTED_APIS = {'v3', 'v4'}
+DEFAULT_POOL_CONNECTIONS = requests.adapters.DEFAULT_POOLSIZE
+DEFAULT_POOL_MAXSIZE = requests.adapters.DEFAULT_POOLSIZE
+SESSION_ERRORS = [
+    "Session rejected",
+    "Session not found",
+    "Session expired",
+    "Invalid source IP for this session",
+    "Invalid user agent for this session",
+]
 
 
 def convert_api_output(response):
@@ -31,19 +53,92 @@ def Client(*args, **kwargs):
 
 def get_client(server, auth=None, cert=None, debug=lambda x: None, headers=None, retries=RETRY_FOREVER,
                silence_requests_warnings=True, apikey=None, verify=True, timeout=None, oauth=None,
-               proxies=None):
+               proxies=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+               pool_block=False, keep_alive=True, retry_policy=None, circuit_breaker=None, rate_limiter=None,
+               response_cache=None, content_cache=None, classification_cache=None):
+    """\
+Create a client for an Assemblyline server.
+
+Request handling options:
+retries          : Maximum number of retries of a failed request, RETRY_FOREVER (0) never gives up (int)
+retry_policy     : RetryPolicy deciding which failures are retried and how long to wait between
+                   attempts (exponential backoff, jitter, Retry-After, time budget, on_retry hook).
+                   When set, retries is ignored. Defaults to RetryPolicy.legacy(retries).
+                   Daily quota errors (503) are never retried.
+circuit_breaker  : CircuitBreaker that makes calls to a failing API path (api/v4/<module>/<method>)
+                   raise CircuitOpenError right away instead of retrying (default: disabled)
+rate_limiter     : RateLimiter pacing API calls and submissions so the remaining daily quotas
+                   reported by the server last until the end of the quota window (default: disabled)
+response_cache   : ResponseCache keeping the responses of lookups that do not change (file info,
+                   strings, results, heuristics, ...) for a per endpoint TTL (default: disabled)
+content_cache    : ContentCache storing downloaded files and bundles on disk so downloading them
+                   again does not reach the server (default: disabled)
+classification_cache : ClassificationCache storing the compiled classification engine on disk so
+                       get_classification_engine() only asks the server once per max_age (default: disabled)
+
+Connection pool options:
+pool_connections : Number of per host connection pools to keep (int)
+pool_maxsize     : Maximum number of connections kept per host, size it to the number of
+                   threads sharing the client (int)
+pool_block       : Wait for a free connection instead of opening a throw-away one
+                   when all pooled connections are in use (bool)
+keep_alive       : Reuse connections between requests (bool)
+
+Use client.get_pool_stats() to see how the pool is used.
+"""
     connection = Connection(server, auth, cert, debug, headers, retries,
-                            silence_requests_warnings, apikey, verify, timeout, oauth, proxies)
+                            silence_requests_warnings, apikey, verify, timeout, oauth, proxies,
+                            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                            pool_block=pool_block, keep_alive=keep_alive, retry_policy=retry_policy,
+                            circuit_breaker=circuit_breaker, rate_limiter=rate_limiter,
+                            response_cache=response_cache, content_cache=content_cache,
+                            classification_cache=classification_cache)
     if connection.is_v4:
         return Client4(connection)
     else:
         return Client3(connection)
 
 
+async def get_async_client(server, auth=None, cert=None, debug=lambda x: None, headers=None, retries=RETRY_FOREVER,
+                           silence_requests_warnings=True, apikey=None, verify=True, timeout=None, oauth=None,
+                           proxies=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                           pool_block=False, keep_alive=True, retry_policy=None, circuit_breaker=None,
+                           rate_limiter=None, response_cache=None, content_cache=None, classification_cache=None):
+    """\
+Create an asyncio client for an Assemblyline v4 server.
+
+The returned client exposes the same API tree as the one returned by get_client() but
+every API call is a coroutine that has to be awaited. This requires the httpx package.
+The request handling, cache and connection pool options are the same as get_client()
+except pool_connections which does not apply to httpx.
+
+    async with await get_async_client(server, apikey=(user, key)) as client:
+        info = await client.file.info(sha256)
+"""
+    from assemblyline_client.v4_client.async_client import AsyncClient
+
+    connection = AsyncConnection(server, auth, cert, debug, headers, retries,
+                                 silence_requests_warnings, apikey, verify, timeout, oauth, proxies,
+                                 pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                 pool_block=pool_block, keep_alive=keep_alive, retry_policy=retry_policy,
+                                 circuit_breaker=circuit_breaker, rate_limiter=rate_limiter,
+                                 response_cache=response_cache, content_cache=content_cache,
+                                 classification_cache=classification_cache)
+    try:
+        await connection.connect()
+    except BaseException:
+        await connection.close()
+        raise
+    return AsyncClient(connection)
+
+
 class Connection(object):
     def __init__(  # pylint: disable=R0913
         self, server, auth, cert, debug, headers, retries,
-        silence_warnings, apikey, verify, timeout, oauth, proxies
+        silence_warnings, apikey, verify, timeout, oauth, proxies,
+        pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+        keep_alive=True, retry_policy=None, circuit_breaker=None, rate_limiter=None, response_cache=None,
+        content_cache=None, classification_cache=None
     ):
         self.auth = auth
         self.apikey = apikey
@@ -51,6 +146,13 @@ class Connection(object):
         self.debug = debug
         self.is_v4 = False
         self.max_retries = retries
+        self.retry_policy = retry_policy or RetryPolicy.legacy(retries)
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        self.content_cache = content_cache
+        self.classification_cache = classification_cache
+        self.known_hashes = KnownHashes()
         self.server = server
         self.silence_warnings = silence_warnings
         self.verify = verify
@@ -59,21 +161,61 @@ class Connection(object):
         self.remaining_submission_quota = None
         self.current_user = None
         self.proxies = proxies
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+
+        self.session = self._create_session(cert, headers)
+        self._connect()
 
+    def _create_session(self, cert, headers):
         session = requests.Session()
 
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections,
+                                                pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
         session.headers.update({'content-type': 'application/json'})
-        session.verify = verify
+        if not self.keep_alive:
+            session.headers.update({'Connection': 'close'})
+        session.verify = self.verify
 
         if cert:
             session.cert = cert
         if headers:
             session.headers.update(headers)
-        if proxies:
-            session.proxies.update(proxies)
-
-        self.session = session
-
+        if self.proxies:
+            session.proxies.update(self.proxies)
+
+        return session
+
+    def get_pool_stats(self):
+        stats = []
+        for adapter in set(self.session.adapters.values()):
+            managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+            for manager in managers:
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+
+                    # Unused slots of the urllib3 pool queue are filled with None
+                    idle = len([c for c in list(pool.pool.queue) if c is not None]) if pool.pool else 0
+                    maxsize = pool.pool.maxsize if pool.pool else 0
+                    stats.append({
+                        'host': "%s://%s:%s" % (pool.scheme, pool.host, pool.port),
+                        'maxsize': maxsize,
+                        'in_use': maxsize - pool.pool.qsize() if pool.pool else 0,
+                        'idle': idle,
+                        'opened': pool.num_connections,
+                        'requests': pool.num_requests,
+                        'block': pool.block,
+                    })
+        return stats
+
+    def _connect(self):
         try:
             auth_session_detail = self._authenticate()
         except requests.exceptions.SSLError as ssle:
@@ -81,7 +223,7 @@ class Connection(object):
                               "due to the following SSLError: %s" % ssle, 495)
 
         self.current_user = auth_session_detail['username']
-        session.timeout = auth_session_detail['session_duration']
+        self.session.timeout = auth_session_detail['session_duration']
 
         r = self.request(self.session.get, 'api/', convert_api_output)
         if not isinstance(r, list) or not set(r).intersection(SUPPORTED_APIS):
@@ -99,6 +241,24 @@ class Connection(object):
         key = RSA.importKey(public_key)
         return PKCS1_v1_5.new(key)
 
+    def _get_v4_auth(self):
+        if self.apikey and len(self.apikey) == 2:
+            return {
+                'user': self.apikey[0],
+                'apikey': self.apikey[1]
+            }
+        elif self.auth and len(self.auth) == 2:
+            return {
+                'user': self.auth[0],
+                'password': self.auth[1]
+            }
+        elif self.oauth and len(self.oauth) == 2:
+            return {
+                "oauth_provider": self.oauth[0],
+                "oauth_token": self.oauth[1]
+            }
+        return {}
+
     def _authenticate(self):
         try:
             public_key = self._load_public_encryption_key()
@@ -111,24 +271,8 @@ class Connection(object):
                 raise
 
         if self.is_v4:
-            if self.apikey and len(self.apikey) == 2:
-                auth = {
-                    'user': self.apikey[0],
-                    'apikey': self.apikey[1]
-                }
-            elif self.auth and len(self.auth) == 2:
-                auth = {
-                    'user': self.auth[0],
-                    'password': self.auth[1]
-                }
-            elif self.oauth and len(self.oauth) == 2:
-                auth = {
-                    "oauth_provider": self.oauth[0],
-                    "oauth_token": self.oauth[1]
-                }
-            else:
-                auth = {}
-            return self.request(self.session.post, "api/v4/auth/login/", convert_api_output, data=json.dumps(auth))
+            return self.request(self.session.post, "api/v4/auth/login/", convert_api_output,
+                                data=json.dumps(self._get_v4_auth()))
         else:
             if self.apikey and len(self.apikey) == 2:
                 if public_key:
@@ -159,101 +303,398 @@ class Connection(object):
     def delete(self, path, **kw):
         return self.request(self.session.delete, path, convert_api_output, **kw)
 
-    def download(self, path, process, **kw):
+    def download(self, path, process, cache_key=None, sha256=None, **kw):
+        # cache_key identifies downloads that can be served from the content cache,
+        # sha256 is the hash of the content when it is known in advance
+        if self.content_cache is not None and cache_key:
+            cached = self.content_cache.lookup(cache_key, sha256=sha256)
+            if cached is not None:
+                return process(cached)
+            process = functools.partial(self.content_cache.store, cache_key, process, sha256=sha256)
         return self.request(self.session.get, path, process, **kw)
 
+    def _get_identity(self):
+        # Who the requests are sent for, cached responses are only shared by requests of the same identity
+        headers = self.session.headers
+        return self.server, self.current_user, headers.get('authorization'), headers.get('x-token-provider')
+
     def get(self, path, **kw):
+        if self.response_cache is not None:
+            identity = self._get_identity()
+            hit, output = self.response_cache.lookup(path, identity=identity)
+            if hit:
+                return output
+            return self.request(self.session.get, path,
+                                functools.partial(self.response_cache.store, path, identity=identity), **kw)
         return self.request(self.session.get, path, convert_api_output, **kw)
 
+    def iter_json(self, path, containers, method='get', members_only=False, **kw):
+        # Decodes the response while it is received, yielding the members of the given
+        # containers of the api_response one by one (see json_stream_output)
+        return self.request(getattr(self.session, method), path, json_stream_output(containers, members_only),
+                            stream=True, **kw)
+
+    def iter_json_lines(self, path, fields=None, filter=None, **kw):
+        # Yields the records of a newline delimited JSON response while it is received
+        # (see json_lines_stream_output)
+        return self.request(self.session.get, path, json_lines_stream_output(fields, filter), stream=True, **kw)
+
     def post(self, path, **kw):
         return self.request(self.session.post, path, convert_api_output, **kw)
 
     def put(self, path, **kw):
         return self.request(self.session.put, path, convert_api_output, **kw)
 
+    def _load_response_state(self, response):
+        if 'XSRF-TOKEN' in response.cookies:
+            self.session.headers.update({'X-XSRF-TOKEN': response.cookies['XSRF-TOKEN']})
+
+        # Load remaining quotas if present
+        apiQuota = response.headers.get('X-Remaining-Quota-Api')
+        if apiQuota is not None:
+            self.remaining_api_quota = int(apiQuota)
+        submissionQuota = response.headers.get('X-Remaining-Quota-Submission')
+        if submissionQuota is not None:
+            self.remaining_submission_quota = int(submissionQuota)
+
+        if self.rate_limiter and (apiQuota is not None or submissionQuota is not None):
+            self.rate_limiter.update(self.remaining_api_quota, self.remaining_submission_quota)
+
+    def _check_error(self, response):
+        # Raises a ClientError for errors that cannot be retried. Returns True if the
+        # session needs to be re-authenticated before the request is retried.
+        if response.status_code == 401:
+            try:
+                resp_data = response.json()
+                if resp_data["api_error_message"] in SESSION_ERRORS:
+                    return True
+
+                raise ClientError(resp_data["api_error_message"], response.status_code,
+                                  api_version=resp_data["api_server_version"],
+                                  api_response=resp_data["api_response"])
+            except Exception as e:
+                if isinstance(e, ClientError):
+                    raise
+
+                raise ClientError(response.content, response.status_code)
+
+        elif response.status_code == 503:
+            try:
+                resp_data = response.json()
+                if 'quota' in resp_data["api_error_message"] and 'daily' in resp_data["api_error_message"]:
+                    raise ClientError(resp_data["api_error_message"], response.status_code,
+                                      api_version=resp_data["api_server_version"],
+                                      api_response=resp_data["api_response"])
+            except Exception as e:
+                if isinstance(e, ClientError):
+                    raise
+
+                raise ClientError(response.content, response.status_code)
+
+        if not self.retry_policy.is_retryable(response.status_code):
+            try:
+                resp_data = response.json()
+                raise ClientError(resp_data["api_error_message"], response.status_code,
+                                  api_version=resp_data["api_server_version"],
+                                  api_response=resp_data["api_response"])
+            except Exception as e:
+                if isinstance(e, ClientError):
+                    raise
+
+                raise ClientError(response.content, response.status_code)
+
+        return False
+
+    def _enter_circuit(self, path):
+        if self.circuit_breaker is None:
+            return None
+        return self.circuit_breaker.before_request(path)
+
+    def _exit_circuit(self, circuit, response):
+        if circuit is not None:
+            self.circuit_breaker.after_request(circuit, response)
+
+    @staticmethod
+    def _rewind_upload(kw):
+        # Uploads are either a file in files or a streamed multipart body in data (content for httpx)
+        for stream in ((kw.get('files') or {}).get('bin', None), kw.get('data'), kw.get('content')):
+            if stream is not None and 'seek' in dir(stream):
+                stream.seek(0)
+
     def request(self, func, path, process, **kw):
         self.debug(path)
 
         # Apply default timeout parameter if not passed elsewhere
         kw.setdefault('timeout', self.default_timeout)
 
-        retries = 0
+        start = time.time()
+        attempt = 0
         with warnings.catch_warnings():
             if self.silence_warnings:
                 warnings.simplefilter('ignore')
-            while self.max_retries < 1 or retries <= self.max_retries:
-                if retries:
-                    time.sleep(min(2, 2 ** (retries - 7)))
-                    stream = kw.get('files', {}).get('bin', None)
-                    if stream and 'seek' in dir(stream):
-                        stream.seek(0)
-
+            while True:
+                response, error = None, None
+                if self.rate_limiter:
+                    time.sleep(self.rate_limiter.acquire(path))
+                circuit = self._enter_circuit(path)
                 try:
-                    response = func('/'.join((self.server, path)), **kw)
-                    if 'XSRF-TOKEN' in response.cookies:
-                        self.session.headers.update({'X-XSRF-TOKEN': response.cookies['XSRF-TOKEN']})
-
-                    # Load remaining quotas if present
-                    apiQuota = response.headers.get('X-Remaining-Quota-Api')
-                    if apiQuota is not None:
-                        self.remaining_api_quota = int(apiQuota)
-                    submissionQuota = response.headers.get('X-Remaining-Quota-Submission')
-                    if submissionQuota is not None:
-                        self.remaining_submission_quota = int(submissionQuota)
+                    try:
+                        response = func('/'.join((self.server, path)), **kw)
+                    finally:
+                        self._exit_circuit(circuit, response)
+                    self._load_response_state(response)
 
                     if response.ok:
                         return process(response)
-                    elif response.status_code == 401:
-                        try:
-                            resp_data = response.json()
-                            if resp_data["api_error_message"] in ["Session rejected",
-                                                                  "Session not found",
-                                                                  "Session expired",
-                                                                  "Invalid source IP for this session",
-                                                                  "Invalid user agent for this session"]:
-                                self._authenticate()
-                            else:
-                                raise ClientError(resp_data["api_error_message"], response.status_code,
-                                                  api_version=resp_data["api_server_version"],
-                                                  api_response=resp_data["api_response"])
-                        except Exception as e:
-                            if isinstance(e, ClientError):
-                                raise
-
-                            raise ClientError(response.content, response.status_code)
-
-                    elif response.status_code == 503:
-                        try:
-                            resp_data = response.json()
-                            if 'quota' in resp_data["api_error_message"] and 'daily' in resp_data["api_error_message"]:
-                                raise ClientError(resp_data["api_error_message"], response.status_code,
-                                                  api_version=resp_data["api_server_version"],
-                                                  api_response=resp_data["api_response"])
-                        except Exception as e:
-                            if isinstance(e, ClientError):
-                                raise
-
-                            raise ClientError(response.content, response.status_code)
-
-                    elif response.status_code not in (502, 504):
-                        try:
-                            resp_data = response.json()
-                            raise ClientError(resp_data["api_error_message"], response.status_code,
-                                              api_version=resp_data["api_server_version"],
-                                              api_response=resp_data["api_response"])
-                        except Exception as e:
-                            if isinstance(e, ClientError):
-                                raise
-
-                            raise ClientError(response.content, response.status_code)
+                    elif self._check_error(response):
+                        self._authenticate()
                 except (requests.exceptions.SSLError, requests.exceptions.ProxyError):
                     raise
-                except requests.exceptions.ConnectionError:
-                    pass
+                except requests.exceptions.ConnectionError as e:
+                    error = e
                 except OSError as e:
                     if "Connection aborted" not in str(e):
                         raise
+                    error = e
+
+                if circuit:
+                    self.circuit_breaker.raise_if_open(circuit)
+
+                attempt += 1
+                delay = self.retry_policy.next_delay(path, attempt, start, response=response, error=error)
+                if delay is None:
+                    break
+
+                time.sleep(delay)
+                self._rewind_upload(kw)
+
+            raise ClientError("Max retry reached, could not perform the request.", 429)
+
+
+def _is_ssl_error(e):
+    while e is not None:
+        if isinstance(e, ssl.SSLError):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+class AsyncConnection(Connection):
+    """\
+Connection to an Assemblyline v4 server using the non-blocking httpx engine.
+
+Every request method returns a coroutine. The connection is not usable until connect() has been awaited.
+"""
+
+    def _create_session(self, cert, headers):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("The asyncio client requires the httpx package: "
+                              "pip install assemblyline-client[async]")
+
+        self._httpx = httpx
+
+        # httpx does not open throw-away connections, without pool_block the number of connections is not capped
+        limits = httpx.Limits(max_connections=self.pool_maxsize if self.pool_block else None,
+                              max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0)
+
+        mounts = None
+        if self.proxies:
+            mounts = {
+                f"{scheme}://": httpx.AsyncHTTPTransport(proxy=url, verify=self.verify, cert=cert, limits=limits)
+                for scheme, url in self.proxies.items()
+            }
+
+        # The content-type is set per request so multipart uploads can provide their own boundary
+        return httpx.AsyncClient(headers=headers, verify=self.verify, cert=cert, mounts=mounts, limits=limits,
+                                 follow_redirects=True)
+
+    def _count_pool_connections(self):
+        # httpx does not expose its connection pools, they are reached through private attributes and
+        # None is returned when they are not available. The connections themselves are only used through
+        # the public httpcore interface.
+        try:
+            import httpcore
+
+            url = self._httpx.URL(self.server)
+            origin = httpcore.Origin(url.raw_scheme, url.raw_host, url.port or {'https': 443}.get(url.scheme, 80))
+            transports = [self.session._transport] + [t for t in self.session._mounts.values() if t is not None]
+            connections = [c for t in transports for c in t._pool.connections]
+        except (AttributeError, ImportError, TypeError):
+            return None
+
+        in_use = idle = 0
+        for conn in connections:
+            if conn.can_handle_request(origin):
+                if conn.is_idle():
+                    idle += 1
+                else:
+                    in_use += 1
+        return in_use, idle
+
+    def get_pool_stats(self):
+        stats = {
+            'host': self.server,
+            'maxsize': self.pool_maxsize,
+            'block': self.pool_block,
+        }
+        # Connection counts are left out if the httpx internals they come from changed
+        counts = self._count_pool_connections()
+        if counts is not None:
+            stats['in_use'], stats['idle'] = counts
+        return [stats]
+
+    def _connect(self):
+        # The handshake with the server is done by the connect() coroutine
+        pass
+
+    async def connect(self):
+        try:
+            auth_session_detail = await self._authenticate()
+        except self._httpx.ConnectError as ce:
+            if not _is_ssl_error(ce):
+                raise
+            raise ClientError("Client could not connect to the server "
+                              "due to the following SSLError: %s" % ce, 495)
+
+        self.current_user = auth_session_detail['username']
+        self.session_duration = auth_session_detail['session_duration']
+
+        r = await self.request(self.session.get, 'api/', convert_api_output)
+        if not isinstance(r, list) or 'v4' not in r:
+            raise ClientError("Supported APIS (%s) are not available" % {'v4'}, 400)
+
+    async def close(self):
+        await self.session.aclose()
+
+    async def _authenticate(self):
+        if not self.is_v4:
+            try:
+                await self.request(self.session.get, "api/v3/auth/init/", convert_api_output)
+            except ClientError as ce:
+                if ce.status_code != 404:
+                    raise
+                self.is_v4 = True
+            else:
+                raise ClientError("The asyncio client only supports Assemblyline v4 servers", 400)
+
+        return await self.request(self._method('POST'), "api/v4/auth/login/", convert_api_output,
+                                  data=json.dumps(self._get_v4_auth()))
+
+    def _method(self, method):
+        return functools.partial(self.session.request, method)
+
+    def _stream_method(self, method):
+        async def _send(url, **kw):
+            response = await self.session.send(self.session.build_request(method, url, **kw), stream=True)
+            if not response.is_success:
+                # Errors are read whole so they can be checked like any other response
+                await response.aread()
+            return response
+        return _send
+
+    def delete(self, path, **kw):
+        return self.request(self._method('DELETE'), path, convert_api_output, **kw)
+
+    async def download(self, path, process, cache_key=None, sha256=None, **kw):
+        if self.content_cache is not None and cache_key:
+            cached = self.content_cache.lookup(cache_key, sha256=sha256)
+            if cached is not None:
+                return process(cached)
+            process = functools.partial(self.content_cache.store, cache_key, process, sha256=sha256)
+        return await self.request(self._method('GET'), path, process, **kw)
+
+    async def get(self, path, **kw):
+        if self.response_cache is not None:
+            identity = self._get_identity()
+            hit, output = self.response_cache.lookup(path, identity=identity)
+            if hit:
+                return output
+            return await self.request(self._method('GET'), path,
+                                      functools.partial(self.response_cache.store, path, identity=identity), **kw)
+        return await self.request(self._method('GET'), path, convert_api_output, **kw)
+
+    async def iter_json(self, path, containers, method='get', members_only=False, **kw):
+        items = await self.request(self._stream_method(method.upper()), path,
+                                   async_json_stream_output(containers, members_only), **kw)
+        async for item in items:
+            yield item
+
+    async def iter_json_lines(self, path, fields=None, filter=None, **kw):
+        records = await self.request(self._stream_method('GET'), path, async_json_lines_stream_output(fields, filter),
+                                     **kw)
+        async for record in records:
+            yield record
+
+    def post(self, path, **kw):
+        return self.request(self._method('POST'), path, convert_api_output, **kw)
+
+    def put(self, path, **kw):
+        return self.request(self._method('PUT'), path, convert_api_output, **kw)
+
+    @staticmethod
+    def _prepare_kw(kw):
+        # Translate requests style parameters to their httpx equivalent
+        headers = {k: v for k, v in (kw.pop('headers', None) or {}).items() if v is not None}
+        data = kw.pop('data', None)
+        if isinstance(data, (str, bytes)):
+            kw['content'] = data
+            headers.setdefault('content-type', 'application/json')
+        elif isinstance(data, MultipartEncoder):
+            # Streamed multipart body, its headers are provided by the caller
+            kw['content'] = AsyncMultipartBody(data)
+        elif data is not None:
+            kw['data'] = data
+        if not kw.get('files'):
+            kw.pop('files', None)
+        kw['headers'] = headers
+        return kw
+
+    async def request(self, func, path, process, **kw):
+        httpx = self._httpx
+        self.debug(path)
+
+        # Apply default timeout parameter if not passed elsewhere
+        kw.setdefault('timeout', self.default_timeout)
+        kw = self._prepare_kw(kw)
+
+        start = time.time()
+        attempt = 0
+        with warnings.catch_warnings():
+            if self.silence_warnings:
+                warnings.simplefilter('ignore')
+            while True:
+                response, error = None, None
+                if self.rate_limiter:
+                    await asyncio.sleep(self.rate_limiter.acquire(path))
+                circuit = self._enter_circuit(path)
+                try:
+                    try:
+                        response = await func('/'.join((self.server, path)), **kw)
+                    finally:
+                        self._exit_circuit(circuit, response)
+                    self._load_response_state(response)
+
+                    if response.is_success:
+                        return process(response)
+                    elif self._check_error(response):
+                        await self._authenticate()
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError, httpx.WriteError,
+                        httpx.RemoteProtocolError) as e:
+                    if _is_ssl_error(e):
+                        raise
+                    error = e
+
+                if circuit:
+                    self.circuit_breaker.raise_if_open(circuit)
+
+                attempt += 1
+                delay = self.retry_policy.next_delay(path, attempt, start, response=response, error=error)
+                if delay is None:
+                    break
 
-                retries += 1
+                await asyncio.sleep(delay)
+                self._rewind_upload(kw)
 
             raise ClientError("Max retry reached, could not perform the request.", 429)
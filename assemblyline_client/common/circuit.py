@@ -0,0 +1,150 @@
+import threading
+import time
+
+from assemblyline_client.v4_client.common.utils import CircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1, prefix_depth=4,
+                 on_state_change=None):
+        """
+        Stops sending requests to an API path prefix once it keeps failing.
+
+        Every prefix (api/v4/<module>/<method> by default) has its own circuit. After failure_threshold
+        consecutive failures the circuit opens and calls to that prefix raise a CircuitOpenError without
+        reaching the server. Once recovery_timeout has passed, up to half_open_max_calls probe requests
+        are let through: a successful probe closes the circuit, a failed one opens it again.
+
+        A failure is a request that did not get a response or that got a 5xx response.
+
+        Args:
+            failure_threshold: Number of consecutive failures that opens a circuit
+            recovery_timeout: Number of seconds a circuit stays open before it is probed
+            half_open_max_calls: Number of concurrent probe requests allowed on a half-open circuit
+            prefix_depth: Number of path segments used to key the circuits
+            on_state_change: Hook called with (prefix, old_state, new_state) when a circuit changes state
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.prefix_depth = prefix_depth
+        self.on_state_change = on_state_change
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def get_prefix(self, path):
+        parts = [p for p in path.split('?', 1)[0].split('/') if p]
+        return '/'.join(parts[:self.prefix_depth])
+
+    @staticmethod
+    def is_failure(response):
+        return response is None or response.status_code >= 500
+
+    @staticmethod
+    def _set_state(circuit, state):
+        old_state, circuit.state = circuit.state, state
+        if state == OPEN:
+            circuit.opened_at = time.time()
+        elif state == CLOSED:
+            circuit.failures = 0
+            circuit.opened_at = None
+        return old_state, state
+
+    def _notify(self, prefix, change):
+        if change and self.on_state_change and change[0] != change[1]:
+            self.on_state_change(prefix, *change)
+
+    def _open_error(self, prefix, circuit):
+        retry_in = max(0.0, circuit.opened_at + self.recovery_timeout - time.time())
+        return CircuitOpenError(prefix, retry_in)
+
+    def before_request(self, path):
+        """
+        Returns the prefix of the circuit the request goes through or raises a CircuitOpenError
+        if the circuit does not let the request through.
+        """
+        prefix = self.get_prefix(path)
+        change = None
+        with self._lock:
+            circuit = self._circuits.setdefault(prefix, _Circuit())
+            if circuit.state == OPEN:
+                if time.time() - circuit.opened_at < self.recovery_timeout:
+                    raise self._open_error(prefix, circuit)
+                change = self._set_state(circuit, HALF_OPEN)
+                circuit.probes = 0
+
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= self.half_open_max_calls:
+                    raise CircuitOpenError(prefix, 0.0)
+                circuit.probes += 1
+
+        self._notify(prefix, change)
+        return prefix
+
+    def after_request(self, prefix, response):
+        """
+        Records the outcome of a request let through by before_request.
+        """
+        change = None
+        with self._lock:
+            circuit = self._circuits.setdefault(prefix, _Circuit())
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+
+            if not self.is_failure(response):
+                if circuit.state != CLOSED:
+                    change = self._set_state(circuit, CLOSED)
+                circuit.failures = 0
+            elif circuit.state == HALF_OPEN:
+                change = self._set_state(circuit, OPEN)
+            elif circuit.state == CLOSED:
+                circuit.failures += 1
+                if circuit.failures >= self.failure_threshold:
+                    change = self._set_state(circuit, OPEN)
+
+        self._notify(prefix, change)
+
+    def raise_if_open(self, prefix):
+        """
+        Raises a CircuitOpenError if the circuit is open so retries of a request stop right away.
+        """
+        with self._lock:
+            circuit = self._circuits.get(prefix)
+            if circuit is not None and circuit.state == OPEN:
+                raise self._open_error(prefix, circuit)
+
+    def get_states(self):
+        """
+        Returns the state of every known circuit keyed by API path prefix.
+        """
+        with self._lock:
+            return {
+                prefix: {
+                    'state': circuit.state,
+                    'failures': circuit.failures,
+                    'opened_at': circuit.opened_at,
+                }
+                for prefix, circuit in self._circuits.items()
+            }
+
+    def reset(self, prefix=None):
+        """
+        Closes one circuit or all of them.
+        """
+        with self._lock:
+            if prefix is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(prefix, None)
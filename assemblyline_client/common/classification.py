@@ -1,3 +1,14 @@
+import functools
+import hashlib
+import json
+import threading
+
+# Number of parsed classifications kept in memory by default, see Classification.__init__
+PARTS_CACHE_SIZE = 8192
+
+# Version of the format written by Classification.dumps
+COMPILED_FORMAT = 1
+
 
 class InvalidClassification(Exception):
     pass
@@ -7,6 +18,14 @@ class InvalidDefinition(Exception):
     pass
 
 
+def get_definition_hash(classification_definition):
+    """
+    Returns the sha256 of a classification definition, it does not depend on the order of its keys.
+    """
+    data = json.dumps(classification_definition, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
 class Classification(object):
     MIN_LVL = 1
     MAX_LVL = 10000
@@ -15,13 +34,17 @@ class Classification(object):
     NULL_CLASSIFICATION = "NULL"
     INVALID_CLASSIFICATION = "INVALID"
 
-    def __init__(self, classification_definition):
+    def __init__(self, classification_definition, parts_cache_size=PARTS_CACHE_SIZE, compiled=True):
         """
         Returns the classification class instantiated with the classification_definition
 
         Args:
             classification_definition:  The classification definition dictionary,
                                         see default classification.yml for an example.
+            parts_cache_size:           Number of parsed classifications kept in a LRU cache so the
+                                        same markings are not parsed over and over, 0 to disable it.
+            compiled:                   Compare classifications as bitmasks of their required markings,
+                                        groups and subgroups instead of sets of names.
         """
         banned_params_keys = ['name', 'short_name', 'lvl', 'aliases', 'auto_select', 'css', 'description']
         self.original_definition = classification_definition
@@ -46,8 +69,14 @@ class Classification(object):
         self.params_map = {}
         self.description = {}
         self.invalid_mode = False
-        self._classification_cache = set()
-        self._classification_cache_short = set()
+        self.compiled = compiled
+        self._init_caches(parts_cache_size)
+
+        # Bit positions of the required markings, groups and subgroups (short names) for the compiled mode
+        self._req_bits = {}
+        self._group_bits = {}
+        self._subgroup_bits = {}
+        self._bit_names = {}
 
         self.enforce = False
         self.dynamic_groups = False
@@ -155,6 +184,9 @@ class Classification(object):
                 self.description[short_name] = x.get('description', "N/A")
                 self.description[name] = self.description[short_name]
 
+            self._build_indexes()
+            self._compile_bits()
+
             if not self.is_valid(classification_definition['unrestricted']):
                 raise InvalidDefinition("Classification definition's unrestricted classification is invalid.")
 
@@ -175,9 +207,69 @@ class Classification(object):
 
             raise
 
+    # Attributes rebuilt when a compiled engine is loaded instead of being serialized
+    _TRANSIENT = ('_classification_cache', '_classification_cache_short', '_parts_cache', '_masks_cache',
+                  '_bits_lock', 'compiled', '_groups_alias_index', '_require_lvl', '_required_groups',
+                  '_require_group', '_limited_to_group', '_solitary_display_name')
+
+    def dumps(self):
+        """
+        Serializes the compiled engine so it can be loaded without parsing the definition again.
+
+        Returns:
+            The engine as JSON bytes tagged with the hash of its definition
+        """
+        with self._bits_lock:
+            state = {k: v for k, v in self.__dict__.items() if k not in self._TRANSIENT}
+            data = json.dumps({
+                'format': COMPILED_FORMAT,
+                'hash': get_definition_hash(self.original_definition),
+                'state': state,
+            }, separators=(',', ':'), default=str)
+        return data.encode()
+
+    @classmethod
+    def loads(cls, data, parts_cache_size=PARTS_CACHE_SIZE, compiled=True, definition_hash=None):
+        """
+        Loads an engine serialized by dumps.
+
+        Args:
+            data: Output of dumps
+            parts_cache_size: Number of parsed classifications kept in a LRU cache
+            compiled: Compare classifications as bitmasks
+            definition_hash: Expected hash of the definition of the engine
+
+        Returns:
+            The classification engine
+        """
+        try:
+            doc = json.loads(data)
+            if doc['format'] != COMPILED_FORMAT:
+                raise InvalidDefinition("Unsupported compiled classification format: %s" % doc['format'])
+            if definition_hash is not None and doc['hash'] != definition_hash:
+                raise InvalidDefinition("Compiled classification does not match the definition")
+            state = doc['state']
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidDefinition("Invalid compiled classification: %s" % e)
+
+        engine = cls.__new__(cls)
+        engine.__dict__.update(state)
+        engine._bit_names = {k: tuple(v) for k, v in state['_bit_names'].items()}
+        engine.compiled = compiled
+        engine._init_caches(parts_cache_size)
+        engine._build_indexes()
+        return engine
+
     ############################
     # Private functions
     ############################
+    def _init_caches(self, parts_cache_size):
+        self._classification_cache = set()
+        self._classification_cache_short = set()
+        self._parts_cache = functools.lru_cache(maxsize=parts_cache_size)(self._parse_classification_parts)
+        self._masks_cache = functools.lru_cache(maxsize=parts_cache_size)(self._compile_classification)
+        self._bits_lock = threading.Lock()
+
     @staticmethod
     def _list_items_and_aliases(data, long_format=True):
         items = set()
@@ -300,13 +392,13 @@ class Classification(object):
 
         # Check if there are any required group assignments
         for subgroup in g2_set:
-            required = self.params_map.get(subgroup, {}).get("require_group", None)
+            required = self._require_group.get(subgroup, None)
             if required:
                 g1_set.add(required)
 
         # Check if there are any forbidden group assignments
         for subgroup in g2_set:
-            limited_to_group = self.params_map.get(subgroup, {}).get("limited_to_group", None)
+            limited_to_group = self._limited_to_group.get(subgroup, None)
             if limited_to_group is not None:
                 if len(g1_set) > 1 or (len(g1_set) == 1 and g1_set != set([limited_to_group])):
                     raise InvalidClassification(f"Subgroup {subgroup} is limited to group "
@@ -349,13 +441,13 @@ class Classification(object):
         # 1. Check for all required items if they need a specific classification lvl
         required_lvl_idx = 0
         for r in req:
-            required_lvl_idx = max(required_lvl_idx, self.params_map.get(r, {}).get("require_lvl", 0))
+            required_lvl_idx = max(required_lvl_idx, self._require_lvl.get(r, 0))
         out = self._get_c12n_level_text(max(lvl_idx, required_lvl_idx), long_format=long_format)
 
         # 2. Check for all required items if they should be shown inside the groups display part
         req_grp = []
         for r in req:
-            if self.params_map.get(r, {}).get('is_required_group'):
+            if r in self._required_groups:
                 req_grp.append(r)
         req = list(set(req).difference(set(req_grp)))
 
@@ -375,11 +467,11 @@ class Classification(object):
         # 4. For every subgroup, check if the subgroup requires or is limited to a specific group
         temp_groups = []
         for sg in subgroups:
-            required_group = self.params_map.get(sg, {}).get("require_group", None)
+            required_group = self._require_group.get(sg, None)
             if required_group is not None:
                 temp_groups.append(required_group)
 
-            limited_to_group = self.params_map.get(sg, {}).get("limited_to_group", None)
+            limited_to_group = self._limited_to_group.get(sg, None)
             if limited_to_group is not None:
                 if limited_to_group in temp_groups:
                     temp_groups = [limited_to_group]
@@ -407,7 +499,7 @@ class Classification(object):
             if len(groups) == 1:
                 # 6. If only one group, check if it has a solitary display name.
                 grp = groups[0]
-                display_name = self.params_map.get(grp, {}).get('solitary_display_name', grp)
+                display_name = self._solitary_display_name.get(grp, grp)
                 if display_name != grp:
                     out += display_name
                 else:
@@ -415,10 +507,9 @@ class Classification(object):
             else:
                 if not long_format:
                     # 7. In short format mode, check if there is an alias that can replace multiple groups
-                    for alias, values in self.groups_aliases.items():
-                        if len(values) > 1:
-                            if sorted(values) == groups:
-                                groups = [alias]
+                    alias = self._groups_alias_index.get(frozenset(groups), None)
+                    if alias is not None:
+                        groups = [alias]
                 out += group_delim + ", ".join(sorted(groups))
 
         if subgroups:
@@ -438,6 +529,98 @@ class Classification(object):
             auto_select=False,
             ignore_unused=False
     ):
+        # Cached parts are immutable, callers get their own lists since some of them modify them
+        lvl_idx, req, groups, subgroups = self._parts_cache(c12n, long_format, get_dynamic_groups, auto_select,
+                                                            ignore_unused)
+        return lvl_idx, list(req), list(groups), list(subgroups)
+
+    def _build_indexes(self):
+        # Lookup tables of the definition used while normalizing classifications, keyed by short and long names
+        def param_table(key):
+            return {k: v[key] for k, v in self.params_map.items() if v.get(key) is not None}
+
+        self._require_lvl = param_table('require_lvl')
+        self._required_groups = {k for k, v in self.params_map.items() if v.get('is_required_group')}
+        self._require_group = param_table('require_group')
+        self._limited_to_group = param_table('limited_to_group')
+        self._solitary_display_name = param_table('solitary_display_name')
+
+        # Aliases covering many groups, the last alias defined for a set of groups wins
+        self._groups_alias_index = {}
+        for alias, values in self.groups_aliases.items():
+            if len(values) > 1:
+                self._groups_alias_index[frozenset(values)] = alias
+
+    def _compile_bits(self):
+        for bits, names_stl, kind in ((self._req_bits, self.access_req_map_stl, 'req'),
+                                      (self._group_bits, self.groups_map_stl, 'groups'),
+                                      (self._subgroup_bits, self.subgroups_map_stl, 'subgroups')):
+            self._bit_names[kind] = ([], [])
+            for short_name in names_stl:
+                self._add_bit(bits, kind, short_name, names_stl)
+
+    def _add_bit(self, bits, kind, short_name, names_stl):
+        short_names, long_names = self._bit_names[kind]
+        bits[short_name] = 1 << len(short_names)
+        short_names.append(short_name)
+        long_names.append(names_stl.get(short_name, short_name))
+
+    def _get_bit(self, bits, kind, name, names_stl):
+        bit = bits.get(name)
+        if bit is None:
+            # Dynamic groups are not part of the definition, they get a bit the first time they are seen
+            with self._bits_lock:
+                if name not in bits:
+                    self._add_bit(bits, kind, name, names_stl)
+                bit = bits[name]
+        return bit
+
+    def _compile_classification(self, c12n, auto_select):
+        lvl_idx, req, groups, subgroups = self._parts_cache(c12n, False, True, auto_select, False)
+        req_mask = 0
+        for r in req:
+            req_mask |= self._req_bits[r]
+        groups_mask = 0
+        for g in groups:
+            groups_mask |= self._get_bit(self._group_bits, 'groups', g, self.groups_map_stl)
+        subgroups_mask = 0
+        for g in subgroups:
+            subgroups_mask |= self._subgroup_bits[g]
+        return int(lvl_idx), req_mask, groups_mask, subgroups_mask
+
+    def _get_classification_masks(self, c12n, auto_select=False):
+        # Returns the level and the bitmasks of the required markings, groups and subgroups of a classification
+        return self._masks_cache(c12n, auto_select)
+
+    def _get_mask_names(self, kind, mask, long_format=True):
+        names = self._bit_names[kind][1 if long_format else 0]
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(names[low.bit_length() - 1])
+            mask ^= low
+        return sorted(out)
+
+    def _get_masks_text(self, lvl_idx, req, groups, subgroups, long_format=True, skip_auto_select=False):
+        return self._get_normalized_classification_text(lvl_idx,
+                                                        self._get_mask_names('req', req, long_format),
+                                                        self._get_mask_names('groups', groups, long_format),
+                                                        self._get_mask_names('subgroups', subgroups, long_format),
+                                                        long_format=long_format,
+                                                        skip_auto_select=skip_auto_select)
+
+    @staticmethod
+    def _max_masks(mask_1, mask_2, names_1, names_2):
+        if mask_1 and mask_2:
+            mask = mask_1 & mask_2
+            if not mask:
+                # NOTE: Intersection generated nothing, we will raise an InvalidClassification exception
+                raise InvalidClassification("Could not find any intersection between the groups. %s & %s" %
+                                            (names_1(), names_2()))
+            return mask
+        return mask_1 | mask_2
+
+    def _parse_classification_parts(self, c12n, long_format, get_dynamic_groups, auto_select, ignore_unused):
         lvl_idx, unused = self._get_c12n_level_index(c12n)
         req, unused_parts = self._get_c12n_required(unused, long_format=long_format)
         groups, subgroups, unused_parts = self._get_c12n_groups(unused_parts, long_format=long_format,
@@ -447,7 +630,7 @@ class Classification(object):
         if unused_parts and not ignore_unused:
             raise InvalidClassification(f"Unparsable classification parts: {''.join(unused_parts)}")
 
-        return lvl_idx, req, groups, subgroups
+        return lvl_idx, tuple(req), tuple(groups), tuple(subgroups)
 
     @staticmethod
     def _max_groups(groups_1, groups_2):
@@ -485,7 +668,7 @@ class Classification(object):
         to enforce classification throughout the system.
         """
         from copy import deepcopy
-        out = deepcopy(self.__dict__)
+        out = deepcopy({k: v for k, v in self.__dict__.items() if not k.startswith('_')})
         out['levels_map'].pop("INV", None)
         out['levels_map'].pop(str(self.INVALID_LVL), None)
         out['levels_map_stl'].pop("INV", None)
@@ -494,10 +677,20 @@ class Classification(object):
         out['levels_map'].pop(str(self.NULL_LVL), None)
         out['levels_map_stl'].pop("NULL", None)
         out['levels_map_lts'].pop("NULL", None)
-        out.pop('_classification_cache', None)
-        out.pop('_classification_cache_short', None)
         return out
 
+    def get_cache_stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache of parsed classifications.
+        """
+        info = self._parts_cache.cache_info()
+        return {
+            'entries': info.currsize,
+            'max_entries': info.maxsize,
+            'hits': info.hits,
+            'misses': info.misses,
+        }
+
     def get_access_control_parts(self, c12n, user_classification=False):
         """
         Returns a dictionary containing the different access parameters Lucene needs to build it's queries
@@ -613,6 +806,13 @@ class Classification(object):
             return True
 
         try:
+            if self.compiled:
+                user_lvl, user_req, user_groups, user_subgroups = self._get_classification_masks(user_c12n)
+                lvl, req, groups, subgroups = self._get_classification_masks(c12n)
+                return user_lvl >= lvl and not req & ~user_req and \
+                    (not groups or groups & user_groups != 0) and \
+                    (not subgroups or subgroups & user_subgroups != 0)
+
             user_lvl, user_req, user_groups, user_subgroups = self._get_classification_parts(user_c12n)
             lvl, req, groups, subgroups = self._get_classification_parts(c12n)
 
@@ -631,6 +831,54 @@ class Classification(object):
             else:
                 raise
 
+    def is_accessible_many(self, user_c12n, c12n_list, ignore_invalid=False):
+        """
+        Given a user classification, check if a user is allowed to see each classification of a list.
+        Every distinct classification of the list is only parsed and checked once.
+
+        Args:
+            user_c12n: Maximum classification for the user
+            c12n_list: Classifications the user wishes to see
+            ignore_invalid: Invalid classifications are not accessible instead of raising an exception
+
+        Returns:
+            A list of booleans, True where the user can see the classification
+        """
+        if self.invalid_mode:
+            return [False] * len(c12n_list)
+
+        if not self.enforce:
+            return [True] * len(c12n_list)
+
+        results = {None: True}
+        if self.compiled:
+            try:
+                user_lvl, user_req, user_groups, user_subgroups = self._get_classification_masks(user_c12n)
+            except InvalidClassification:
+                if not ignore_invalid:
+                    raise
+                return [c12n is None for c12n in c12n_list]
+
+            for c12n in c12n_list:
+                if c12n in results:
+                    continue
+                try:
+                    lvl, req, groups, subgroups = self._get_classification_masks(c12n)
+                except InvalidClassification:
+                    if not ignore_invalid:
+                        raise
+                    results[c12n] = False
+                    continue
+                results[c12n] = user_lvl >= lvl and not req & ~user_req and \
+                    (not groups or groups & user_groups != 0) and \
+                    (not subgroups or subgroups & user_subgroups != 0)
+        else:
+            for c12n in c12n_list:
+                if c12n not in results:
+                    results[c12n] = self.is_accessible(user_c12n, c12n, ignore_invalid=ignore_invalid)
+
+        return [results[c12n] for c12n in c12n_list]
+
     def is_valid(self, c12n, skip_auto_select=False):
         """
         Performs a series of checks againts a classification to make sure it is valid in it's current form
@@ -736,6 +984,18 @@ class Classification(object):
         if c12n_2 is None:
             return c12n_1
 
+        if self.compiled:
+            lvl_idx_1, req_1, groups_1, subgroups_1 = self._get_classification_masks(c12n_1, auto_select=True)
+            lvl_idx_2, req_2, groups_2, subgroups_2 = self._get_classification_masks(c12n_2, auto_select=True)
+            groups = self._max_masks(groups_1, groups_2,
+                                     lambda: self._get_mask_names('groups', groups_1, long_format),
+                                     lambda: self._get_mask_names('groups', groups_2, long_format))
+            subgroups = self._max_masks(subgroups_1, subgroups_2,
+                                        lambda: self._get_mask_names('subgroups', subgroups_1, long_format),
+                                        lambda: self._get_mask_names('subgroups', subgroups_2, long_format))
+            return self._get_masks_text(max(lvl_idx_1, lvl_idx_2), req_1 | req_2, groups, subgroups,
+                                        long_format=long_format)
+
         lvl_idx_1, req_1, groups_1, subgroups_1 = self._get_classification_parts(c12n_1, long_format=long_format,
                                                                                  auto_select=True)
         lvl_idx_2, req_2, groups_2, subgroups_2 = self._get_classification_parts(c12n_2, long_format=long_format,
@@ -751,6 +1011,47 @@ class Classification(object):
                                                         subgroups,
                                                         long_format=long_format)
 
+    def max_classification_many(self, c12n_list, long_format=True):
+        """
+        Mixes many classifications and returns the most restrictive form for them, the same way
+        as calling max_classification over the list one classification at a time.
+
+        Args:
+            c12n_list: Classifications to mix, None values are skipped
+            long_format: True/False in long format
+
+        Returns:
+            The most restrictive classification that we could create out of all of them,
+            None if the list has no classification
+        """
+        if not self.enforce or self.invalid_mode:
+            return self.UNRESTRICTED
+
+        c12n_list = [c for c in c12n_list if c is not None]
+        if len(c12n_list) <= 1:
+            return c12n_list[0] if c12n_list else None
+
+        distinct = list(dict.fromkeys(c12n_list))
+        if not self.compiled:
+            out = distinct[0]
+            for c12n in distinct[1:]:
+                out = self.max_classification(out, c12n, long_format=long_format)
+            return out
+
+        lvl_idx, req, groups, subgroups = self._get_classification_masks(distinct[0], auto_select=True)
+        for c12n in distinct[1:]:
+            lvl_idx_2, req_2, groups_2, subgroups_2 = self._get_classification_masks(c12n, auto_select=True)
+            lvl_idx = max(lvl_idx, lvl_idx_2)
+            req |= req_2
+            groups = self._max_masks(groups, groups_2,
+                                     lambda: self._get_mask_names('groups', groups, long_format),
+                                     lambda: self._get_mask_names('groups', groups_2, long_format))
+            subgroups = self._max_masks(subgroups, subgroups_2,
+                                        lambda: self._get_mask_names('subgroups', subgroups, long_format),
+                                        lambda: self._get_mask_names('subgroups', subgroups_2, long_format))
+
+        return self._get_masks_text(lvl_idx, req, groups, subgroups, long_format=long_format)
+
     def min_classification(self, c12n_1, c12n_2, long_format=True):
         """
         Mixes to classification and returns to least restrictive form for them
@@ -771,6 +1072,14 @@ class Classification(object):
         if c12n_2 is None:
             return c12n_1
 
+        if self.compiled:
+            lvl_idx_1, req_1, groups_1, subgroups_1 = self._get_classification_masks(c12n_1, auto_select=True)
+            lvl_idx_2, req_2, groups_2, subgroups_2 = self._get_classification_masks(c12n_2, auto_select=True)
+            groups = groups_1 | groups_2 if groups_1 and groups_2 else 0
+            subgroups = subgroups_1 | subgroups_2 if subgroups_1 and subgroups_2 else 0
+            return self._get_masks_text(min(lvl_idx_1, lvl_idx_2), req_1 & req_2, groups, subgroups,
+                                        long_format=long_format)
+
         lvl_idx_1, req_1, groups_1, subgroups_1 = self._get_classification_parts(c12n_1, long_format=long_format,
                                                                                  auto_select=True)
         lvl_idx_2, req_2, groups_2, subgroups_2 = self._get_classification_parts(c12n_2, long_format=long_format,
@@ -830,6 +1139,28 @@ class Classification(object):
 
         return new_c12n
 
+    def normalize_many(self, c12n_list, long_format=True, skip_auto_select=False,
+                       get_dynamic_groups=True, ignore_unused=False):
+        """
+        Normalize each classification of a list, every distinct classification is only normalized once.
+
+        Args:
+            c12n_list: Classifications to normalize
+            long_format: True/False in long format
+            skip_auto_select: True/False skip group auto adding, use True when dealing with user's classifications
+
+        Returns:
+            A list of the normalized versions of the original classifications
+        """
+        results = {}
+        for c12n in c12n_list:
+            if c12n not in results:
+                results[c12n] = self.normalize_classification(c12n, long_format=long_format,
+                                                              skip_auto_select=skip_auto_select,
+                                                              get_dynamic_groups=get_dynamic_groups,
+                                                              ignore_unused=ignore_unused)
+        return [results[c12n] for c12n in c12n_list]
+
     def build_user_classification(self, c12n_1, c12n_2, long_format=True):
         """
         Mixes to classification and return the classification marking that would give access to the most data
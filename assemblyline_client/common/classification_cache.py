@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from assemblyline_client.common.classification import PARTS_CACHE_SIZE, Classification, InvalidDefinition, \
+    get_definition_hash
+
+
+class ClassificationCache(object):
+    def __init__(self, directory, max_age=3600, parts_cache_size=PARTS_CACHE_SIZE):
+        """
+        On-disk cache of compiled classification engines that can be shared between processes.
+
+        Engines are stored once under the hash of their definition (engines/<hash>.json) and each
+        server points to the hash of the definition it uses (servers/<server hash>). For max_age
+        seconds after the definition was fetched, engines are loaded from disk without asking the server.
+        After that the definition is fetched again and the engine is only rebuilt if the definition changed.
+
+        Args:
+            directory: Directory where the cache is stored, it can be shared between processes
+            max_age: Number of seconds the definition of a server is trusted without asking it again
+            parts_cache_size: Number of parsed classifications kept in memory by the loaded engines
+        """
+        self.directory = directory
+        self.max_age = max_age
+        self.parts_cache_size = parts_cache_size
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self._engines = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, 'engines'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'servers'), exist_ok=True)
+
+    def _engine_path(self, definition_hash):
+        return os.path.join(self.directory, 'engines', definition_hash + '.json')
+
+    def _server_path(self, server):
+        return os.path.join(self.directory, 'servers', hashlib.sha256(server.encode()).hexdigest())
+
+    @staticmethod
+    def _write(path, data):
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _load(self, definition_hash):
+        with self._lock:
+            engine = self._engines.get(definition_hash)
+        if engine is not None:
+            return engine
+
+        try:
+            with open(self._engine_path(definition_hash), 'rb') as fh:
+                engine = Classification.loads(fh.read(), parts_cache_size=self.parts_cache_size,
+                                              definition_hash=definition_hash)
+        except (OSError, InvalidDefinition):
+            return None
+
+        with self._lock:
+            return self._engines.setdefault(definition_hash, engine)
+
+    def lookup(self, server):
+        """
+        Returns the engine of the server if its definition was fetched less than max_age seconds ago,
+        None otherwise.
+        """
+        path = self._server_path(server)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                raise FileNotFoundError(path)
+            with open(path) as fh:
+                engine = self._load(fh.read().strip())
+        except OSError:
+            engine = None
+
+        with self._lock:
+            if engine is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return engine
+
+    def store(self, server, classification_definition):
+        """
+        Returns the engine of a definition freshly fetched from the server. It is only
+        built if no engine was compiled for that definition before.
+        """
+        definition_hash = get_definition_hash(classification_definition)
+        engine = self._load(definition_hash)
+        if engine is None:
+            engine = Classification(classification_definition, parts_cache_size=self.parts_cache_size)
+            self._write(self._engine_path(definition_hash), engine.dumps())
+            with self._lock:
+                engine = self._engines.setdefault(definition_hash, engine)
+                self.builds += 1
+
+        # Rewriting the pointer also refreshes its age
+        self._write(self._server_path(server), definition_hash.encode())
+        return engine
+
+    def invalidate(self, server=None):
+        """
+        Forgets the definition of the server, or of all servers, so it is fetched on the next lookup.
+        """
+        servers = os.path.join(self.directory, 'servers')
+        paths = [self._server_path(server)] if server else \
+            [os.path.join(servers, name) for name in os.listdir(servers) if not name.startswith('.')]
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def get_stats(self):
+        """
+        Returns the hit/miss counters of the lookups and the number of engines built.
+        """
+        with self._lock:
+            return {
+                'engines': len(self._engines),
+                'hits': self.hits,
+                'misses': self.misses,
+                'builds': self.builds,
+            }
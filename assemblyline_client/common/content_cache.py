@@ -0,0 +1,205 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CachedResponse(object):
+    """\
+Response-like view of a cached file so the output processors of the connection
+can serve it the same way as a server response.
+"""
+    status_code = 200
+    ok = True
+    is_success = True
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def content(self):
+        with open(self.path, 'rb') as fh:
+            return fh.read()
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        with open(self.path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b''):
+                yield chunk
+
+    iter_bytes = iter_content
+
+
+class ContentCache(object):
+    def __init__(self, directory, max_bytes=10 * 1024 ** 3, verify=True):
+        """
+        On-disk cache of downloaded content.
+
+        Content is stored once under its sha256 in a directory tree sharded by hash prefix
+        (blobs/ab/cd/abcd...). Downloads that are not the raw file (carted files, bundles) are
+        stored the same way and found through a small reference file keyed by the request.
+        Once the cache grows over max_bytes, the least recently used content is removed.
+
+        Args:
+            directory: Directory where the cache is stored, it can be shared between processes
+            max_bytes: Maximum size of the cached content
+            verify: Hash the cached content before serving it, corrupted entries are dropped
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'refs'), exist_ok=True)
+        self.size = sum(os.path.getsize(p) for p in self._iter_blobs())
+
+    @staticmethod
+    def _shard(root, name):
+        return os.path.join(root, name[:2], name[2:4], name)
+
+    def _blob_path(self, sha256):
+        return self._shard(os.path.join(self.directory, 'blobs'), sha256)
+
+    def _ref_path(self, key):
+        return self._shard(os.path.join(self.directory, 'refs'), hashlib.sha256(key.encode()).hexdigest())
+
+    def _iter_blobs(self):
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for name in files:
+                if not name.startswith('.'):
+                    yield os.path.join(root, name)
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _resolve(self, key, sha256):
+        if sha256:
+            return sha256.lower()
+        try:
+            with open(self._ref_path(key)) as fh:
+                return fh.read().strip()
+        except OSError:
+            return None
+
+    def lookup(self, key, sha256=None):
+        """
+        Returns a CachedResponse for the content of the given key or None if it is not cached.
+
+        sha256 is the hash of the expected content when it is known (raw file downloads).
+        """
+        content_sha256 = self._resolve(key, sha256)
+        path = self._blob_path(content_sha256) if content_sha256 else None
+        try:
+            if path is None or (self.verify and self._hash_file(path) != content_sha256):
+                raise FileNotFoundError(path)
+            # The modification time is used as the last access time for the LRU eviction
+            os.utime(path)
+        except OSError:
+            if path is not None and os.path.exists(path):
+                self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return CachedResponse(path)
+
+    def store(self, key, process, response, sha256=None):
+        """
+        Caches the content of the response then returns it processed by process.
+        Content that does not match the expected sha256 is not cached.
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.join(self.directory, 'blobs'))
+        try:
+            content = response.content
+            with os.fdopen(fd, 'wb') as fh:
+                for i in range(0, len(content), CHUNK_SIZE):
+                    chunk = content[i:i + CHUNK_SIZE]
+                    digest.update(chunk)
+                    fh.write(chunk)
+
+            content_sha256 = digest.hexdigest()
+            if not sha256 or sha256.lower() == content_sha256:
+                self._add(key, content_sha256, tmp_path, len(content), ref=not sha256)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        return process(response)
+
+    def _add(self, key, content_sha256, tmp_path, size, ref):
+        path = self._blob_path(content_sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.size += size
+
+        if ref:
+            ref_path = self._ref_path(key)
+            os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+            fd, tmp_ref = tempfile.mkstemp(prefix='.', dir=os.path.dirname(ref_path))
+            with os.fdopen(fd, 'w') as fh:
+                fh.write(content_sha256)
+            os.replace(tmp_ref, ref_path)
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        with self._lock:
+            self.size -= size
+            self.evictions += 1
+
+    def evict(self, max_bytes=None):
+        """
+        Removes the least recently used content until the cache is under max_bytes,
+        90% of the maximum size of the cache by default.
+        """
+        target = int(self.max_bytes * 0.9) if max_bytes is None else max_bytes
+        blobs = []
+        for path in self._iter_blobs():
+            try:
+                blobs.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+
+        for _, path in sorted(blobs):
+            if self.size <= target:
+                break
+            self._remove(path)
+
+    def clear(self):
+        """
+        Removes all the cached content.
+        """
+        self.evict(max_bytes=0)
+
+    def get_stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            return {
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
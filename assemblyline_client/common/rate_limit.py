@@ -0,0 +1,157 @@
+import threading
+import time
+
+from assemblyline_client.v4_client.common.utils import ClientError
+
+API = 'api'
+SUBMISSION = 'submission'
+
+
+class TokenBucket(object):
+    def __init__(self, rate=None, capacity=10):
+        """
+        Token bucket refilled at rate tokens per second up to capacity tokens. A rate of None never limits.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.waits = 0
+        self.waited = 0.0
+        self._last = time.monotonic()
+        self._resume_at = None
+        self._resume_rate = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # The last refill is in the future while the bucket waits for its quota to be reset
+        if now > self._last:
+            if self.rate:
+                self.tokens = min(float(self.capacity), self.tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def set_rate(self, rate, resume_in=None, resume_rate=None):
+        """
+        Changes the rate of the bucket. A rate of 0 with resume_in makes the bucket wait resume_in seconds
+        then start over full at resume_rate, until the rate is changed again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = rate
+            if rate is not None and rate <= 0:
+                self._resume_at = None if resume_in is None else now + resume_in
+                self._resume_rate = resume_rate
+            else:
+                self._resume_at = None
+                self._last = min(self._last, now)
+
+    def reserve(self):
+        """
+        Takes a token and returns the number of seconds to wait before using it or None
+        if the bucket will never be refilled.
+        """
+        with self._lock:
+            if self.rate is not None and self.rate <= 0:
+                if self._resume_at is None:
+                    return None
+                self.rate = self._resume_rate
+                self.tokens = float(self.capacity)
+                self._last = self._resume_at
+                self._resume_at = None
+
+            now = time.monotonic()
+            self._refill(now)
+            delay = self._last - now
+            if self.rate is not None:
+                self.tokens -= 1
+                if self.tokens < 0:
+                    # Tokens are handed out in order, a negative balance queues the caller behind the others
+                    delay += -self.tokens / self.rate
+
+            if delay <= 0:
+                return 0.0
+            self.waits += 1
+            self.waited += delay
+            return delay
+
+
+class RateLimiter(object):
+    def __init__(self, window=86400, burst=10, api_rate=None, submission_rate=None, reserve=0):
+        """
+        Paces the requests of a connection so the remaining quotas last until the end of the quota window.
+
+        The remaining quotas come from the X-Remaining-Quota-Api and X-Remaining-Quota-Submission
+        headers of the server responses. Submissions (submit and ingest) are paced by the submission
+        bucket and the API bucket, every other call by the API bucket only. Until the server reports a
+        quota, or if it never does, the buckets only apply the fixed rates.
+
+        Args:
+            window: Length of the quota window in seconds, windows are aligned on the epoch
+                    so the default daily window ends at midnight UTC
+            burst: Number of calls that can be sent back to back before pacing starts
+            api_rate: Maximum number of API calls per second
+            submission_rate: Maximum number of submissions per second
+            reserve: Number of calls of each quota kept unused for other clients of the same user
+        """
+        self.window = window
+        self.reserve = reserve
+        self.api_rate = api_rate
+        self.submission_rate = submission_rate
+        self.buckets = {
+            API: TokenBucket(api_rate, burst),
+            SUBMISSION: TokenBucket(submission_rate, burst),
+        }
+
+    @staticmethod
+    def is_submission(path):
+        path = path.split('?', 1)[0]
+        return path.startswith('api/v4/submit/') or path == 'api/v4/ingest/'
+
+    def _set_rate(self, bucket, remaining, max_rate):
+        if remaining is None:
+            bucket.set_rate(max_rate)
+            return
+
+        now = time.time()
+        window_left = max(1.0, (now // self.window + 1) * self.window - now)
+        rate = max(0, remaining - self.reserve) / window_left
+        if max_rate is not None:
+            rate = min(rate, max_rate)
+
+        # Once the quota is exhausted, calls wait for the next window where the server resets it
+        bucket.set_rate(rate, resume_in=window_left, resume_rate=max_rate)
+
+    def update(self, remaining_api_quota, remaining_submission_quota):
+        """
+        Adjusts the rate of the buckets to the remaining quotas reported by the server.
+        """
+        self._set_rate(self.buckets[API], remaining_api_quota, self.api_rate)
+        self._set_rate(self.buckets[SUBMISSION], remaining_submission_quota, self.submission_rate)
+
+    def acquire(self, path):
+        """
+        Returns the number of seconds to wait before sending a request to path, up to the end of the quota
+        window when the quota is exhausted. Raises a ClientError if a fixed rate of 0 blocks the call.
+        """
+        names = [SUBMISSION, API] if self.is_submission(path) else [API]
+        delay = 0.0
+        for name in names:
+            bucket_delay = self.buckets[name].reserve()
+            if bucket_delay is None:
+                raise ClientError("Remaining %s quota is exhausted, the call was not sent." % name, 503)
+            delay = max(delay, bucket_delay)
+        return delay
+
+    def get_stats(self):
+        """
+        Returns the rate, available tokens and time spent waiting of every bucket.
+        """
+        return {
+            name: {
+                'rate': bucket.rate,
+                'tokens': bucket.tokens,
+                'waits': bucket.waits,
+                'waited': bucket.waited,
+            }
+            for name, bucket in self.buckets.items()
+        }
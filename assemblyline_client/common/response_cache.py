@@ -0,0 +1,149 @@
+import contextlib
+import json
+import threading
+import time
+
+from collections import OrderedDict
+from contextvars import ContextVar
+
+# Time to live in seconds of the API responses cached by default keyed by API path prefix.
+# The longest matching prefix wins, a TTL of 0 disables the cache for that prefix.
+DEFAULT_TTLS = {
+    'api/v4/file/hex/': 86400,
+    'api/v4/file/info/': 300,
+    'api/v4/file/strings/': 86400,
+    'api/v4/help/classification_definition/': 3600,
+    'api/v4/help/constants/': 3600,
+    'api/v4/heuristics/': 3600,
+    'api/v4/heuristics/stats/': 0,
+    'api/v4/result/': 86400,
+    'api/v4/search/fields/': 3600,
+}
+
+_bypass = ContextVar('response_cache_bypass', default=False)
+
+
+class ResponseCache(object):
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttls=None):
+        """
+        In memory cache of the API responses of GET requests that do not change for a given path.
+
+        Responses depend on who asked for them (ie: results filtered by classification) so they are
+        cached per identity, the connections use their server, user and on-behalf-of token.
+
+        Entries are evicted in least recently used order when the cache holds more than max_entries
+        responses or more than max_bytes of response content. Every hit returns a freshly parsed copy
+        of the response so callers can modify it.
+
+        Args:
+            max_entries: Maximum number of cached responses
+            max_bytes: Maximum total size of the cached responses
+            ttls: Time to live in seconds keyed by API path prefix (ie: {'api/v4/file/info/': 60}),
+                  only matching paths are cached. Defaults to DEFAULT_TTLS.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_ttl(self, path):
+        prefix = max((p for p in self.ttls if path.startswith(p)), key=len, default=None)
+        if prefix is None:
+            return 0
+        return self.ttls[prefix] or 0
+
+    @staticmethod
+    @contextlib.contextmanager
+    def bypass():
+        """
+        Within this context, cached responses are ignored and requests go to the server. Their
+        responses still replace the cached ones so it can also be used to refresh entries.
+        """
+        token = _bypass.set(True)
+        try:
+            yield
+        finally:
+            _bypass.reset(token)
+
+    def lookup(self, path, identity=None):
+        """
+        Returns a (hit, api_response) tuple for the given path requested by identity.
+        """
+        if _bypass.get() or not self.get_ttl(path):
+            return False, None
+
+        key = (identity, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            content = entry[1]
+
+        return True, json.loads(content)['api_response']
+
+    def store(self, path, response, identity=None):
+        """
+        Caches the response content for identity if the path has a TTL and returns its api_response.
+        """
+        content = response.content
+        ttl = self.get_ttl(path)
+        if ttl and len(content) <= self.max_bytes:
+            key = (identity, path)
+            with self._lock:
+                self._pop(key)
+                self._entries[key] = (time.monotonic() + ttl, content)
+                self.size += len(content)
+                while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                    self._pop(next(iter(self._entries)))
+                    self.evictions += 1
+
+        return json.loads(content)['api_response']
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def invalidate(self, prefix=None):
+        """
+        Removes the cached responses of the paths starting with prefix or all of them, for every identity.
+        """
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                self.size = 0
+                return
+
+            for key in [k for k in self._entries if k[1].startswith(prefix)]:
+                self._pop(key)
+
+    def get_stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,142 @@
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+
+RETRY_FOREVER = 0
+
+# Key used in the retry counts for requests that failed before getting a response
+CONNECTION_ERROR = 'connection_error'
+
+
+class RetryPolicy(object):
+    def __init__(self, max_retries=RETRY_FOREVER, max_elapsed=None, base_delay=0.5, max_delay=30.0, jitter=True,
+                 retry_statuses=None, retry_connection_errors=True, respect_retry_after=True, on_retry=None):
+        """
+        Decides if and when a failed request is retried by the connection.
+
+        503 responses for an exceeded daily quota are deliberately never retried: the server sends no
+        header telling when the quota resets, so they are raised at once and a RateLimiter should be
+        used to spread the calls over the day. 503 responses for exceeded concurrent quotas are retried
+        like any other retryable status.
+
+        Args:
+            max_retries: Maximum number of retries per request, RETRY_FOREVER (0) never gives up
+            max_elapsed: Maximum number of seconds spent on a request including its retries
+            base_delay: Delay before the first retry, doubled for each following retry
+            max_delay: Maximum delay between two retries
+            jitter: Use full jitter, pick the delay randomly between 0 and the exponential delay
+            retry_statuses: Dictionary of retried HTTP status codes mapped to a status specific
+                            maximum number of retries (None uses max_retries).
+                            Defaults to 502, 503 and 504.
+            retry_connection_errors: Retry requests that failed before getting a response
+            respect_retry_after: Wait at least for the Retry-After header of the response
+            on_retry: Hook called before every retry with a dictionary describing the retry
+                      (path, attempt, delay, status_code, error, elapsed, counts)
+        """
+        self.max_retries = max_retries
+        self.max_elapsed = max_elapsed
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        if retry_statuses is None:
+            retry_statuses = {502: None, 503: None, 504: None}
+        elif not isinstance(retry_statuses, dict):
+            retry_statuses = {status: None for status in retry_statuses}
+        self.retry_statuses = retry_statuses
+        self.retry_connection_errors = retry_connection_errors
+        self.respect_retry_after = respect_retry_after
+        self.on_retry = on_retry
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def legacy(cls, max_retries=RETRY_FOREVER):
+        """
+        Returns the policy used when no policy is given to get_client: retry 502, 503 and 504
+        responses and connection errors with an exponential delay capped at 2 seconds.
+        """
+        return cls(max_retries=max_retries, base_delay=2 ** -6, max_delay=2, jitter=False, respect_retry_after=False)
+
+    def is_retryable(self, status_code):
+        return status_code in self.retry_statuses
+
+    @staticmethod
+    def _get_retry_after(response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def get_delay(self, attempt, response=None):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.respect_retry_after:
+            retry_after = self._get_retry_after(response)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        return delay
+
+    def should_retry(self, attempt, elapsed, delay, status_code=None):
+        max_retries = self.max_retries
+        if status_code is not None:
+            max_retries = self.retry_statuses.get(status_code) or max_retries
+        elif not self.retry_connection_errors:
+            return False
+
+        if max_retries >= 1 and attempt > max_retries:
+            return False
+
+        if self.max_elapsed is not None and elapsed + delay > self.max_elapsed:
+            return False
+
+        return True
+
+    def next_delay(self, path, attempt, start, response=None, error=None):
+        """
+        Returns the number of seconds to wait before the next attempt of a request
+        or None if the request should not be retried.
+
+        Args:
+            path: API path of the request
+            attempt: Number of the retry that would be done (starts at 1)
+            start: Time at which the first attempt of the request was sent
+            response: Response of the last attempt if any
+            error: Exception raised by the last attempt if any
+        """
+        status_code = response.status_code if response is not None else None
+        delay = self.get_delay(attempt, response)
+        elapsed = time.time() - start
+        if not self.should_retry(attempt, elapsed, delay, status_code=status_code):
+            return None
+
+        key = status_code or CONNECTION_ERROR
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            counts = dict(self.counts)
+
+        if self.on_retry:
+            self.on_retry({
+                'path': path,
+                'attempt': attempt,
+                'delay': delay,
+                'status_code': status_code,
+                'error': error,
+                'elapsed': elapsed,
+                'counts': counts,
+            })
+
+        return delay
@@ -3,23 +3,38 @@
 import datetime
 import io
 import json
+import queue
 import select
+import sqlite3
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
+from functools import partial
 from errno import EPIPE
+from fnmatch import fnmatch
 from getpass import getpass
-from os import walk
-from os.path import basename, exists, expanduser, isdir, join
+from os import scandir, stat
+from os.path import basename, exists, expanduser, isdir
 from signal import SIG_DFL, SIGINT, signal
-from threading import Lock, Thread
-from time import sleep
+from threading import BoundedSemaphore, Event, Lock, Thread
+from time import sleep, time
 
 from assemblyline_client import __version__ as client_version
 from assemblyline_client import get_client
 from assemblyline_client.v4_client.client import Client as Client4
+from assemblyline_client.v4_client.common.submit_utils import HashingFile
 from assemblyline_client.v4_client.common.utils import ClientError, get_id_from_path, get_random_id
-
-ASYNC_LOCK = Lock()
+from assemblyline_client.v4_client.common.waiter import SubmissionWaiter
+
+ORDER_COMPLETION = 'completion'
+ORDER_INPUT = 'input'
+POLL_INTERVAL = 2
+PUSH_CHECK_INTERVAL = 30
+STATUS_SUBMITTED = 'submitted'
+STATUS_COMPLETED = 'completed'
+STATUS_DONE = 'done'
+STATUS_RANKS = {STATUS_SUBMITTED: 0, STATUS_COMPLETED: 1, STATUS_DONE: 2}
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
 
 __version__ = "al_submit v%s" % client_version
 al_result_to_text = None
@@ -53,6 +68,72 @@ def compute_results(client, sid, output, verbose, name, options):
         write_to_sdtout(final_results, **options)
 
 
+def submit_file(client, path, verbose=False, **kw):
+    submission = client.submit(path=path, **kw)
+    sid = submission.get('sid', None) or submission.get('submission', {}).get('sid', None)
+    if not sid:
+        sys.stderr.write("!!ERROR!! Could not find the sid opf the submitted file.\n")
+        return None
+
+    if verbose:
+        sys.stderr.write("File %s submitted for analysis [sid: %s]\n" % (basename(path), sid))
+    return sid
+
+
+def wait_for_submission(client, sid, verbose=False):
+    wq_id = client.live.setup_watch_queue(sid)['wq_id']
+    if verbose:
+        sys.stderr.write("\tListening for incoming results (WQ_ID: %s)\n" % wq_id)
+
+    start_msg_received = False
+    while True:
+        msgs = client.live.get_message_list(wq_id)
+        for m in msgs:
+            if m['type'] == "start":
+                if verbose:
+                    sys.stderr.write("\tProcessing...\n")
+
+                start_msg_received = True
+
+            # Dispatcher will send a 'stop' message if it receives
+            # request to start a watch queue for a file it
+            # hasn't received it yet. Check completion via
+            # submission.is_completed api, continue listening if not completed.
+            elif m['type'] == "stop" and not start_msg_received:
+                if client.submission.is_completed(sid):
+                    return
+                else:
+                    wq_id = client.live.setup_watch_queue(sid)['wq_id']
+                    if verbose:
+                        sys.stderr.write("\tSubmission hasn't started on the server yet (new WQ_ID: %s)\n" % wq_id)
+
+            elif m['type'] == "stop":
+                return
+            elif m["type"] == "cachekey" or m["type"] == "cachekeyerr":
+                file_hash, srv_name = get_details_from_key(m["msg"])
+                if verbose:
+                    m_type = 'ERROR' if m['type'] == 'cachekeyerr' else 'SUCCESS'
+                    sys.stderr.write("\t\t[x] %s (%s) - %s\n" % (srv_name, file_hash, m_type))
+            else:
+                if verbose:
+                    sys.stdout.write("%s\n" % m)
+
+        sleep(2)
+
+
+def report_client_error(e, path):
+    # Returns True if the error was reported, unexpected errors are left to the caller
+    if e.status_code == 401:
+        sys.stderr.write("!!ERROR!! Authentication to the server failed.\n")
+    elif e.status_code == 403:
+        sys.stderr.write("!!ERROR!! %s\n" % e)
+    elif e.status_code == 400 and "File empty" in str(e):
+        sys.stderr.write("!!ERROR!! Failed to submit '%s' skipped because it is empty.\n" % path)
+    else:
+        return False
+    return True
+
+
 # send(client, input_file, output, verbose=verbose, **kw)
 def send(client, path, output, options=None, **kw):
     if options is None:
@@ -61,75 +142,439 @@ def send(client, path, output, options=None, **kw):
     verbose = options.get('verbose', False)
 
     try:
-        submission = client.submit(path=path, **kw)
-        sid = submission.get('sid', None) or submission.get('submission', {}).get('sid', None)
+        sid = submit_file(client, path, verbose=verbose, **kw)
         if not sid:
-            sys.stderr.write("!!ERROR!! Could not find the sid opf the submitted file.\n")
             return False
 
-        if verbose:
-            sys.stderr.write("File %s submitted for analysis [sid: %s]\n" % (name, sid))
-
-        wq_id = client.live.setup_watch_queue(sid)['wq_id']
-        if verbose:
-            sys.stderr.write("\tListening for incoming results (WQ_ID: %s)\n" % wq_id)
-
-        start_msg_received = False
-        done = False
-        while not done:
-            msgs = client.live.get_message_list(wq_id)
-            for m in msgs:
-                if m['type'] == "start":
-                    if verbose:
-                        sys.stderr.write("\tProcessing...\n")
-
-                    start_msg_received = True
-
-                # Dispatcher will send a 'stop' message if it receives
-                # request to start a watch queue for a file it
-                # hasn't received it yet. Check completion via
-                # submission.is_completed api, continue listening if not completed.
-                elif m['type'] == "stop" and not start_msg_received:
-                    if client.submission.is_completed(sid):
-                        compute_results(client, sid, output, verbose, name, options)
-                        done = True
-                        break
-                    else:
-                        wq_id = client.live.setup_watch_queue(sid)['wq_id']
-                        if verbose:
-                            sys.stderr.write("\tSubmission hasn't started on the server yet (new WQ_ID: %s)\n" % wq_id)
-
-                elif m['type'] == "stop":
-                    compute_results(client, sid, output, verbose, name, options)
-                    done = True
-                    break
-                elif m["type"] == "cachekey" or m["type"] == "cachekeyerr":
-                    file_hash, srv_name = get_details_from_key(m["msg"])
-                    if verbose:
-                        m_type = 'ERROR' if m['type'] == 'cachekeyerr' else 'SUCCESS'
-                        sys.stderr.write("\t\t[x] %s (%s) - %s\n" % (srv_name, file_hash, m_type))
-                else:
-                    if verbose:
-                        sys.stdout.write("%s\n" % m)
-
-            if not done:
-                sleep(2)
-
+        wait_for_submission(client, sid, verbose=verbose)
+        compute_results(client, sid, output, verbose, name, options)
     except ClientError as e:
-        if e.status_code == 401:
-            sys.stderr.write("!!ERROR!! Authentication to the server failed.\n")
-        elif e.status_code == 403:
-            data = json.loads(e)
-            sys.stderr.write("!!ERROR!! %s\n" % data['api_error_message'])
-        elif e.status_code == 400 and "File empty" in str(e):
-            sys.stderr.write("!!ERROR!! Failed to submit '%s' skipped because it is empty.\n" % path)
-        else:
+        if not report_client_error(e, path):
             raise
         return False
 
     return True
 
 
+class SubmitJournal(object):
+    """\
+SQLite journal of the files processed by al-submit so an interrupted run can be resumed.
+
+Every file is keyed by its path id (al_submit_id) and goes through these statuses:
+    submitted : The file was sent, sid is known for submissions but not for ingestion
+    completed : The analysis is done, only its results still have to be written
+    done      : The results were written, the file is skipped when the run is resumed
+
+Statuses never go back so late updates from concurrent stages are ignored.
+"""
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (path_id TEXT PRIMARY KEY, path TEXT, sha256 TEXT, "
+                         "sid TEXT, status TEXT, updated REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def get(self, path_id):
+        with self._lock:
+            row = self._db.execute("SELECT path, sha256, sid, status FROM files WHERE path_id = ?",
+                                   (path_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('path', 'sha256', 'sid', 'status'), row))
+
+    def record(self, path_id, status, path=None, sha256=None, sid=None):
+        """\
+Updates the entry of a file, values that are not given are kept. Entries are only
+created when the path is given.
+"""
+        with self._lock:
+            row = self._db.execute("SELECT path, sha256, sid, status FROM files WHERE path_id = ?",
+                                   (path_id,)).fetchone()
+            if row is None:
+                if path is None:
+                    return
+                self._db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                 (path_id, path, sha256, sid, status, time()))
+                return
+
+            if STATUS_RANKS[status] < STATUS_RANKS.get(row[3], 0):
+                status = row[3]
+            self._db.execute("UPDATE files SET path = ?, sha256 = ?, sid = ?, status = ?, updated = ? "
+                             "WHERE path_id = ?",
+                             (path or row[0], sha256 or row[1], sid or row[2], status, time(), path_id))
+
+    def get_value(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_value(self, key, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SubmitPipeline(object):
+    """\
+Runs the uploads, the waiting for completion and the fetching of the results of al-submit
+as concurrent stages of jobs workers each.
+
+Results are written by the thread calling run(), in order of completion or in the order of
+the input files. At most jobs files are uploaded, waited for or fetched at a time so memory does
+not grow with the number of files. Files ingested with a notification queue give their slot back
+as soon as they are ingested, they are not throttled by the time the server takes to analyse them.
+
+When a SubmitJournal is given, the progress of every file is recorded in it and the files
+it already knows are resumed from where they were left instead of being sent again.
+
+With push, completions are received over a single socketio connection instead of polling the
+server for every file. The server is polled as before while that connection is down.
+"""
+    def __init__(self, client, output, options, jobs=1, order=ORDER_COMPLETION, async_command=False,
+                 journal=None, push=False, **kw):
+        self.client = client
+        self.output = output
+        self.options = options
+        self.verbose = options.get('verbose', False)
+        self.jobs = max(1, jobs)
+        self.order = order
+        self.async_command = async_command
+        self.journal = journal
+        self.push = push and isinstance(client, Client4)
+        self.kw = kw
+        self.waiter = None
+        if isinstance(client, Client4) and not async_command:
+            self.waiter = SubmissionWaiter(client.submission, client.socketio if self.push else None,
+                                           poll_interval=POLL_INTERVAL, check_interval=PUSH_CHECK_INTERVAL)
+
+        self._uploads = ThreadPoolExecutor(max_workers=self.jobs)
+        self._waits = ThreadPoolExecutor(max_workers=self.jobs)
+        self._fetches = ThreadPoolExecutor(max_workers=self.jobs)
+        self._slots = BoundedSemaphore(self.jobs)
+        self._held = set()
+        self._done = queue.Queue()
+        self._pending = {}
+        self._lock = Lock()
+        self._uploading = Event()
+        self._wake = Event()
+        self._pushed = set()
+        self._watcher = None
+        self._buffer = {}
+        self._next_index = 0
+        self._emitted = 0
+        self.count = 0
+        self.skipped = 0
+
+    # Journal
+
+    def _journaled(self, path):
+        # stdin has the same path on every run, it cannot be resumed
+        return self.journal is not None and path != '/dev/stdin'
+
+    def _record(self, path, status, sha256=None, sid=None):
+        if self._journaled(path):
+            self.journal.record(get_id_from_path(path), status, path=path, sha256=sha256, sid=sid)
+
+    def _resume(self, index, path, entry, listening):
+        # Returns True if the file was picked up from where the journal left it
+        if entry is None:
+            return False
+
+        if entry['sid'] and self.async_command:
+            if self.verbose:
+                sys.stderr.write("Resuming %s, fetching the results of submission %s...\n" % (path, entry['sid']))
+            self._fetches.submit(self._fetch, index, path, entry['sid'])
+        elif entry['sid']:
+            if self.verbose:
+                sys.stderr.write("Resuming %s, waiting for submission %s...\n" % (path, entry['sid']))
+            self._watch(index, path, entry['sid'])
+        elif listening:
+            # Already ingested, its notification will come through the notification queue
+            if self.verbose:
+                sys.stderr.write("Resuming %s, waiting for its notification...\n" % path)
+            self._register(index, path)
+            self._release(index)
+        else:
+            return False
+        return True
+
+    # Stages
+
+    def _upload(self, index, path):
+        try:
+            if not self._journaled(path):
+                self._send(index, path)
+                return
+
+            # The file is hashed for the journal while it is uploaded instead of being read once more
+            with open(path, 'rb') as fh:
+                self._send(index, path, HashingFile(fh))
+        except Exception as e:
+            self._fail(index, path, e)
+
+    def _send(self, index, path, source=None):
+        kw = dict(self.kw)
+        if source is not None:
+            kw.update(fh=source, fname=basename(path))
+
+        if self.async_command:
+            self._upload_async(index, path, kw, source)
+            return
+
+        sid = submit_file(self.client, path, verbose=self.verbose, **kw)
+        if not sid:
+            self._done.put((index, path, None, False))
+            return
+        self._record(path, STATUS_SUBMITTED, sha256=getattr(source, 'sha256', None), sid=sid)
+        self._watch(index, path, sid)
+
+    def _register(self, index, path):
+        # Registered before sending, the notification can come back before ingest returns
+        with self._lock:
+            self._pending.setdefault(get_id_from_path(path), []).append((index, path))
+
+    def _upload_async(self, index, path, kw, source=None):
+        submission_id = get_id_from_path(path)
+        kw['metadata'] = dict(kw.get('metadata', {}), al_submit_id=submission_id)
+        waiting = 'nq' in kw
+
+        if send_async(self.client, path, verbose=self.verbose, **kw):
+            self._record(path, STATUS_SUBMITTED, sha256=getattr(source, 'sha256', None))
+            if waiting:
+                self._release(index)
+            else:
+                self._done.put((index, path, None, True))
+            return
+
+        if waiting:
+            with self._lock:
+                self._pop_pending(submission_id)
+        if self.verbose:
+            sys.stderr.write("\tWARNING: Could not send file %s.\n" % path)
+        self._done.put((index, path, None, False))
+
+    def _watch(self, index, path, sid):
+        if self.waiter is None:
+            self._waits.submit(self._wait, index, path, sid)
+            return
+
+        if self.verbose:
+            sys.stderr.write("\tWaiting for submission %s to complete...\n" % sid)
+        self.waiter.add(sid, partial(self._completed, index, path))
+
+    def _completed(self, index, path, sid):
+        self._fetches.submit(self._fetch, index, path, sid)
+
+    def _wait(self, index, path, sid):
+        try:
+            wait_for_submission(self.client, sid, verbose=self.verbose)
+            self._fetches.submit(self._fetch, index, path, sid)
+        except Exception as e:
+            self._fail(index, path, e)
+
+    def _fetch(self, index, path, sid):
+        try:
+            if self.verbose:
+                sys.stderr.write("\tAll messages received, fetching results for %s...\n" % sid)
+            self._done.put((index, path, self.client.submission.full(sid), True))
+        except Exception as e:
+            self._fail(index, path, e)
+
+    def _fail(self, index, path, e):
+        if not isinstance(e, ClientError) or not report_client_error(e, path):
+            sys.stderr.write("!!ERROR!! Failed to process '%s': %s\n" % (path, e))
+        self._done.put((index, path, None, False))
+
+    def _pop_pending(self, submission_id):
+        entries = self._pending.get(submission_id)
+        if not entries:
+            return None
+        entry = entries.pop(0)
+        if not entries:
+            del self._pending[submission_id]
+        return entry
+
+    def _listen(self, nq):
+        while True:
+            with self._lock:
+                if not self._uploading.is_set() and not self._pending:
+                    return
+
+            if self.verbose:
+                sys.stderr.write("Checking message on notification queue: %s\n" % nq)
+
+            try:
+                msgs = self.client.ingest.get_message_list(nq)
+            except ClientError as e:
+                sys.stderr.write("!!ERROR!! Could not read notification queue %s: %s\n" % (nq, e))
+                msgs = []
+
+            for msg in msgs:
+                sid = msg.get('submission', {}).get('sid', None) or msg.get('alert', {}).get('sid', None)
+                if not sid:
+                    sys.stderr.write("!!ERROR!! Could not find the sid of the submitted "
+                                     "file in the message.\n{}".format(msg))
+                    continue
+
+                try:
+                    # v4 structure
+                    cur_file = msg['submission']['files'][0]['name']
+                    submission_id = msg['submission']['metadata']['al_submit_id']
+                except KeyError:
+                    # v3 structure
+                    cur_file = msg.get('metadata', {}).get('filename', None) or msg['sha256']
+                    submission_id = msg['metadata']['al_submit_id']
+
+                if self.journal is not None:
+                    self.journal.record(submission_id, STATUS_COMPLETED, sid=sid)
+
+                with self._lock:
+                    self._pushed.discard(submission_id)
+                    entry = self._pop_pending(submission_id)
+                if entry is None:
+                    continue
+
+                if self.verbose:
+                    sys.stderr.write("\tFile '%s' complete. Fetching results for submission ID: %s...\n" %
+                                     (cur_file, sid))
+                self._fetches.submit(self._fetch, entry[0], entry[1], sid)
+
+            if not msgs:
+                self._sleep()
+
+    def _on_pushed(self, submission):
+        # A file of ours completed, its notification will be read right away
+        submission_id = submission.get('metadata', {}).get('al_submit_id', None)
+        with self._lock:
+            if submission_id not in self._pending:
+                return
+            self._pushed.add(submission_id)
+        self._wake.set()
+
+    def _sleep(self):
+        with self._lock:
+            pushed = self._watcher is not None and self._watcher.connected.is_set() and not self._pushed
+        if not pushed:
+            sleep(POLL_INTERVAL)
+            return
+
+        # Completions are pushed, the queue is only read when one of ours completes or in case one was missed
+        self._wake.wait(PUSH_CHECK_INTERVAL)
+        self._wake.clear()
+
+    # Slots
+
+    def _acquire(self, index):
+        with self._lock:
+            self._held.add(index)
+
+    def _release(self, index, wake=True):
+        # A file gives its slot back once, run() is woken up if it waits for one
+        with self._lock:
+            if index not in self._held:
+                return
+            self._held.remove(index)
+        self._slots.release()
+        if wake:
+            self._done.put(None)
+
+    # Output
+
+    def _write(self, path, data):
+        if data is None:
+            return
+        if self.output:
+            write_file(data, self.output, basename(path), **self.options)
+        else:
+            write_to_sdtout(data, **self.options)
+
+    def _emit(self, item):
+        # Returns the number of failed files written out
+        if item is None:
+            # Only a slot given back
+            return 0
+
+        if self.order == ORDER_INPUT:
+            self._buffer[item[0]] = item
+            ready = []
+            while self._next_index in self._buffer:
+                ready.append(self._buffer.pop(self._next_index))
+                self._next_index += 1
+        else:
+            ready = [item]
+
+        failures = 0
+        for index, path, data, ok in ready:
+            self._write(path, data)
+            if ok:
+                self._record(path, STATUS_DONE)
+            else:
+                failures += 1
+            self._release(index, wake=False)
+        self._emitted += len(ready)
+        return failures
+
+    def run(self, files):
+        """\
+Process the given files and return the number of files that failed.
+"""
+        failures = 0
+        listener = None
+        self._uploading.set()
+        if self.waiter is not None:
+            self.waiter.start()
+        if self.async_command and 'nq' in self.kw:
+            if self.push:
+                self._watcher = self.client.socketio.watch_submissions(self._on_pushed)
+            listener = Thread(target=self._listen, args=(self.kw['nq'],), daemon=True)
+            listener.start()
+
+        try:
+            for path in files:
+                entry = self.journal.get(get_id_from_path(path)) if self._journaled(path) else None
+                if entry and entry['status'] == STATUS_DONE:
+                    self.skipped += 1
+                    if self.verbose:
+                        sys.stderr.write("Skipping %s, it was already processed.\n" % path)
+                    continue
+
+                # Results are written while waiting for a free slot, that is what frees the slots
+                while not self._slots.acquire(blocking=False):
+                    failures += self._emit(self._done.get())
+
+                index = self.count
+                self.count += 1
+                self._acquire(index)
+                if self._resume(index, path, entry, listener is not None):
+                    continue
+                if listener:
+                    self._register(index, path)
+                self._uploads.submit(self._upload, index, path)
+
+            self._uploading.clear()
+            while self._emitted < self.count:
+                failures += self._emit(self._done.get())
+        finally:
+            self._uploading.clear()
+            self._wake.set()
+            for executor in (self._uploads, self._waits, self._fetches):
+                executor.shutdown(wait=False)
+
+        if listener:
+            listener.join()
+        if self._watcher is not None:
+            self._watcher.stop()
+        if self.waiter is not None:
+            self.waiter.stop()
+        return failures
+
+
 def main():
     sys.exit(_main(sys.argv[1:]))
 
@@ -225,6 +670,25 @@ def _main(arguments):
                         help='DEFAULT: cert in server section of ~/.al/submit.cfg')
     parser.add_argument('-r', '--submission-profile', metavar='"static"',
                         help='Predefined profile to apply to this submission.')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Number of files uploaded, waited on and fetched concurrently. DEFAULT: 1')
+    parser.add_argument('--order', choices=[ORDER_COMPLETION, ORDER_INPUT],
+                        help='Order in which the results are written. '
+                             'DEFAULT: input, or completion in asynchronized mode')
+    parser.add_argument('--include', action='append', metavar='"*.exe"',
+                        help='Only submit the files whose name or path matches this pattern. Can be repeated.')
+    parser.add_argument('--exclude', action='append', metavar='"*.log"',
+                        help='Skip the files whose name or path matches this pattern. Can be repeated.')
+    parser.add_argument('--min-size', type=parse_size, metavar='SIZE',
+                        help='Skip the files smaller than SIZE bytes (K, M, G and T suffixes are accepted).')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                        help='Skip the files larger than SIZE bytes (K, M, G and T suffixes are accepted).')
+    parser.add_argument('--skip-empty', action='store_true', help='Skip empty files instead of failing on them.')
+    parser.add_argument('--no-push', action='store_true',
+                        help='Poll the server for completed submissions instead of having them pushed over socketio.')
+    parser.add_argument('--state', metavar='"/path/to/state.db"',
+                        help='SQLite journal of the progress of the run. Running again with the same journal '
+                             'skips the files already processed and resumes the ones in flight.')
 
     params = parser.parse_args(arguments)
 
@@ -287,6 +751,10 @@ def _main(arguments):
     if params.submission_profile:
         kw['submission_profile'] = params.submission_profile
 
+    if params.jobs < 1:
+        sys.stderr.write("!!ERROR!! --jobs must be at least 1.\n")
+        return -1
+
     auth = None
     api_auth = None
     if user and apikey:
@@ -338,73 +806,163 @@ def _main(arguments):
 
         kw['params'] = p
 
+    journal = None
+    if params.state:
+        try:
+            journal = SubmitJournal(params.state)
+        except sqlite3.Error as e:
+            sys.stderr.write("!!ERROR!! State journal cannot be opened (%s): %s\n" % (params.state, e))
+            return 1
+
     if async_command and not no_output:
-        kw['nq'] = "al_submit_%s" % get_random_id()
+        # A resumed run listens on the notification queue of the run it resumes
+        kw['nq'] = (journal and journal.get_value('nq')) or "al_submit_%s" % get_random_id()
+        if journal:
+            journal.set_value('nq', kw['nq'])
 
-    # sanity check path
-    if len(args) == 0 and read_from_pipe:
-        while True:
-            line = sys.stdin.readline()
-            if not line:
-                break
-
-            line = line.strip()
-            if line == '-':
-                line = '/dev/stdin'
-
-            if async_command:
-                kw.setdefault('metadata', {})
-                kw['metadata']['al_submit_id'] = get_id_from_path(line)
-                send_async(client, line, verbose=verbose, **kw)
-            else:
-                send(client, line, output, options, **kw)
-    else:
-        ret_val = 0
-        file_list = []
-
-        for arg in args:
-            if arg == '-':
-                file_list.append('/dev/stdin')
-            elif not exists(arg):
-                sys.stderr.write("!!ERROR!! %s => File does not exist.\n" % arg)
+    order = params.order or (ORDER_COMPLETION if async_command else ORDER_INPUT)
+    pipeline = SubmitPipeline(client, output, options, jobs=params.jobs, order=order,
+                              async_command=async_command, journal=journal, push=not params.no_push, **kw)
+
+    file_filter = FileFilter(include=params.include, exclude=params.exclude, min_size=params.min_size,
+                             max_size=params.max_size, skip_empty=params.skip_empty, verbose=verbose)
+
+    try:
+        # sanity check path
+        if len(args) == 0 and read_from_pipe:
+            pipeline.run(file_filter.filter(iter_stdin_paths()))
+        else:
+            errors = []
+            ret_val = 0
+            if pipeline.run(file_filter.filter(iter_input_paths(args, errors))):
+                ret_val = 1
+            if errors:
                 ret_val = 1
-            elif isdir(arg):
-                for root, _, fname_list in walk(arg):
-                    for fname in fname_list:
-                        file_list.append(join(root, fname))
-            else:
-                file_list.append(arg)
-
-        queued_files = [get_id_from_path(f) for f in file_list]
-        output_thread = None
-        if async_command and not no_output:
-            output_thread = start_result_thread(
-                client, queued_files, output, options, **kw
-            )
-
-        for input_file in file_list:
-            if async_command:
-                kw.setdefault('metadata', {})
-                kw['metadata']['al_submit_id'] = get_id_from_path(input_file)
-                if not send_async(client, input_file, verbose=verbose, **kw):
-                    with ASYNC_LOCK:
-                        queued_files.remove(get_id_from_path(input_file))
-                    if verbose:
-                        sys.stderr.write("\tWARNING: Could not send file %s.\n" % input_file)
-                    ret_val = 1
-            else:
-                if not send(client, input_file, output, options, **kw):
-                    ret_val = 1
 
-        if output_thread:
-            output_thread.join()
+            if ret_val != 0 and pipeline.count > 1:
+                if verbose:
+                    sys.stderr.write("\n** WARNING: al_submit encountered some "
+                                     "errors while processing multiple files. **\n")
 
-        if ret_val != 0 and len(file_list) > 1:
-            if verbose:
-                sys.stderr.write("\n** WARNING: al_submit encountered some "
-                                 "errors while processing multiple files. **\n")
+            return ret_val
+    finally:
+        if journal:
+            journal.close()
 
-        return ret_val
+
+def parse_size(value):
+    value = value.strip().lower().rstrip('b')
+    multiplier = SIZE_UNITS.get(value[-1:], 1)
+    if value[-1:] in SIZE_UNITS:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def walk_files(root):
+    # Lazy depth first walk, directory entries are consumed as they are read
+    # so huge directories never have to be listed in memory
+    stack = [root]
+    while stack:
+        try:
+            entries = scandir(stack.pop())
+        except OSError as e:
+            sys.stderr.write("!!ERROR!! %s => Directory cannot be read.\n" % e.filename)
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def iter_input_paths(args, errors):
+    for arg in args:
+        if arg == '-':
+            yield '/dev/stdin'
+        elif not exists(arg):
+            sys.stderr.write("!!ERROR!! %s => File does not exist.\n" % arg)
+            errors.append(arg)
+        elif isdir(arg):
+            yield from walk_files(arg)
+        else:
+            yield arg
+
+
+def iter_stdin_paths():
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+
+        line = line.strip()
+        if not line:
+            continue
+        if line == '-':
+            line = '/dev/stdin'
+        yield line
+
+
+class FileFilter(object):
+    """\
+Filters the paths submitted by al-submit on their name and size.
+
+Glob patterns are matched against both the path and the file name. Files are only
+stat'ed when a size filter is set.
+"""
+    def __init__(self, include=None, exclude=None, min_size=None, max_size=None, skip_empty=False,
+                 verbose=False):
+        self.include = include or []
+        self.exclude = exclude or []
+        self.min_size = min_size
+        self.max_size = max_size
+        self.skip_empty = skip_empty
+        self.verbose = verbose
+        self.skipped = 0
+
+    @staticmethod
+    def _matches(path, patterns):
+        name = basename(path)
+        return any(fnmatch(path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+    def _reason(self, path):
+        if self.include and not self._matches(path, self.include):
+            return "does not match the include patterns"
+        if self.exclude and self._matches(path, self.exclude):
+            return "matches the exclude patterns"
+
+        if self.skip_empty or self.min_size is not None or self.max_size is not None:
+            if path == '/dev/stdin':
+                return None
+            try:
+                size = stat(path).st_size
+            except OSError:
+                # Let the submission report the error
+                return None
+
+            if self.skip_empty and size == 0:
+                return "is empty"
+            if self.min_size is not None and size < self.min_size:
+                return "is smaller than %d bytes" % self.min_size
+            if self.max_size is not None and size > self.max_size:
+                return "is larger than %d bytes" % self.max_size
+
+        return None
+
+    def filter(self, paths):
+        for path in paths:
+            reason = self._reason(path)
+            if reason is None:
+                yield path
+                continue
+
+            self.skipped += 1
+            if self.verbose:
+                sys.stderr.write("Skipping %s, it %s.\n" % (path, reason))
 
 
 def send_async(client, path, verbose=False, **kw):
@@ -417,60 +975,6 @@ def send_async(client, path, verbose=False, **kw):
         return False
 
 
-def start_result_thread(client, queued_files, output, options, **kw):
-    output_thread = Thread(
-        target=result_thread,
-        args=(client, queued_files, output, options),
-        kwargs=kw
-    )
-    output_thread.start()
-    return output_thread
-
-
-def result_thread(client, queued_files, output, options, **kw):
-    nq = kw['nq']
-    verbose = options.get('verbose', False)
-
-    while len(queued_files) != 0:
-        if verbose:
-            sys.stderr.write("Checking message on notification queue: %s\n" % nq)
-
-        msgs = client.ingest.get_message_list(nq)
-        for msg in msgs:
-            sid = msg.get('submission', {}).get('sid', None) or msg.get('alert', {}).get('sid', None)
-            if not sid:
-                sys.stderr.write("!!ERROR!! Could not find the sid of the submitted "
-                                 "file in the message.\n{}".format(msg))
-                continue
-
-            try:
-                # v4 structure
-                cur_file = msg['submission']['files'][0]['name']
-                submission_id = msg['submission']['metadata']['al_submit_id']
-            except KeyError:
-                # v3 structure
-                cur_file = msg.get('metadata', {}).get('filename', None) or msg['sha256']
-                submission_id = msg['metadata']['al_submit_id']
-
-            with ASYNC_LOCK:
-                try:
-                    queued_files.remove(submission_id)
-                except ValueError:
-                    pass
-
-            if verbose:
-                sys.stderr.write("\tFile '%s' complete. Fetching results for submission ID: %s...\n" % (cur_file, sid))
-
-            final_results = client.submission.full(sid)
-            if output:
-                write_file(final_results, output, cur_file, **options)
-            else:
-                write_to_sdtout(final_results, **options)
-
-        if len(queued_files) != 0:
-            sleep(2)
-
-
 def write_file(data, path, infile, verbose=False, json_output=True):
     with open(path, "ab") as out_file:
         if json_output:
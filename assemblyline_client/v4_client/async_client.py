@@ -0,0 +1,114 @@
+from assemblyline_client.common.classification import Classification
+from assemblyline_client.v4_client.client import Client
+from assemblyline_client.v4_client.common.utils import ClientError, walk_api_path
+from assemblyline_client.v4_client.module.alert import Alert
+from assemblyline_client.v4_client.module.assistant import Assistant
+from assemblyline_client.v4_client.module.badlist import Badlist
+from assemblyline_client.v4_client.module.bulk import AsyncBulk
+from assemblyline_client.v4_client.module.bundle import Bundle
+from assemblyline_client.v4_client.module.error import Error
+from assemblyline_client.v4_client.module.file import AsyncFile
+from assemblyline_client.v4_client.module.hash_search import HashSearch
+from assemblyline_client.v4_client.module.help import Help
+from assemblyline_client.v4_client.module.heuristics import Heuristics
+from assemblyline_client.v4_client.module.ingest import AsyncIngest
+from assemblyline_client.v4_client.module.ontology import Ontology
+from assemblyline_client.v4_client.module.replay import Replay
+from assemblyline_client.v4_client.module.result import Result
+from assemblyline_client.v4_client.module.safelist import Safelist
+from assemblyline_client.v4_client.module.search import AsyncSearch
+from assemblyline_client.v4_client.module.service import Service
+from assemblyline_client.v4_client.module.signature import Signature
+from assemblyline_client.v4_client.module.submission import AsyncSubmission, Live
+from assemblyline_client.v4_client.module.submit import AsyncSubmit
+from assemblyline_client.v4_client.module.system import System
+from assemblyline_client.v4_client.module.user import User
+from assemblyline_client.v4_client.module.workflow import Workflow
+
+
+class AsyncClient(Client):
+    # The module tree is the same as the synchronous client, the connection makes every call awaitable.
+    # SocketIO listeners are blocking by nature and are therefore not available on this client.
+    # noinspection PyMissingConstructor
+    def __init__(self, connection):  # pylint: disable=W0231
+        self._connection = connection
+
+        self.alert = Alert(self._connection)
+        self.assistant = Assistant(self._connection)
+        self.badlist = Badlist(self._connection)
+        self.bulk = AsyncBulk(self._connection)
+        self.bundle = Bundle(self._connection)
+        self.error = Error(self._connection)
+        self.file = AsyncFile(self._connection)
+        self.hash_search = HashSearch(self._connection)
+        self.help = Help(self._connection)
+        self.heuristics = Heuristics(self._connection)
+        self.ingest = AsyncIngest(self._connection)
+        self.live = Live(self._connection)
+        self.ontology = Ontology(self._connection)
+        self.replay = Replay(self._connection)
+        self.result = Result(self._connection)
+        self.safelist = Safelist(self._connection)
+        self.search = AsyncSearch(self._connection)
+        self.service = Service(self._connection)
+        self.signature = Signature(self._connection)
+        self.submission = AsyncSubmission(self._connection)
+        self.submit = AsyncSubmit(self._connection)
+        self.system = System(self._connection)
+        self.user = User(self._connection)
+        self.workflow = Workflow(self._connection)
+
+        paths = []
+        walk_api_path(self, [''], paths)
+
+        self.__doc__ = 'AsyncClient provides the following coroutines:\n\n' + \
+            '\n'.join(['\n'.join(p + ['']) for p in paths])
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        await self._connection.close()
+
+    async def _load_quotas(self):
+        try:
+            resp = await self.user.quotas(self._connection.current_user)
+            self._connection.remaining_api_quota = resp['daily_api']
+            self._connection.remaining_submission_quota = resp['daily_submission']
+        except ClientError:
+            pass
+
+    async def get_remaining_api_quota(self):
+        if self._connection.remaining_api_quota is not None:
+            return self._connection.remaining_api_quota
+
+        await self._load_quotas()
+        return self._connection.remaining_api_quota
+
+    async def get_remaining_submission_quota(self):
+        if self._connection.remaining_submission_quota is not None:
+            return self._connection.remaining_submission_quota
+
+        await self._load_quotas()
+        return self._connection.remaining_submission_quota
+
+    async def get_classification_engine(self):
+        """\
+Return a classification engine for the classification definition of the server.
+
+When the client was created with a classification_cache, the compiled engine is loaded
+from the cache and the server is only asked for its definition once the cached one expires.
+"""
+        cache = self._connection.classification_cache
+        if cache is not None:
+            engine = cache.lookup(self._connection.server)
+            if engine is not None:
+                return engine
+
+        definition = await self.help.classification_definition(original=True)
+        if cache is not None:
+            return cache.store(self._connection.server, definition)
+        return Classification(definition)
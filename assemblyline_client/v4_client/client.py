@@ -4,6 +4,7 @@ from assemblyline_client.v4_client.common.utils import ClientError, walk_api_pat
 from assemblyline_client.v4_client.module.alert import Alert
 from assemblyline_client.v4_client.module.assistant import Assistant
 from assemblyline_client.v4_client.module.badlist import Badlist
+from assemblyline_client.v4_client.module.bulk import Bulk
 from assemblyline_client.v4_client.module.bundle import Bundle
 from assemblyline_client.v4_client.module.error import Error
 from assemblyline_client.v4_client.module.file import File
@@ -33,6 +34,7 @@ class Client(object):
         self.alert = Alert(self._connection)
         self.assistant = Assistant(self._connection)
         self.badlist = Badlist(self._connection)
+        self.bulk = Bulk(self._connection)
         self.bundle = Bundle(self._connection)
         self.error = Error(self._connection)
         self.file = File(self._connection)
@@ -87,8 +89,34 @@ class Client(object):
         self._load_quotas()
         return self._connection.remaining_submission_quota
 
+    def get_pool_stats(self):
+        """\
+Return the usage of the HTTP connection pools of this client, one entry per host:
+
+    maxsize  : Maximum number of connections kept for the host
+    in_use   : Connections currently checked out by a request (best-effort with the asyncio client)
+    idle     : Open connections waiting to be reused (best-effort with the asyncio client)
+    opened   : Connections opened since the pool was created (requests engine only)
+    requests : Requests sent through the pool (requests engine only)
+"""
+        return self._connection.get_pool_stats()
+
     def get_classification_engine(self):
+        """\
+Return a classification engine for the classification definition of the server.
+
+When the client was created with a classification_cache, the compiled engine is loaded
+from the cache and the server is only asked for its definition once the cached one expires.
+"""
+        cache = self._connection.classification_cache
+        if cache is not None:
+            engine = cache.lookup(self._connection.server)
+            if engine is not None:
+                return engine
+
         definition = self.help.classification_definition(original=True)
+        if cache is not None:
+            return cache.store(self._connection.server, definition)
         return Classification(definition)
 
     def set_obo_token(self, token, provider=None):
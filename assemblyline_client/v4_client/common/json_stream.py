@@ -0,0 +1,305 @@
+import codecs
+import json
+import re
+
+from json.decoder import scanstring
+
+from assemblyline_client.v4_client.common.utils import ClientError, field_tree, project_record
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_START = '-0123456789'
+NUMBER_CHARS = NUMBER_START + '+.eE'
+
+_decoder = json.JSONDecoder()
+
+
+class _Frame(object):
+    __slots__ = ('kind', 'path', 'state', 'key', 'index')
+
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.state = 'first'
+        self.key = None
+        self.index = 0
+
+
+class JSONStreamParser(object):
+    """\
+Incremental JSON decoder that yields the members of selected containers as soon as
+they are received.
+
+Containers are selected by their path from the root of the document, ie: ('api_response', 'items').
+Their members are yielded one by one as (path, value) tuples. The other values found along the
+way to them are decoded whole and yielded the same way, anything else is decoded and dropped.
+Memory use is bounded by the largest single value that is decoded whole.
+"""
+    def __init__(self, containers):
+        self.containers = {tuple(c) for c in containers}
+        self._prefixes = {c[:i] for c in self.containers for i in range(len(c) + 1)}
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._retry_at = 0
+        self._stack = []
+        self._done = False
+
+    def feed(self, chunk):
+        """\
+Adds a chunk of the document and returns the list of (path, value) tuples it completed.
+"""
+        self._buf += self._text.decode(chunk)
+        return self._parse(eof=False)
+
+    def close(self):
+        """\
+Ends the document and returns the last (path, value) tuples it completed.
+"""
+        self._buf += self._text.decode(b'', final=True)
+        out = self._parse(eof=True)
+        if not self._done:
+            raise ClientError("Incomplete JSON document", 500)
+        return out
+
+    def _error(self, msg):
+        return ClientError("Invalid JSON document: %s at position %d" % (msg, self._pos), 500)
+
+    def _decode(self, eof):
+        # Returns the next complete value or raises IndexError when more data is needed
+        if not eof and len(self._buf) < self._retry_at:
+            raise IndexError
+        try:
+            value, end = _decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise self._error(e.msg)
+            # Only retry once the buffer doubled so a large value is not decoded over and over
+            self._retry_at = self._pos + 2 * (len(self._buf) - self._pos)
+            raise IndexError
+
+        # A number cut by the end of the buffer may not be complete yet (ie: '12' of '12.5e3')
+        if not eof and self._buf[self._pos] in NUMBER_START and \
+                (end == len(self._buf) or self._buf[end] in NUMBER_CHARS):
+            raise IndexError
+        self._retry_at = 0
+        self._pos = end
+        return value
+
+    def _decode_key(self, eof):
+        try:
+            key, end = scanstring(self._buf, self._pos + 1)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise self._error(e.msg)
+            raise IndexError
+        self._pos = end
+        return key
+
+    def _value(self, path, char, eof, out):
+        if path in self._prefixes and char in '{[':
+            self._stack.append(_Frame(char, path))
+            self._pos += 1
+        else:
+            out.append((path, self._decode(eof)))
+            self._end_value()
+
+    def _end_value(self):
+        if self._stack:
+            self._stack[-1].state = 'next'
+        else:
+            self._done = True
+
+    def _parse(self, eof):
+        out = []
+        try:
+            while True:
+                self._pos = WHITESPACE.match(self._buf, self._pos).end()
+                if self._pos >= len(self._buf):
+                    break
+                char = self._buf[self._pos]
+
+                if self._done:
+                    raise self._error("Extra data")
+
+                if not self._stack:
+                    self._value((), char, eof, out)
+                    continue
+
+                frame = self._stack[-1]
+                if frame.state == 'next' or (frame.state == 'first' and char in '}]'):
+                    if char == ',' and frame.state == 'next':
+                        frame.state = 'member'
+                        self._pos += 1
+                    elif char == ('}' if frame.kind == '{' else ']'):
+                        self._stack.pop()
+                        self._pos += 1
+                        self._end_value()
+                    else:
+                        raise self._error("Expecting ',' delimiter")
+
+                elif frame.kind == '[':
+                    self._value(frame.path + (frame.index,), char, eof, out)
+                    frame.index += 1
+
+                elif frame.state in ('first', 'member'):
+                    if char != '"':
+                        raise self._error("Expecting property name enclosed in double quotes")
+                    frame.key = self._decode_key(eof)
+                    frame.state = 'colon'
+
+                elif frame.state == 'colon':
+                    if char != ':':
+                        raise self._error("Expecting ':' delimiter")
+                    frame.state = 'value'
+                    self._pos += 1
+
+                else:
+                    self._value(frame.path + (frame.key,), char, eof, out)
+
+        except IndexError:
+            # More data is needed to go further
+            pass
+
+        self._buf = self._buf[self._pos:]
+        self._retry_at = max(0, self._retry_at - self._pos)
+        self._pos = 0
+        return out
+
+
+class JSONLinesParser(object):
+    """\
+Incremental decoder of newline delimited JSON records.
+
+Records are decoded as soon as their line is received. Those rejected by filter(record)
+are dropped right away and the others only keep the given dotted fields (ie: 'results.tags').
+"""
+    def __init__(self, fields=None, filter=None):
+        self.filter = filter
+        self._tree = field_tree(fields) if fields else None
+        self._parts = []
+
+    def _decode(self, lines):
+        out = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ClientError("Invalid JSON record: %s" % e, 500)
+            if self.filter is None or self.filter(record):
+                out.append(project_record(record, self._tree) if self._tree else record)
+        return out
+
+    def feed(self, chunk):
+        """\
+Adds a chunk of data and returns the list of the records it completed.
+"""
+        if b'\n' not in chunk:
+            self._parts.append(chunk)
+            return []
+
+        self._parts.append(chunk)
+        lines = b''.join(self._parts).split(b'\n')
+        self._parts = [lines.pop()]
+        return self._decode(lines)
+
+    def close(self):
+        """\
+Ends the data and returns the last record if it was not followed by a new line.
+"""
+        lines, self._parts = [b''.join(self._parts)], []
+        return self._decode(lines)
+
+
+def _api_response_items(items, containers, members_only):
+    for path, value in items:
+        # The envelope of the API response (status code, server version...) is dropped
+        if not path or path[0] != 'api_response':
+            continue
+        path = path[1:]
+        if members_only:
+            if path[:-1] in containers:
+                yield value
+        else:
+            yield path, value
+
+
+def json_stream_output(containers, members_only=False):
+    """\
+Output processor decoding an API response while it is received.
+
+It yields (path, value) tuples relative to the api_response for the members of the given containers
+and every other value of the api_response. With members_only, only the members of the containers
+are yielded. The request has to be sent with stream=True.
+"""
+    containers = {tuple(c) for c in containers}
+    api_containers = [('api_response',) + c for c in containers]
+
+    def _process(response):
+        parser = JSONStreamParser(api_containers)
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                yield from _api_response_items(parser.feed(chunk), containers, members_only)
+            yield from _api_response_items(parser.close(), containers, members_only)
+        finally:
+            response.close()
+
+    return _process
+
+
+def async_json_stream_output(containers, members_only=False):
+    """\
+Same as json_stream_output for the streamed httpx responses of the asyncio client.
+"""
+    containers = {tuple(c) for c in containers}
+    api_containers = [('api_response',) + c for c in containers]
+
+    async def _process(response):
+        parser = JSONStreamParser(api_containers)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                for item in _api_response_items(parser.feed(chunk), containers, members_only):
+                    yield item
+            for item in _api_response_items(parser.close(), containers, members_only):
+                yield item
+        finally:
+            await response.aclose()
+
+    return _process
+
+
+def json_lines_stream_output(fields=None, filter=None):
+    """\
+Output processor yielding newline delimited JSON records while they are received (see JSONLinesParser).
+The request has to be sent with stream=True.
+"""
+    def _process(response):
+        parser = JSONLinesParser(fields=fields, filter=filter)
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                yield from parser.feed(chunk)
+            yield from parser.close()
+        finally:
+            response.close()
+
+    return _process
+
+
+def async_json_lines_stream_output(fields=None, filter=None):
+    """\
+Same as json_lines_stream_output for the streamed httpx responses of the asyncio client.
+"""
+    async def _process(response):
+        parser = JSONLinesParser(fields=fields, filter=filter)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                for record in parser.feed(chunk):
+                    yield record
+            for record in parser.close():
+                yield record
+        finally:
+            await response.aclose()
+
+    return _process
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _file_size(fh):
+    try:
+        return os.fstat(fh.fileno()).st_size - fh.tell()
+    except (AttributeError, OSError, ValueError):
+        start = fh.tell()
+        fh.seek(0, os.SEEK_END)
+        size = fh.tell() - start
+        fh.seek(start)
+        return size
+
+
+class MultipartEncoder(object):
+    """\
+Streams a multipart/form-data body made of form fields followed by a single file.
+
+The body is produced in chunks while it is sent so memory stays constant whatever the size
+of the file. It can be read like a file or iterated and rewinds to the start of the file
+when a request is retried.
+
+progress is called with (bytes_sent, total_bytes) every time a chunk of the body is read.
+"""
+    def __init__(self, fields, name, fh, fname=None, progress=None, chunk_size=CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=%s' % self.boundary
+        self.progress = progress
+        self.chunk_size = chunk_size
+
+        if fname is None:
+            fname = getattr(fh, 'name', None)
+            fname = os.path.basename(fname) if isinstance(fname, str) and not fname.startswith('<') else name
+
+        head = []
+        for key, value in fields.items():
+            head.append(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n' % (self.boundary, key)).encode())
+            head.append(value.encode() if isinstance(value, str) else value)
+            head.append(b'\r\n')
+        head.append(('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                     'Content-Type: application/octet-stream\r\n\r\n' % (self.boundary, name,
+                                                                         fname.replace('"', '%22'))).encode())
+        self._head = b''.join(head)
+        self._tail = ('\r\n--%s--\r\n' % self.boundary).encode()
+
+        self._fh = fh
+        self._start = fh.tell()
+        self._size = _file_size(fh)
+        self.len = len(self._head) + self._size + len(self._tail)
+        self._pos = 0
+
+    def __len__(self):
+        return self.len
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError("The multipart body can only be rewound to its start")
+        self._fh.seek(self._start)
+        self._pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len - self._pos
+
+        file_end = len(self._head) + self._size
+        out = []
+        while size > 0 and self._pos < self.len:
+            if self._pos < len(self._head):
+                chunk = self._head[self._pos:self._pos + size]
+            elif self._pos < file_end:
+                chunk = self._fh.read(min(size, file_end - self._pos))
+                if not chunk:
+                    raise IOError("File was truncated while it was uploaded")
+            else:
+                offset = self._pos - file_end
+                chunk = self._tail[offset:offset + size]
+
+            self._pos += len(chunk)
+            size -= len(chunk)
+            out.append(chunk)
+
+        if out and self.progress:
+            self.progress(self._pos, self.len)
+        return b''.join(out)
+
+    def __iter__(self):
+        chunk = self.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = self.read(self.chunk_size)
+
+
+class AsyncMultipartBody(object):
+    """\
+Asynchronous view of a MultipartEncoder. The chunks are read in the default executor so reading
+the file does not block the event loop, progress is called from there.
+"""
+    def __init__(self, encoder):
+        self.encoder = encoder
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.encoder.seek(offset, whence)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        chunk = await loop.run_in_executor(None, self.encoder.read, self.encoder.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = await loop.run_in_executor(None, self.encoder.read, self.encoder.chunk_size)
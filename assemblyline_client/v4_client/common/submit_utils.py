@@ -1,11 +1,18 @@
+import asyncio
+import functools
 import json
 import hashlib
+import os
 import pprint
 import sys
+import threading
 
+from collections import OrderedDict
 from io import BytesIO
 from typing import Union
 
+from assemblyline_client.v4_client.common.utils import api_path, ClientError
+
 SRV_BUSY_ID = "20"
 SRV_DOWN_ID = "21"
 MAX_RETRY_ID = "12"
@@ -44,6 +51,153 @@ def get_file_handler(content: Union[str, bytes], fname=None) -> BytesIO:
     return fh
 
 
+def get_source_sha256(fh=None, path=None, content=None):
+    # Hashes the file in chunks, file handles are hashed from their start and rewound
+    if content:
+        return hashlib.sha256(content.encode() if isinstance(content, str) else content).hexdigest()
+
+    digest = hashlib.sha256()
+    close = False
+    if fh is None:
+        fh = open(path, 'rb')
+        close = True
+    try:
+        fh.seek(0)
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            digest.update(chunk)
+        fh.seek(0)
+    finally:
+        if close:
+            fh.close()
+    return digest.hexdigest()
+
+
+class HashingFile(object):
+    """\
+Wrapper of a file handle computing the sha256 of the file while it is read, so a file that is
+uploaded does not have to be read once more only to be hashed. The hash starts over every time
+the file is rewound to its start and sha256 is set once the file was read to its end.
+"""
+    def __init__(self, fh):
+        self._fh = fh
+        self._size = fh.seek(0, os.SEEK_END)
+        self.sha256 = None
+        self.seek(0)
+
+    def __getattr__(self, name):
+        return getattr(self._fh, name)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        pos = self._fh.seek(offset, whence)
+        self._digest = hashlib.sha256() if pos == 0 else None
+        return pos
+
+    def read(self, size=-1):
+        chunk = self._fh.read(size)
+        if self._digest is not None:
+            self._digest.update(chunk)
+            if not chunk or self._fh.tell() >= self._size:
+                self.sha256 = self._digest.hexdigest()
+                self._digest = None
+        return chunk
+
+
+def get_source_name(fh=None, path=None, sha256=None):
+    if path:
+        return os.path.basename(path)
+    return getattr(fh, 'name', None) or sha256
+
+
+class KnownHashes(object):
+    """\
+LRU of the sha256 of the files known to be on the server, shared by the hash-first
+submissions of a connection so a file is only looked up once.
+"""
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, sha256):
+        with self._lock:
+            if sha256 in self._hashes:
+                self._hashes.move_to_end(sha256)
+                return True
+            return False
+
+    def add(self, sha256):
+        with self._lock:
+            self._hashes[sha256] = True
+            self._hashes.move_to_end(sha256)
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+
+    def discard(self, sha256):
+        with self._lock:
+            self._hashes.pop(sha256, None)
+
+
+def _hash_first(connection, send, fh, path, content, fname):
+    # Steps of a hash-first submission shared by the sync and asyncio clients. Every step yields
+    # (blocking, call) and receives (ok, value), where value is what call returned or the ClientError
+    # it raised. Returns the response of send or None if the file has to be uploaded.
+    _, sha256 = yield True, functools.partial(get_source_sha256, fh, path, content)
+    if sha256 not in connection.known_hashes:
+        ok, _ = yield False, functools.partial(connection.get, api_path('file', 'info', sha256))
+        if not ok:
+            # Any failed lookup (unknown, forbidden or restricted file...) falls back to uploading the file
+            return None
+        connection.known_hashes.add(sha256)
+
+    ok, res = yield False, functools.partial(send, sha256, fname or get_source_name(fh, path, sha256))
+    if ok:
+        return res
+
+    # The file record exists but its content is gone from the filestore
+    if res.status_code != 404:
+        raise res
+    connection.known_hashes.discard(sha256)
+    return None
+
+
+def send_known_file(connection, send, fh=None, path=None, content=None, fname=None):
+    """\
+Calls send(sha256, fname) instead of uploading the file when the server already has it and
+returns its response. Returns None when the file has to be uploaded.
+"""
+    steps = _hash_first(connection, send, fh, path, content, fname)
+    result = None
+    while True:
+        try:
+            _, call = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            result = True, call()
+        except ClientError as e:
+            result = False, e
+
+
+async def async_send_known_file(connection, send, fh=None, path=None, content=None, fname=None):
+    """\
+Same as send_known_file for the asyncio client, the file is hashed in the default executor.
+"""
+    steps = _hash_first(connection, send, fh, path, content, fname)
+    loop = asyncio.get_running_loop()
+    result = None
+    while True:
+        try:
+            blocking, call = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            result = True, await (loop.run_in_executor(None, call) if blocking else call())
+        except ClientError as e:
+            result = False, e
+
+
 def al_result_to_text(r, show_errors=True, verbose_error=False):
     lines = ["", ":: Submission Detail %s::" % {True: "", False: "[Errors hidden]"}[show_errors],
              "  %-36s %s" % ("state:", r["state"]), ""]
@@ -1,4 +1,5 @@
 import hashlib
+import json
 
 import baseconv
 import re
@@ -24,6 +25,14 @@ class ClientError(Exception):
         self.status_code = status_code
 
 
+class CircuitOpenError(ClientError):
+    def __init__(self, prefix, retry_in):
+        super(CircuitOpenError, self).__init__(
+            "Circuit breaker is open for %s, the request was not sent (retry in %.1fs)" % (prefix, retry_in), 503)
+        self.prefix = prefix
+        self.retry_in = retry_in
+
+
 def _bool_to_param_string(b):
     if not isinstance(b, bool):
         return b
@@ -73,9 +82,12 @@ def get_function_kwargs(*ex):
 #
 #     /api/v4/<class_name>/<method_name>/[arg1/[arg2/[...]]][?k1=v1[...]]
 #
+# Subclasses that do not share the name of their API module (ie: AsyncFile) can
+# set an _api_module class attribute to override the class name.
+#
 # noinspection PyProtectedMember
 def api_path_by_module(obj, *args, **kw):
-    c = obj.__class__.__name__.lower()
+    c = getattr(obj, '_api_module', None) or obj.__class__.__name__.lower()
     m = sys._getframe().f_back.f_code.co_name  # pylint:disable=W0212
 
     return api_path('/'.join((c, m)), *args, **kw)
@@ -104,12 +116,48 @@ def raw_output(response):
     return response.content
 
 
+def json_lines_output(response, fields=None, filter=None):
+    records = (json.loads(line) for line in response.content.splitlines())
+    return list(select_records(records, fields=fields, filter=filter))
+
+
+# Build the tree of the fields kept by project_record, ie: ['a.b', 'c'] -> {'a': {'b': {}}, 'c': {}}
+def field_tree(fields):
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+# Only keep the fields of the tree in the record, lists are projected item by item
+def project_record(record, tree):
+    if not tree or not isinstance(record, (dict, list)):
+        return record
+    if isinstance(record, list):
+        return [project_record(item, tree) for item in record]
+    return {k: project_record(record[k], sub) for k, sub in tree.items() if k in record}
+
+
+def select_records(records, fields=None, filter=None):
+    tree = field_tree(fields) if fields else None
+    for record in records:
+        if filter is None or filter(record):
+            yield project_record(record, tree) if tree else record
+
+
 def stream_output(output):
     def _do_stream(response):
         f = output
         if isinstance(output, str):
             f = open(output, 'wb')
-        for chunk in response.iter_content(chunk_size=1024):
+        if hasattr(response, 'iter_content'):
+            chunks = response.iter_content(chunk_size=1024)
+        else:
+            # httpx responses used by the asyncio client
+            chunks = response.iter_bytes(chunk_size=1024)
+        for chunk in chunks:
             if chunk:
                 f.write(chunk)
         if f != output:
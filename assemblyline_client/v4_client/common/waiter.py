@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+
+from assemblyline_client.v4_client.common.utils import ClientError
+
+log = logging.getLogger('assemblyline_client')
+
+
+class SubmissionWaiter(object):
+    def __init__(self, submission, socketio=None, poll_interval=2.0, check_interval=30.0):
+        """
+        Waits for many submissions at once from a single background thread, the completion
+        of the submissions is checked in batches.
+
+        When a socketio module is given, completions are pushed by the server over one socketio
+        connection and the server is only polled every check_interval seconds in case a message
+        was missed. Without it, or while the socketio connection is down, the server is polled
+        every poll_interval seconds. Newly added submissions are checked right away so the ones
+        that are already completed do not wait for a message.
+
+        Args:
+            submission: Submission module of the client used to check the completion of submissions
+            socketio: SocketIO module of the client, None to only poll the server
+            poll_interval: Number of seconds between completion checks when polling
+            check_interval: Number of seconds between completion checks while completions are pushed
+        """
+        self._submission = submission
+        self._socketio = socketio
+        self.poll_interval = poll_interval
+        self.check_interval = check_interval
+        self._callbacks = {}
+        self._new = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._watcher = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._callbacks)
+
+    @property
+    def pushed(self):
+        return self._watcher is not None and self._watcher.connected.is_set()
+
+    def start(self):
+        if self._socketio is not None and self._watcher is None:
+            self._watcher = self._socketio.watch_submissions(self._on_message)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, sid, callback):
+        """
+        Calls callback(sid) from the background thread once the submission is completed.
+        """
+        with self._lock:
+            self._callbacks[sid] = callback
+            self._new.add(sid)
+        self._wake.set()
+
+    def discard(self, sid):
+        with self._lock:
+            self._callbacks.pop(sid, None)
+            self._new.discard(sid)
+
+    def _complete(self, sid):
+        with self._lock:
+            callback = self._callbacks.pop(sid, None)
+            self._new.discard(sid)
+        if callback is not None:
+            # noinspection PyBroadException
+            try:
+                callback(sid)
+            except Exception:
+                log.exception("Completion callback of submission %s failed", sid)
+
+    def _on_message(self, submission):
+        sid = submission.get('sid', None)
+        if sid:
+            self._complete(sid)
+
+    def _poll(self, sids):
+        try:
+            completed = self._submission.is_completed_many(sids)
+        except ClientError as e:
+            log.warning("Could not check the completion of %d submission(s): %s", len(sids), e)
+            return
+
+        for sid in completed:
+            self._complete(sid)
+
+    def _run(self):
+        last_check = None
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            # Pushed completions only need an occasional check for missed messages
+            interval = self.check_interval if self.pushed else self.poll_interval
+            with self._lock:
+                if last_check is None or time.monotonic() - last_check >= interval:
+                    sids = list(self._callbacks)
+                    last_check = time.monotonic()
+                else:
+                    sids = list(self._new)
+                self._new.clear()
+
+            if sids:
+                self._poll(sids)
@@ -0,0 +1,176 @@
+import asyncio
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from assemblyline_client.v4_client.common.utils import ClientError
+from assemblyline_client.v4_client.module.badlist import Badlist
+from assemblyline_client.v4_client.module.file import File
+from assemblyline_client.v4_client.module.safelist import Safelist
+
+DEFAULT_CONCURRENCY = 8
+
+
+class Bulk(object):
+    def __init__(self, connection):
+        self._connection = connection
+        self._badlist = Badlist(connection)
+        self._file = File(connection)
+        self._safelist = Safelist(connection)
+
+    def _quota_error(self, in_flight, min_quota):
+        # The quota header lags behind the requests that are still in flight
+        quota = self._connection.remaining_api_quota
+        if quota is not None and quota - in_flight <= min_quota:
+            return ClientError("Remaining API quota is exhausted (%s left), the call was not sent." % quota, 503)
+        return None
+
+    def _run(self, func, keys, concurrency, min_quota):
+        concurrency = max(1, int(concurrency))
+        keys = iter(keys)
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            exhausted = False
+            while not exhausted or pending:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        key = next(keys)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    error = self._quota_error(len(pending), min_quota)
+                    if error:
+                        yield key, None, error
+                    else:
+                        pending[executor.submit(func, key)] = key
+
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        yield key, future.result(), None
+                    except Exception as e:
+                        yield key, None, e
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def __call__(self, func, keys, concurrency=DEFAULT_CONCURRENCY, min_quota=0):
+        """\
+Call a client function for every key of an iterable using concurrent requests.
+
+Required:
+func        : Client function taking a key as its only argument (ie: client.file.info)
+keys        : Keys to call the function with (iterable)
+
+Optional:
+concurrency : Maximum number of requests in flight (int)
+min_quota   : Stop sending requests once the remaining daily API quota reaches this value (int)
+
+Returns a generator of (key, result, error) tuples in order of completion.
+A failure only affects its own key: result is None and error holds the exception.
+"""
+        return self._run(func, keys, concurrency, min_quota)
+
+    def badlist(self, qhashes, concurrency=DEFAULT_CONCURRENCY, min_quota=0):
+        """\
+Check if hashes exist in the badlist using concurrent requests.
+
+Required:
+qhashes     : Hashes to check in the badlist (iterable of strings)
+
+Optional:
+concurrency : Maximum number of requests in flight (int)
+min_quota   : Stop sending requests once the remaining daily API quota reaches this value (int)
+
+Returns a generator of (qhash, result, error) tuples in order of completion.
+Hashes that are not in the badlist are returned with a 404 ClientError as their error.
+"""
+        return self._run(self._badlist, qhashes, concurrency, min_quota)
+
+    def file_info(self, sha256s, concurrency=DEFAULT_CONCURRENCY, min_quota=0):
+        """\
+Return info for multiple files using concurrent requests.
+
+Required:
+sha256s     : File keys (iterable of strings)
+
+Optional:
+concurrency : Maximum number of requests in flight (int)
+min_quota   : Stop sending requests once the remaining daily API quota reaches this value (int)
+
+Returns a generator of (sha256, result, error) tuples in order of completion.
+"""
+        return self._run(self._file.info, sha256s, concurrency, min_quota)
+
+    def file_score(self, sha256s, concurrency=DEFAULT_CONCURRENCY, min_quota=0):
+        """\
+Return the latest score for multiple files using concurrent requests.
+
+Required:
+sha256s     : File keys (iterable of strings)
+
+Optional:
+concurrency : Maximum number of requests in flight (int)
+min_quota   : Stop sending requests once the remaining daily API quota reaches this value (int)
+
+Returns a generator of (sha256, result, error) tuples in order of completion.
+"""
+        return self._run(self._file.score, sha256s, concurrency, min_quota)
+
+    def safelist(self, qhashes, concurrency=DEFAULT_CONCURRENCY, min_quota=0):
+        """\
+Check if hashes exist in the safelist using concurrent requests.
+
+Required:
+qhashes     : Hashes to check in the safelist (iterable of strings)
+
+Optional:
+concurrency : Maximum number of requests in flight (int)
+min_quota   : Stop sending requests once the remaining daily API quota reaches this value (int)
+
+Returns a generator of (qhash, result, error) tuples in order of completion.
+Hashes that are not in the safelist are returned with a 404 ClientError as their error.
+"""
+        return self._run(self._safelist, qhashes, concurrency, min_quota)
+
+
+class AsyncBulk(Bulk):
+    async def _run(self, func, keys, concurrency, min_quota):
+        concurrency = max(1, int(concurrency))
+        keys = iter(keys)
+        pending = {}
+        try:
+            exhausted = False
+            while not exhausted or pending:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        key = next(keys)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    error = self._quota_error(len(pending), min_quota)
+                    if error:
+                        yield key, None, error
+                    else:
+                        pending[asyncio.ensure_future(func(key))] = key
+
+                if not pending:
+                    continue
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = pending.pop(task)
+                    try:
+                        yield key, task.result(), None
+                    except Exception as e:
+                        yield key, None, e
+        finally:
+            for task in pending:
+                task.cancel()
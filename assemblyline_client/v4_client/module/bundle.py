@@ -19,12 +19,13 @@ output     : Path or file handle. (string or file-like object)
 use_alert  : The ID provided is an alert ID and will be used for bundle creation. (bool)
 
 If output is not specified the content is returned by the function
+If the client has a content cache, the bundle is served from it when it was already created.
 """
         path = api_path('bundle', sid, use_alert='' if use_alert else None)
 
         if output:
-            return self._connection.download(path, stream_output(output))
-        return self._connection.download(path, raw_output)
+            return self._connection.download(path, stream_output(output), cache_key=path)
+        return self._connection.download(path, raw_output, cache_key=path)
 
     def import_bundle(
         self,
@@ -66,14 +66,17 @@ sid      : ID of the submission the download is for
            If carted the file will inherit the submission metadata (string)
 
 If output is not specified the content is returned.
+If the client has a content cache, the file is served from it when it was already downloaded.
 
 Throws a Client exception if the file does not exist.
 """
         kw = get_function_kwargs('output', 'sid', 'sha256')
         path = api_path_by_module(self, sha256, **kw)
+        # Raw downloads can be verified against the file hash, other encodings are cached per request
+        cache_sha256 = sha256 if encoding == 'raw' else None
         if output:
-            return self._connection.download(path, stream_output(output))
-        return self._connection.download(path, raw_output)
+            return self._connection.download(path, stream_output(output), cache_key=path, sha256=cache_sha256)
+        return self._connection.download(path, raw_output, cache_key=path, sha256=cache_sha256)
 
     def delete_from_filestore(self, sha256):
         """\
@@ -152,3 +155,25 @@ sha256     : File key (string)
 Throws a Client exception if the file does not exist.
 """
         return self._connection.get(api_path_by_module(self, sha256))
+
+
+class AsyncFile(File):
+    _api_module = 'file'
+
+    async def ai_summary(self, sha256) -> str:
+        """\
+Return an AI generated summary for the file with the given sha256.
+Required:
+sha256     : File key (string)
+Throws a Client exception if the file does not exist.
+"""
+        return (await self._connection.get(api_path('file/ai', sha256)))['content']
+
+    async def code_summary(self, sha256) -> str:
+        """\
+Return a code summary for the file with the given sha256.
+Required:
+sha256     : File key (string)
+Throws a Client exception if the file does not exist.
+"""
+        return (await self._connection.get(api_path_by_module(self, sha256)))['content']
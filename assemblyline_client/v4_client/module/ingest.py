@@ -1,17 +1,106 @@
+import asyncio
 import os
+import time
 
-from json import dumps
+from collections import namedtuple
+from json import dumps, loads
 
 from assemblyline_client.v4_client.common.utils import api_path, api_path_by_module, ClientError
-from assemblyline_client.v4_client.common.submit_utils import get_file_handler
+from assemblyline_client.v4_client.common.multipart import MultipartEncoder
+from assemblyline_client.v4_client.common.submit_utils import async_send_known_file, send_known_file, \
+    get_file_handler, get_source_sha256, HashingFile
+
+from assemblyline_client.v4_client.module.bulk import AsyncBulk, Bulk
+
+DEFAULT_BULK_WORKERS = 8
+
+IngestOutcome = namedtuple('IngestOutcome', ['source', 'ingest_id', 'sha256', 'error'])
+
+
+def _normalize_source(source):
+    if isinstance(source, dict):
+        return dict(source)
+    return {'path': source}
+
+
+def _source_key(source):
+    # Only sources that can be found again are recorded in the checkpoint file
+    if source.get('path'):
+        return os.path.abspath(source['path'])
+    if source.get('sha256'):
+        return 'sha256:' + source['sha256']
+    if source.get('url'):
+        return 'url:' + source['url']
+    return None
+
+
+def _open_source(kwargs):
+    # Files are hashed while they are uploaded, or looked up by hash_first, instead of being read beforehand
+    if kwargs.get('content'):
+        return kwargs, None, get_source_sha256(content=kwargs['content'])
+    if kwargs.get('fh'):
+        return dict(kwargs, fh=HashingFile(kwargs['fh'])), None, None
+    if kwargs.get('path'):
+        fh = open(kwargs['path'], 'rb')
+        return dict(kwargs, fh=HashingFile(fh), fname=kwargs.get('fname') or os.path.basename(kwargs['path'])), \
+            fh, None
+    return kwargs, None, kwargs.get('sha256')
+
+
+def _sent_sha256(kwargs, sha256):
+    return sha256 or getattr(kwargs.get('fh'), 'sha256', None)
+
+
+def _is_retryable(error):
+    # Client errors fail the same way every time, except the one raised when the connection gave up
+    if isinstance(error, ClientError):
+        return not (400 <= error.status_code < 500) or error.status_code == 429
+    # So do local problems with the source (missing file, bad parameters)
+    return not isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError, TypeError, ValueError))
+
+
+class _Checkpoint(object):
+    def __init__(self, path):
+        self.done = set()
+        self._fh = None
+        if path is None:
+            return
+
+        if os.path.exists(path):
+            with open(path, 'rb+') as fh:
+                end = 0
+                for line in fh:
+                    if not line.endswith(b'\n'):
+                        break
+                    end += len(line)
+                    try:
+                        self.done.add(loads(line)['key'])
+                    except (ValueError, KeyError):
+                        continue
+                # The partial last line of an interrupted run is dropped so new records start on their own line
+                fh.truncate(end)
+        self._fh = open(path, 'a')
+
+    def add(self, key, outcome):
+        if self._fh is None or key is None:
+            return
+        self._fh.write(dumps({'key': key, 'ingest_id': outcome.ingest_id, 'sha256': outcome.sha256}) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
 
 
 class Ingest(object):
+    _bulk_class = Bulk
+
     def __init__(self, connection):
         self._connection = connection
 
     def __call__(self, fh=None, path=None, content=None, url=None, sha256=None, fname=None, params=None, metadata=None,
-                 alert=False, nq=None, nt=None, ingest_type='AL_CLIENT', submission_profile=None):
+                 alert=False, nq=None, nt=None, ingest_type='AL_CLIENT', submission_profile=None, progress=None,
+                 hash_first=False):
         """\
 Submit a file to the ingestion queue.
 
@@ -31,9 +120,19 @@ nt         : Notification threshold. (int)
 params     : Additional submission parameters. (dict)
 ingest_type: Ingestion type, one word to describe how the data is ingested. Default: AL_CLIENT (string)
 submission_profile    : Submission profile name
+progress   : Function called with (bytes_sent, total_bytes) while the file is uploaded
+hash_first : Ingest the sha256 of the file instead of its content when the server already has it (bool)
 
 If content is provided, the path is used as metadata only.
+Files are streamed to the server in chunks, they are never fully loaded in memory.
 """
+        if self._use_hash_first(hash_first, fh, path, content):
+            res = send_known_file(self._connection, lambda known_sha256, name: self(
+                sha256=known_sha256, fname=name, params=params, metadata=metadata, alert=alert, nq=nq, nt=nt,
+                ingest_type=ingest_type, submission_profile=submission_profile), fh, path, content, fname)
+            if res is not None:
+                return res
+
         rmpath = None
         try:
             if content:
@@ -91,13 +190,13 @@ If content is provided, the path is used as metadata only.
             if submission_profile:
                 request['submission_profile'] = submission_profile
             if files:
-                data = {'json': dumps(request)}
-                headers = {'content-type': None}
+                data = MultipartEncoder({'json': dumps(request)}, 'bin', files['bin'], progress=progress)
+                headers = {'content-type': data.content_type, 'content-length': str(len(data))}
             else:
                 data = dumps(request)
                 headers = None
 
-            return self._connection.post(api_path('ingest'), data=data, files=files, headers=headers)
+            return self._connection.post(api_path('ingest'), data=data, headers=headers)
         finally:
             if rmpath:
                 try:
@@ -105,6 +204,10 @@ If content is provided, the path is used as metadata only.
                 except OSError:
                     pass
 
+    @staticmethod
+    def _use_hash_first(hash_first, fh, path, content):
+        return hash_first and (fh or content or (path and os.path.exists(path)))
+
     def get_message(self, nq):
         """\
 Return a single message from the given notification queue.
@@ -132,3 +235,134 @@ Throws a Client exception if the watch queue does not exist.
         if page_size:
             kw['page_size'] = int(page_size)
         return self._connection.get(api_path_by_module(self, nq, **kw))
+
+    def _bulk_sources(self, sources, checkpoint, kwargs):
+        for source in sources:
+            source_kwargs = dict(kwargs, **_normalize_source(source))
+            key = _source_key(source_kwargs)
+            if key is not None and key in checkpoint.done:
+                continue
+            yield source, key, source_kwargs
+
+    def _bulk_ingest_one(self, item, retries, retry_delay):
+        source, _, kwargs = item
+        try:
+            kwargs, opened, sha256 = _open_source(kwargs)
+        except OSError as e:
+            return IngestOutcome(source, None, None, e)
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    res = self(**kwargs)
+                    return IngestOutcome(source, res.get('ingest_id'), _sent_sha256(kwargs, sha256), None)
+                except Exception as e:
+                    attempt += 1
+                    if attempt > retries or not _is_retryable(e):
+                        return IngestOutcome(source, None, _sent_sha256(kwargs, sha256), e)
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+        finally:
+            if opened is not None:
+                opened.close()
+
+    def bulk(self, sources, workers=DEFAULT_BULK_WORKERS, retries=3, retry_delay=1.0, checkpoint=None,
+             min_quota=0, **kwargs):
+        """\
+Ingest many files using a pool of concurrent uploads.
+
+Required:
+sources     : Files to ingest, paths or dictionaries of ingest parameters
+              (ie: {'path': ..., 'fname': ..., 'metadata': {...}}) (iterable)
+
+Optional:
+workers     : Number of concurrent uploads (int)
+retries     : Number of times a failed item is sent again (int)
+retry_delay : Delay before the first retry of an item, doubled for each following retry (float)
+checkpoint  : Path of a file where completed sources are recorded, sources already in
+              the file are skipped so an interrupted run can be resumed (string)
+min_quota   : Stop sending files once the remaining daily API quota reaches this value (int)
+**kwargs    : Ingest parameters applied to every source (params, metadata, nq, nt, alert...)
+
+Returns a generator of IngestOutcome(source, ingest_id, sha256, error) in order of completion.
+A failure only affects its own source: ingest_id is None and error holds the exception.
+Only sources given as a path, a sha256 or a url are recorded in the checkpoint file.
+"""
+        checkpoint = _Checkpoint(checkpoint)
+        items = self._bulk_sources(sources, checkpoint, kwargs)
+        runner = self._bulk_class(self._connection)._run(
+            lambda item: self._bulk_ingest_one(item, retries, retry_delay), items, workers, min_quota)
+        try:
+            for item, outcome, error in runner:
+                if error is not None:
+                    outcome = IngestOutcome(item[0], None, None, error)
+                elif outcome.error is None:
+                    checkpoint.add(item[1], outcome)
+                yield outcome
+        finally:
+            runner.close()
+            checkpoint.close()
+
+
+class AsyncIngest(Ingest):
+    _api_module = 'ingest'
+    _bulk_class = AsyncBulk
+
+    async def __call__(self, fh=None, path=None, content=None, url=None, sha256=None, fname=None, params=None,
+                       metadata=None, alert=False, nq=None, nt=None, ingest_type='AL_CLIENT', submission_profile=None,
+                       progress=None, hash_first=False):
+        if self._use_hash_first(hash_first, fh, path, content):
+            res = await async_send_known_file(self._connection, lambda known_sha256, name: super(
+                AsyncIngest, self).__call__(sha256=known_sha256, fname=name, params=params, metadata=metadata,
+                                            alert=alert, nq=nq, nt=nt, ingest_type=ingest_type,
+                                            submission_profile=submission_profile), fh, path, content, fname)
+            if res is not None:
+                return res
+
+        return await super(AsyncIngest, self).__call__(
+            fh=fh, path=path, content=content, url=url, sha256=sha256, fname=fname, params=params,
+            metadata=metadata, alert=alert, nq=nq, nt=nt, ingest_type=ingest_type,
+            submission_profile=submission_profile, progress=progress)
+
+    __call__.__doc__ = Ingest.__call__.__doc__
+
+    async def _bulk_ingest_one(self, item, retries, retry_delay):
+        source, _, kwargs = item
+        try:
+            kwargs, opened, sha256 = _open_source(kwargs)
+        except OSError as e:
+            return IngestOutcome(source, None, None, e)
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    res = await self(**kwargs)
+                    return IngestOutcome(source, res.get('ingest_id'), _sent_sha256(kwargs, sha256), None)
+                except Exception as e:
+                    attempt += 1
+                    if attempt > retries or not _is_retryable(e):
+                        return IngestOutcome(source, None, _sent_sha256(kwargs, sha256), e)
+                await asyncio.sleep(retry_delay * 2 ** (attempt - 1))
+        finally:
+            if opened is not None:
+                opened.close()
+
+    async def bulk(self, sources, workers=DEFAULT_BULK_WORKERS, retries=3, retry_delay=1.0, checkpoint=None,
+                   min_quota=0, **kwargs):
+        checkpoint = _Checkpoint(checkpoint)
+        items = self._bulk_sources(sources, checkpoint, kwargs)
+        runner = self._bulk_class(self._connection)._run(
+            lambda item: self._bulk_ingest_one(item, retries, retry_delay), items, workers, min_quota)
+        try:
+            async for item, outcome, error in runner:
+                if error is not None:
+                    outcome = IngestOutcome(item[0], None, None, error)
+                elif outcome.error is None:
+                    checkpoint.add(item[1], outcome)
+                yield outcome
+        finally:
+            await runner.aclose()
+            checkpoint.close()
+
+    bulk.__doc__ = Ingest.bulk.__doc__
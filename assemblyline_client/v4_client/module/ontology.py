@@ -1,18 +1,30 @@
-import json
-from typing import List, Union
-from assemblyline_client.v4_client.common.utils import api_path, raw_output, stream_output
+from functools import partial
+from typing import Callable, List, Optional, Union
+from assemblyline_client.v4_client.common.utils import api_path, json_lines_output, stream_output
 
 
 class Ontology(object):
     def __init__(self, connection):
         self._connection = connection
 
+    def _get_records(self, path, output, iterate, fields, filter):
+        if output:
+            return self._connection.download(path, stream_output(output))
+
+        if iterate:
+            return self._connection.iter_json_lines(path, fields=fields, filter=filter)
+
+        return self._connection.download(path, partial(json_lines_output, fields=fields, filter=filter))
+
     def alert(
             self,
             alert_id: str,
             sha256s: Union[List[str], str] = [],
             services: Union[List[str], str] = [],
-            output=None):
+            output=None,
+            iterate: bool = False,
+            fields: Optional[List[str]] = None,
+            filter: Optional[Callable[[dict], bool]] = None):
         """\
 WARNING:
     This APIs output is considered stable but the ontology model itself is still in its
@@ -28,6 +40,9 @@ sha256s       : Single or list of sha256 to get ontology records for (strings -
 services      : Single or list of services to get ontology records for (strings - Default: all)
 output        : Output stream that will receive the raw data of
                 the API instead of json loading every record (file handle or BytesIO)
+iterate       : Return a generator decoding the records while they are received instead of a list (bool)
+fields        : Only keep these fields of the records (list of dotted field names: 'results.tags')
+filter        : Only keep the records for which filter(record) is True (callable)
 
 Throws a Client exception if the alert or submission does not exist.
 """
@@ -48,13 +63,17 @@ Throws a Client exception if the alert or submission does not exist.
         if params_tuples:
             kw['params_tuples'] = params_tuples
 
-        if output:
-            return self._connection.download(api_path('ontology', 'alert', alert_id, **kw), stream_output(output))
-
-        data = self._connection.download(api_path('ontology', 'alert', alert_id, **kw), raw_output)
-        return [json.loads(line) for line in data.splitlines()]
+        return self._get_records(api_path('ontology', 'alert', alert_id, **kw), output, iterate, fields, filter)
 
-    def file(self, sha256: str, services: Union[List[str], str] = [], all: bool = False, output=None):
+    def file(
+            self,
+            sha256: str,
+            services: Union[List[str], str] = [],
+            all: bool = False,
+            output=None,
+            iterate: bool = False,
+            fields: Optional[List[str]] = None,
+            filter: Optional[Callable[[dict], bool]] = None):
         """\
 WARNING:
     This APIs output is considered stable but the ontology model itself is still in its
@@ -70,6 +89,9 @@ services     : Single or list of services to get ontology records for (strings -
 all          : If there are multiple version of the ontology records, get them all (bool)
 output       : Output stream that will receive the raw data of
                 the API instead of json loading every record (file handle or BytesIO)
+iterate      : Return a generator decoding the records while they are received instead of a list (bool)
+fields       : Only keep these fields of the records (list of dotted field names: 'results.tags')
+filter       : Only keep the records for which filter(record) is True (callable)
 
 Throws a Client exception if the file does not exist.
 """
@@ -83,18 +105,17 @@ Throws a Client exception if the file does not exist.
             else:
                 kw['params_tuples'] = [('service', x) for x in services]
 
-        if output:
-            return self._connection.download(api_path('ontology', 'file', sha256, **kw), stream_output(output))
-
-        data = self._connection.download(api_path('ontology', 'file', sha256, **kw), raw_output)
-        return [json.loads(line) for line in data.splitlines()]
+        return self._get_records(api_path('ontology', 'file', sha256, **kw), output, iterate, fields, filter)
 
     def submission(
             self,
             sid: str,
             sha256s: Union[List[str], str] = [],
             services: Union[List[str], str] = [],
-            output=None):
+            output=None,
+            iterate: bool = False,
+            fields: Optional[List[str]] = None,
+            filter: Optional[Callable[[dict], bool]] = None):
         """\
 WARNING:
     This APIs output is considered stable but the ontology model itself is still in its
@@ -110,6 +131,9 @@ sha256s       : Single or list of sha256 to get ontology records for (Default: a
 services      : Single or list of services to get ontology records for (Default: all)
 output        : Output stream that will receive the raw data of
                 the API instead of json loading every record (file handle or BytesIO)
+iterate       : Return a generator decoding the records while they are received instead of a list (bool)
+fields        : Only keep these fields of the records (list of dotted field names: 'results.tags')
+filter        : Only keep the records for which filter(record) is True (callable)
 
 Throws a Client exception if the submission does not exist.
 """
@@ -131,8 +155,4 @@ Throws a Client exception if the submission does not exist.
         if params_tuples:
             kw['params_tuples'] = params_tuples
 
-        if output:
-            return self._connection.download(api_path('ontology', 'submission', sid, **kw), stream_output(output))
-
-        data = self._connection.download(api_path('ontology', 'submission', sid, **kw), raw_output)
-        return [json.loads(line) for line in data.splitlines()]
+        return self._get_records(api_path('ontology', 'submission', sid, **kw), output, iterate, fields, filter)
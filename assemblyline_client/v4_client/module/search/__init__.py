@@ -6,7 +6,7 @@ from assemblyline_client.v4_client.module.search.fields import Fields
 from assemblyline_client.v4_client.module.search.grouped import Grouped
 from assemblyline_client.v4_client.module.search.histogram import Histogram
 from assemblyline_client.v4_client.module.search.stats import Stats
-from assemblyline_client.v4_client.module.search.stream import Stream
+from assemblyline_client.v4_client.module.search.stream import AsyncStream, Stream
 
 
 class Search(object):
@@ -19,7 +19,8 @@ class Search(object):
         self.stats = Stats(connection)
         self.stream = Stream(connection, self._do_search)
 
-    def _do_search(self, index, query, use_archive=False, track_total_hits=None, **kwargs):
+    @staticmethod
+    def _search_request(index, query, use_archive=False, track_total_hits=None, **kwargs):
         if index not in SEARCHABLE:
             raise ClientError("Index %s is not searchable" % index, 400)
 
@@ -36,8 +37,41 @@ class Search(object):
             kwargs['use_archive'] = ''
         if track_total_hits:
             kwargs['track_total_hits'] = track_total_hits
-        path = api_path('search', index)
-        return self._connection.post(path, data=json.dumps(kwargs))
+        return api_path('search', index), json.dumps(kwargs)
+
+    def _do_search(self, index, query, use_archive=False, track_total_hits=None, **kwargs):
+        path, data = self._search_request(index, query, use_archive=use_archive, track_total_hits=track_total_hits,
+                                          **kwargs)
+        return self._connection.post(path, data=data)
+
+    def iter_items(self, index, query, filters=None, fl=None, offset=0, rows=25, sort=None, timeout=None,
+                   use_archive=False, track_total_hits=None):
+        """\
+Search an index with a lucene query and yield the items as they are received.
+
+The response is decoded while it is downloaded so the items of large pages (high rows)
+can be processed without holding the whole page in memory.
+
+Required:
+index   : Index to search (string)
+query   : lucene query (string)
+
+Optional:
+filters           : Additional lucene queries used to filter the data (list of strings)
+fl                : List of fields to return (comma separated string of fields)
+offset            : Offset at which the query items should start (integer)
+rows              : Number of records to return (integer)
+sort              : Field used for sorting with direction (string: ex. 'id desc')
+timeout           : Maximum execution time in milliseconds (integer)
+use_archive       : Also query the archive
+track_total_hits  : Number of hits to track (default: 10k)
+
+Returns a generator of the items.
+"""
+        path, data = self._search_request(index, query, filters=filters, fl=fl, offset=offset, rows=rows, sort=sort,
+                                          timeout=timeout, use_archive=use_archive,
+                                          track_total_hits=track_total_hits)
+        return self._connection.iter_json(path, [('items',)], method='post', members_only=True, data=data)
 
     def alert(self, query, filters=None, fl=None, offset=0, rows=25, sort=None, timeout=None,
               use_archive=False, track_total_hits=None):
@@ -254,3 +288,9 @@ Returns all results.
         return self._do_search('workflow', query, filters=filters, fl=fl, offset=offset,
                                rows=rows, sort=sort, timeout=timeout,
                                use_archive=use_archive, track_total_hits=track_total_hits)
+
+
+class AsyncSearch(Search):
+    def __init__(self, connection):
+        super(AsyncSearch, self).__init__(connection)
+        self.stream = AsyncStream(connection, self._do_search)
@@ -1,39 +1,155 @@
+import asyncio
+import queue
+import string
 import threading
 import time
 
+from collections import deque
+
 from assemblyline_client.v4_client.common.utils import SEARCHABLE, ClientError, INVALID_STREAM_SEARCH_PARAMS
 
+# Marks the end of a page worker inside the stream queue
+_WORKER_DONE = object()
 
-class Stream(object):
-    def __init__(self, connection, do_search):
-        self._connection = connection
-        self._do_search = do_search
-        self._page_size = 100
-        self._max_yield_cache = 100
 
-    def _auto_fill(self, items, lock, index, query, **kwargs):
-        done = False
-        while not done:
-            skip = False
-            with lock:
-                if len(items) > self._max_yield_cache:
-                    skip = True
+class _WorkerError(object):
+    def __init__(self, error):
+        self.error = error
 
-            if skip:
-                time.sleep(0.01)
-                continue
 
-            j = self._do_search(index, query, **kwargs)
+class StreamStats(object):
+    """\
+Paging statistics of a search stream.
 
-            # Replace cursorMark.
-            kwargs['deep_paging_id'] = j.get('next_deep_paging_id', '*')
+pages            : Number of pages fetched from the server
+items            : Number of items returned to the caller
+producer_blocked : Seconds the page workers waited for room in the queue (back-pressure)
+consumer_blocked : Seconds the caller waited for a page to be fetched
+completed        : True once every page was fetched and returned
+"""
 
-            with lock:
-                items.extend(j['items'])
+    def __init__(self):
+        self.pages = 0
+        self.items = 0
+        self.producer_blocked = 0.0
+        self.consumer_blocked = 0.0
+        self.completed = False
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<StreamStats pages=%s items=%s items_per_second=%.1f producer_blocked=%.3fs " \
+            "consumer_blocked=%.3fs completed=%s>" % (self.pages, self.items, self.items_per_second,
+                                                      self.producer_blocked, self.consumer_blocked, self.completed)
+
+    def _add_page(self, blocked):
+        with self._lock:
+            self.pages += 1
+            self.producer_blocked += blocked
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def items_per_second(self):
+        duration = self.duration
+        if not duration:
+            return 0.0
+        return self.items / duration
+
+
+class StreamIterator(object):
+    """\
+Iterator over the items of a search stream. The stats attribute holds its StreamStats.
+
+Closing the iterator, or dropping every reference to it, stops the page workers.
+"""
 
-            done = self._page_size - len(j['items'])
+    def __init__(self, generator, stats):
+        self._generator = generator
+        self.stats = stats
 
-    def _do_stream(self, index, query, **kwargs):
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._generator)
+
+    def close(self):
+        self._generator.close()
+
+
+class AsyncStreamIterator(object):
+    """\
+Asynchronous iterator over the items of a search stream. The stats attribute holds its StreamStats.
+"""
+
+    def __init__(self, generator, stats):
+        self._generator = generator
+        self.stats = stats
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._generator.__anext__()
+
+    async def aclose(self):
+        await self._generator.aclose()
+
+
+def hash_prefix_slices(field='id', length=1, alphabet=string.hexdigits[:16]):
+    """\
+Build disjoint slices for Stream.parallel based on the prefix of a hash field.
+
+Optional:
+field    : Field holding a lowercase hexadecimal hash (string, default: id)
+length   : Number of prefix characters per slice, 1 gives 16 slices, 2 gives 256 (int)
+alphabet : Characters the field values can start with (string)
+
+Every value starting with a character of the alphabet is covered by exactly one slice.
+"""
+    prefixes = ['']
+    for _ in range(length):
+        prefixes = [p + c for p in prefixes for c in alphabet]
+    return ["%s:%s*" % (field, p) for p in prefixes]
+
+
+def time_slices(field, start, end, count):
+    """\
+Build disjoint slices for Stream.parallel by splitting a timestamp field into time ranges.
+
+Required:
+field : Timestamp field to split on (string: ex. 'times.submitted')
+start : Beginning of the period to split (datetime)
+end   : End of the period to split (datetime)
+count : Number of slices to create (int)
+
+The first and last slices are open ended so documents outside of [start, end] are still returned.
+"""
+    if count < 1 or end <= start:
+        raise ClientError("Time slices need a positive count and a start before the end", 400)
+
+    step = (end - start) / count
+    bounds = ['*'] + [(start + step * i).strftime("%Y-%m-%dT%H:%M:%S.%fZ") for i in range(1, count)] + ['*']
+    return ["%s:[%s TO %s%s" % (field, bounds[i], bounds[i + 1], ']' if i == count - 1 else '}')
+            for i in range(count)]
+
+
+class Stream(object):
+    _iterator_class = StreamIterator
+
+    def __init__(self, connection, do_search):
+        self._connection = connection
+        self._do_search = do_search
+        self._page_size = 100
+        self._max_yield_cache = 100
+
+    def _prepare_stream(self, index, slices, workers, page_size, kwargs):
         if index not in SEARCHABLE:
             raise ClientError("Index %s is not searchable" % index, 400)
 
@@ -44,27 +160,135 @@ class Stream(object):
                     ", ".join(INVALID_STREAM_SEARCH_PARAMS), 400
                 )
 
+        if not slices:
+            raise ClientError("A parallel stream needs at least one slice", 400)
+
+        if int(workers) < 1:
+            raise ClientError("A parallel stream needs at least one worker", 400)
+
         kwargs.update({
-            'rows': str(self._page_size),
+            'rows': str(page_size),
             'deep_paging_id': '*'
         })
 
-        yield_done = False
-        items = []
-        lock = threading.Lock()
-        sf_t = threading.Thread(target=self._auto_fill, args=[items, lock, index, query], kwargs=kwargs)
-        sf_t.setDaemon(True)
-        sf_t.start()
-        while not yield_done:
+        filters = kwargs.pop('filters', None) or []
+        if isinstance(filters, str):
+            filters = [filters]
+
+        return filters, min(int(workers), len(slices))
+
+    @staticmethod
+    def _slice_kwargs(kwargs, filters, cur_slice):
+        if cur_slice:
+            filters = filters + [cur_slice]
+        return dict(kwargs, filters=filters or None)
+
+    def _start_stream(self, index, query, slices, workers, page_size, max_queued, **kwargs):
+        filters, workers = self._prepare_stream(index, slices, workers, page_size, kwargs)
+
+        # The queue holds whole pages, max_queued is rounded up to a number of pages
+        max_pages = max(1, -(-int(max_queued) // int(page_size)))
+
+        stats = StreamStats()
+        generator = self._stream(index, query, slices, workers, max_pages, filters, stats, **kwargs)
+        return self._iterator_class(generator, stats)
+
+    def _stream(self, index, query, slices, workers, max_pages, filters, stats, **kwargs):
+        stats.start_time = time.time()
+        page_size = int(kwargs['rows'])
+        pending = deque(slices)
+        pages = queue.Queue(maxsize=max_pages)
+        stop = threading.Event()
+
+        def put(page):
+            # Block while the queue is full but give up as soon as the consumer is gone
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker():
             try:
-                with lock:
-                    item = items.pop(0)
+                while not stop.is_set():
+                    try:
+                        slice_kwargs = self._slice_kwargs(kwargs, filters, pending.popleft())
+                    except IndexError:
+                        break
+
+                    done = False
+                    while not done and not stop.is_set():
+                        j = self._do_search(index, query, **slice_kwargs)
+
+                        # Replace cursorMark.
+                        slice_kwargs['deep_paging_id'] = j.get('next_deep_paging_id', '*')
+
+                        blocked_start = time.time()
+                        if j['items'] and not put(j['items']):
+                            return
+                        stats._add_page(time.time() - blocked_start)
+
+                        done = page_size - len(j['items'])
+            except Exception as e:
+                put(_WorkerError(e))
+            else:
+                put(_WORKER_DONE)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for t in threads:
+            t.start()
+
+        try:
+            while workers:
+                blocked_start = time.time()
+                page = pages.get()
+                stats.consumer_blocked += time.time() - blocked_start
+
+                if page is _WORKER_DONE:
+                    workers -= 1
+                elif isinstance(page, _WorkerError):
+                    raise page.error
+                else:
+                    for item in page:
+                        stats.items += 1
+                        yield item
+
+            stats.completed = True
+        finally:
+            stop.set()
+            stats.end_time = time.time()
+
+    def _do_parallel_stream(self, index, query, slices, workers, page_size, max_queued, **kwargs):
+        return self._start_stream(index, query, slices, workers, page_size, max_queued, **kwargs)
+
+    def _do_stream(self, index, query, **kwargs):
+        return self._start_stream(index, query, [None], 1, self._page_size, self._max_yield_cache, **kwargs)
+
+    def parallel(self, index, query, slices, filters=None, fl=None, workers=4, page_size=100, max_queued=1000):
+        """\
+Get all items of an index from a lucene query by paging through multiple slices of the query in parallel.
+
+Required:
+index      : Index to stream from (string: ex. 'result')
+query      : lucene query (string)
+slices     : Disjoint lucene filters that together cover the query (list of strings)
+             see hash_prefix_slices() and time_slices() in this module to build them
 
-                yield item
-            except IndexError:
-                if not sf_t.is_alive() and len(items) == 0:
-                    yield_done = True
-                time.sleep(0.01)
+Optional:
+filters    : Additional lucene queries used to filter the data (list of strings)
+fl         : List of fields to return (comma separated string of fields)
+workers    : Number of slices paged through at the same time (int)
+page_size  : Number of items fetched per request (int)
+max_queued : Maximum number of fetched items waiting to be consumed (int)
+
+Returns an iterator that merges the items of all slices in no particular order.
+Memory usage is bounded by max_queued + workers * page_size items.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
+"""
+        return self._do_parallel_stream(index, query, slices, workers, page_size, max_queued,
+                                        filters=filters, fl=fl)
 
     def alert(self, query, filters=None, fl=None):
         """\
@@ -77,7 +301,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('alert', query, filters=filters, fl=fl)
 
@@ -92,7 +317,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('badlist', query, filters=filters, fl=fl)
 
@@ -107,7 +333,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('file', query, filters=filters, fl=fl)
 
@@ -122,7 +349,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('heuristic', query, filters=filters, fl=fl)
 
@@ -137,7 +365,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('result', query, filters=filters, fl=fl)
 
@@ -152,7 +381,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('signature', query, filters=filters, fl=fl)
 
@@ -167,7 +397,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('safelist', query, filters=filters, fl=fl)
 
@@ -182,7 +413,8 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('submission', query, filters=filters, fl=fl)
 
@@ -197,6 +429,61 @@ Optional:
 filters : Additional lucene queries used to filter the data (list of strings)
 fl      : List of fields to return (comma separated string of fields)
 
-Returns a generator that transparently and efficiently pages through results.
+Returns an iterator that transparently and efficiently pages through results.
+Its stats attribute holds the paging statistics of the stream (see StreamStats).
 """
         return self._do_stream('workflow', query, filters=filters, fl=fl)
+
+
+class AsyncStream(Stream):
+    _iterator_class = AsyncStreamIterator
+
+    async def _stream(self, index, query, slices, workers, max_pages, filters, stats, **kwargs):
+        stats.start_time = time.time()
+        page_size = int(kwargs['rows'])
+        pending = deque(slices)
+        pages = asyncio.Queue(maxsize=max_pages)
+
+        async def worker():
+            try:
+                while pending:
+                    slice_kwargs = self._slice_kwargs(kwargs, filters, pending.popleft())
+                    done = False
+                    while not done:
+                        j = await self._do_search(index, query, **slice_kwargs)
+
+                        # Replace cursorMark.
+                        slice_kwargs['deep_paging_id'] = j.get('next_deep_paging_id', '*')
+
+                        blocked_start = time.time()
+                        if j['items']:
+                            await pages.put(j['items'])
+                        stats._add_page(time.time() - blocked_start)
+
+                        done = page_size - len(j['items'])
+            except Exception as e:
+                await pages.put(_WorkerError(e))
+            else:
+                await pages.put(_WORKER_DONE)
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+        try:
+            while workers:
+                blocked_start = time.time()
+                page = await pages.get()
+                stats.consumer_blocked += time.time() - blocked_start
+
+                if page is _WORKER_DONE:
+                    workers -= 1
+                elif isinstance(page, _WorkerError):
+                    raise page.error
+                else:
+                    for item in page:
+                        stats.items += 1
+                        yield item
+
+            stats.completed = True
+        finally:
+            for task in tasks:
+                task.cancel()
+            stats.end_time = time.time()
@@ -1,5 +1,6 @@
 import logging
 import socketio
+import threading
 import time
 import warnings
 
@@ -7,6 +8,104 @@ from copy import deepcopy
 
 from assemblyline_client.v4_client.common.utils import ClientError
 
+SUBMISSION_COMPLETED = "SubmissionCompleted"
+
+
+def get_message_submission(data):
+    # Submission messages are either the submission itself or wrapped in a message envelope
+    if isinstance(data, dict) and isinstance(data.get('msg'), dict):
+        return data['msg']
+    return data if isinstance(data, dict) else {}
+
+
+class SubmissionWatcher(object):
+    def __init__(self, server, header, callback, silence_warnings=False, reconnect_delay=5.0):
+        """
+        Listens in a background thread for the completed submission messages of the system over
+        a single socketio connection and calls callback with the submission of every message.
+
+        The connection is re-established after reconnect_delay seconds when it drops. The
+        connected event is only set while messages can be received, callers are expected to
+        fall back to polling the server otherwise. A connection refused by the server is not
+        retried: the watcher stops and error is set to a ClientError with a 403 status code.
+        """
+        self._server = server
+        self._header = header
+        self._callback = callback
+        self._silence_warnings = silence_warnings
+        self.reconnect_delay = reconnect_delay
+        self.connected = threading.Event()
+        self.error = None
+        self._sio = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _on_completed(self, data):
+        # noinspection PyBroadException
+        try:
+            self._callback(get_message_submission(data))
+        except Exception:
+            logging.getLogger('assemblyline_client').exception("Submission completed callback failed")
+
+    def _listen(self):
+        # Returns False if the server refused the connection and it should not be retried
+        sio = socketio.Client(ssl_verify=False, reconnection=False)
+        sio.on(SUBMISSION_COMPLETED, self._on_completed, namespace='/submissions')
+        sio.on("disconnect", lambda *_: self.connected.clear(), namespace='/submissions')
+        self._sio = sio
+        try:
+            sio.connect(self._server, namespaces=['/submissions'], headers=deepcopy(self._header))
+            sio.emit('monitor', {"status": "start", "client": "assemblyline_client"}, namespace='/submissions')
+            self.connected.set()
+            self.error = None
+            if not self._stop.is_set():
+                sio.wait()
+        except socketio.exceptions.ConnectionError as e:
+            # Recent clients report the namespace refused by the server (authentication, permissions)
+            # as a failed namespace instead of raising ConnectionRefusedError
+            if isinstance(e, socketio.exceptions.ConnectionRefusedError) or \
+                    '/submissions' in getattr(sio, 'failed_namespaces', []):
+                self.error = ClientError(f"Connection refused to the socketIO server [{str(e)}]", 403)
+                return False
+            self.error = e
+        finally:
+            self.connected.clear()
+            # noinspection PyBroadException
+            try:
+                sio.disconnect()
+            except Exception:
+                pass
+        return True
+
+    def _run(self):
+        with warnings.catch_warnings():
+            if self._silence_warnings:
+                warnings.simplefilter("ignore")
+
+            while not self._stop.is_set():
+                if not self._listen():
+                    return
+                self._stop.wait(self.reconnect_delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        # noinspection PyBroadException
+        try:
+            if self._sio is not None:
+                self._sio.disconnect()
+        except Exception:
+            pass
+        if self._thread is not None:
+            self._thread.join()
+
 
 class SocketIO(object):
     def __init__(self, connection):
@@ -204,6 +303,19 @@ This function wait indefinitely and calls the appropriate callback for each mess
 
         self._listen_loop(listen, timeout, reconnect)
 
+    def watch_submissions(self, completed_callback):
+        """\
+Listen in the background to the submission completed messages of the system over a single connection
+
+Required:
+    completed_callback : Callback function called with the submission of each completed message
+
+Returns a started SubmissionWatcher, call its stop() method to close the connection. Its connected
+event tells if messages are currently received.
+"""
+        return SubmissionWatcher(self._server, self._header, completed_callback,
+                                 silence_warnings=self._silence_warnings).start()
+
     def listen_on_watch_queue(self, wq, result_callback=None, error_callback=None, timeout=None, reconnect=True):
         """\
 Listen to the various messages of a currently running submission's watch queue
@@ -1,11 +1,38 @@
+import asyncio
+import queue
+import time
+
 from json import dumps
 
-from assemblyline_client.v4_client.common.utils import api_path, api_path_by_module
+from assemblyline_client.v4_client.common.utils import ClientError, api_path, api_path_by_module
+from assemblyline_client.v4_client.common.waiter import SubmissionWaiter
+from assemblyline_client.v4_client.module.socketio import SocketIO
+
+# Number of sids checked by a single search request
+COMPLETION_BATCH_SIZE = 256
+FULL_CONTAINERS = [('results',), ('errors',), ('files',), ('file_infos',)]
+
+
+def _completed_queries(sids):
+    sids = list(dict.fromkeys(sids))
+    for i in range(0, len(sids), COMPLETION_BATCH_SIZE):
+        batch = sids[i:i + COMPLETION_BATCH_SIZE]
+        yield batch, dumps({
+            'query': 'sid:(%s)' % ' OR '.join('"%s"' % sid for sid in batch),
+            'filters': ['state:completed'],
+            'fl': 'sid',
+            'rows': len(batch),
+        })
+
+
+def _wait_timed_out(remaining):
+    return ClientError("Timed out while waiting for %d submission(s) to complete." % len(remaining), 408)
 
 
 class Submission(object):
     def __init__(self, connection):
         self._connection = connection
+        self._socketio = None
 
     def __call__(self, sid):
         """\
@@ -55,15 +82,25 @@ Throws a Client exception if the submission and/or file does not exist.
         else:
             return self._connection.get(path)
 
-    def full(self, sid):
+    def full(self, sid, incremental=False):
         """\
 Return the full result for the given submission.
 
 Required:
-sid     : Submission ID. (string)
+sid         : Submission ID. (string)
+
+Optional:
+incremental : Decode the response while it is received (boolean)
+
+With incremental, a generator of (path, value) tuples is returned instead. Results, errors,
+files and file_infos are yielded one at a time as they are received, ie: (('results', key), result)
+or (('files', 0), file), so large submissions do not have to be held in memory all at once.
+The other fields of the submission are yielded whole, ie: (('sid',), sid).
 
 Throws a Client exception if the submission does not exist.
 """
+        if incremental:
+            return self._connection.iter_json(api_path_by_module(self, sid), FULL_CONTAINERS)
         return self._connection.get(api_path_by_module(self, sid))
 
     def is_completed(self, sid):
@@ -79,6 +116,63 @@ Throws a Client exception if the submission does not exist.
 """
         return self._connection.get(api_path_by_module(self, sid))
 
+    def is_completed_many(self, sids):
+        """\
+Check which of the submissions with the given sids are completed.
+
+Required:
+sids    : Submission IDs. (list of strings)
+
+Returns the list of the completed sids, they are checked in batches with a single
+search request per batch. Submissions that do not exist are never completed.
+"""
+        completed = []
+        for _, data in _completed_queries(sids):
+            response = self._connection.post(api_path('search', 'submission'), data=data)
+            completed.extend(item['sid'] for item in response['items'])
+        return completed
+
+    def wait(self, sids, timeout=None, push=True, poll_interval=2.0):
+        """\
+Wait for the submissions with the given sids to complete.
+
+Required:
+sids          : Submission IDs. (list of strings)
+
+Optional:
+timeout       : Maximum number of seconds to wait for all the submissions (float)
+push          : Receive the completions over a single socketio connection (bool)
+poll_interval : Number of seconds between completion checks when completions are not pushed (float)
+
+Yields the submission record of each submission as soon as it is completed. Completion
+checks are batched so the number of requests grows with the number of completions, not
+with the number of submissions waited on.
+
+Throws a Client exception if the timeout expires before all the submissions are completed.
+"""
+        remaining = set(sids)
+        if not remaining:
+            return
+
+        if push and self._socketio is None:
+            self._socketio = SocketIO(self._connection)
+
+        completed = queue.Queue()
+        end = None if timeout is None else time.monotonic() + timeout
+        with SubmissionWaiter(self, self._socketio if push else None, poll_interval=poll_interval) as waiter:
+            for sid in remaining:
+                waiter.add(sid, completed.put)
+
+            while remaining:
+                try:
+                    sid = completed.get(timeout=None if end is None else max(0.0, end - time.monotonic()))
+                except queue.Empty:
+                    raise _wait_timed_out(remaining)
+
+                if sid in remaining:
+                    remaining.discard(sid)
+                    yield self(sid)
+
     def list(self, user=None, group=None, fq=None, rows=10, offset=0, use_archive=False, track_total_hits=None):
         """\
 List all submissions of a given group or user.
@@ -207,3 +301,53 @@ sid     : Submission ID. (string)
 Throws a Client exception if the submission does not exist.
 """
         return self._connection.get(api_path_by_module(self, sid))
+
+
+class AsyncSubmission(Submission):
+    _api_module = 'submission'
+
+    async def is_completed_many(self, sids):
+        """\
+Check which of the submissions with the given sids are completed.
+
+Required:
+sids    : Submission IDs. (list of strings)
+
+Returns the list of the completed sids, they are checked in batches with a single
+search request per batch. Submissions that do not exist are never completed.
+"""
+        completed = []
+        for _, data in _completed_queries(sids):
+            response = await self._connection.post(api_path('search', 'submission'), data=data)
+            completed.extend(item['sid'] for item in response['items'])
+        return completed
+
+    async def wait(self, sids, timeout=None, poll_interval=2.0):
+        """\
+Wait for the submissions with the given sids to complete.
+
+Required:
+sids          : Submission IDs. (list of strings)
+
+Optional:
+timeout       : Maximum number of seconds to wait for all the submissions (float)
+poll_interval : Number of seconds between completion checks (float)
+
+Asynchronously yields the submission record of each submission as soon as it is completed.
+Completions are polled in batches, socketio is not available on the asynchronous client.
+
+Throws a Client exception if the timeout expires before all the submissions are completed.
+"""
+        remaining = set(sids)
+        end = None if timeout is None else time.monotonic() + timeout
+        while remaining:
+            for sid in await self.is_completed_many(remaining):
+                if sid in remaining:
+                    remaining.discard(sid)
+                    yield await self(sid)
+
+            if remaining:
+                if end is not None and time.monotonic() >= end:
+                    raise _wait_timed_out(remaining)
+                delay = poll_interval if end is None else min(poll_interval, max(0.0, end - time.monotonic()))
+                await asyncio.sleep(delay)
@@ -3,14 +3,17 @@ import os
 from json import dumps
 
 from assemblyline_client.v4_client.common.utils import api_path, api_path_by_module, get_function_kwargs, ClientError
-from assemblyline_client.v4_client.common.submit_utils import get_file_handler
+from assemblyline_client.v4_client.common.multipart import MultipartEncoder
+from assemblyline_client.v4_client.common.submit_utils import async_send_known_file, send_known_file, \
+    get_file_handler
 
 
 class Submit(object):
     def __init__(self, connection):
         self._connection = connection
 
-    def __call__(self, fh=None, path=None, content=None, url=None, sha256=None, fname=None, params=None, metadata=None, submission_profile=None):
+    def __call__(self, fh=None, path=None, content=None, url=None, sha256=None, fname=None, params=None, metadata=None, submission_profile=None,
+                 progress=None, hash_first=False):
         """\
 Submit a file to be dispatched.
 
@@ -26,9 +29,19 @@ fname       : Name of the file to scan
 metadata    : Metadata to include with submission. (dict)
 params      : Additional submission parameters. (dict)
 submission_profile     : Submission profile name
+progress    : Function called with (bytes_sent, total_bytes) while the file is uploaded
+hash_first  : Submit the sha256 of the file instead of its content when the server already has it (bool)
 
 If content is provided, the path is used as metadata only.
+Files are streamed to the server in chunks, they are never fully loaded in memory.
 """
+        if self._use_hash_first(hash_first, fh, path, content):
+            res = send_known_file(self._connection, lambda known_sha256, name: self(
+                sha256=known_sha256, fname=name, params=params, metadata=metadata,
+                submission_profile=submission_profile), fh, path, content, fname)
+            if res is not None:
+                return res
+
         rmpath = None
         try:
             if content:
@@ -78,13 +91,13 @@ If content is provided, the path is used as metadata only.
                 request['submission_profile'] = submission_profile
 
             if files:
-                data = {'json': dumps(request)}
-                headers = {'content-type': None}
+                data = MultipartEncoder({'json': dumps(request)}, 'bin', files['bin'], progress=progress)
+                headers = {'content-type': data.content_type, 'content-length': str(len(data))}
             else:
                 data = dumps(request)
                 headers = None
 
-            return self._connection.post(api_path('submit'), data=data, files=files, headers=headers)
+            return self._connection.post(api_path('submit'), data=data, headers=headers)
         finally:
             if rmpath:
                 try:
@@ -92,6 +105,10 @@ If content is provided, the path is used as metadata only.
                 except OSError:
                     pass
 
+    @staticmethod
+    def _use_hash_first(hash_first, fh, path, content):
+        return hash_first and (fh or content or (path and os.path.exists(path)))
+
     # noinspection PyUnusedLocal
     def dynamic(self, sha256, copy_sid=None, name=None):
         """\
@@ -115,3 +132,22 @@ sid     : Submission ID. (string)
 Throws a Client exception if the submission does not exist.
 """
         return self._connection.get(api_path_by_module(self, sid))
+
+
+class AsyncSubmit(Submit):
+    _api_module = 'submit'
+
+    async def __call__(self, fh=None, path=None, content=None, url=None, sha256=None, fname=None, params=None,
+                       metadata=None, submission_profile=None, progress=None, hash_first=False):
+        if self._use_hash_first(hash_first, fh, path, content):
+            res = await async_send_known_file(self._connection, lambda known_sha256, name: super(
+                AsyncSubmit, self).__call__(sha256=known_sha256, fname=name, params=params, metadata=metadata,
+                                            submission_profile=submission_profile), fh, path, content, fname)
+            if res is not None:
+                return res
+
+        return await super(AsyncSubmit, self).__call__(
+            fh=fh, path=path, content=content, url=url, sha256=sha256, fname=fname, params=params,
+            metadata=metadata, submission_profile=submission_profile, progress=progress)
+
+    __call__.__doc__ = Submit.__call__.__doc__
@@ -57,10 +57,14 @@ setup(
         'socketio-client==0.5.7.4'
     ],
     extras_require={
+        'async': [
+            'httpx',
+        ],
         'test': [
             'pytest',
             'cart',
             'assemblyline',
+            'httpx',
         ]
     },
     keywords='development assemblyline client gc canada cse-cst cse cst',
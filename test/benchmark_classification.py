@@ -0,0 +1,79 @@
+"""
+Micro-benchmarks of the classification engine on realistic definitions.
+
+Usage: python test/benchmark_classification.py [checks]
+
+Every operation is timed on the default definition and on a large one (hundreds of groups,
+subgroups and group aliases), with the parsed classification cache disabled (cold) and enabled.
+"""
+import random
+import sys
+import time
+
+from assemblyline_client.common.classification import Classification, InvalidClassification
+from classification_definition import get_definition, get_markings
+
+USER = "TLP:A//CMR/LE//REL TO D1, D3/T1/T2"
+DISTINCT_MARKINGS = 250
+
+
+def get_valid_markings(definition, count, seed=0):
+    engine = Classification(definition)
+    out = []
+    for c12n in get_markings(definition, count=count * 4, seed=seed):
+        try:
+            engine.normalize_classification(c12n)
+        except InvalidClassification:
+            continue
+        out.append(c12n)
+    return out[:count]
+
+
+def timed(func, markings):
+    start = time.perf_counter()
+    for c12n in markings:
+        func(c12n)
+    return (time.perf_counter() - start) / len(markings) * 1e6
+
+
+def bench_operations(name, definition, checks):
+    rand = random.Random(0)
+    distinct = get_valid_markings(definition, DISTINCT_MARKINGS)
+    markings = [rand.choice(distinct) for _ in range(checks)]
+
+    # get_dynamic_groups=False skips the set of already normalized classifications so the work is measured
+    operations = [
+        ("normalize (long)", lambda e: lambda c: e.normalize_classification(c, get_dynamic_groups=False)),
+        ("normalize (short)", lambda e: lambda c: e.normalize_classification(c, long_format=False,
+                                                                             get_dynamic_groups=False)),
+        ("max_classification", lambda e: lambda c: e.max_classification(USER, c)),
+        ("min_classification", lambda e: lambda c: e.min_classification(USER, c)),
+        ("is_accessible", lambda e: lambda c: e.is_accessible(USER, c, ignore_invalid=True)),
+    ]
+    engines = [
+        ("cold", Classification(definition, parts_cache_size=0, compiled=False)),
+        ("cached", Classification(definition, compiled=False)),
+        ("compiled", Classification(definition)),
+    ]
+
+    print("%s definition: %d groups, %d subgroups, %d operations over %d distinct markings" % (
+        name, len(definition['groups']), len(definition['subgroups']), checks, len(distinct)))
+    print("    %-20s" % "us/op" + "".join("%12s" % engine_name for engine_name, _ in engines))
+    for op_name, op in operations:
+        print("    %-20s" % op_name + "".join("%12.2f" % timed(op(engine), markings) for _, engine in engines))
+
+    # Filtering a search export by the clearance of a user
+    engine = Classification(definition)
+    start = time.perf_counter()
+    engine.is_accessible_many(USER, markings, ignore_invalid=True)
+    print("    %-20s" % "is_accessible_many" + "%36.2f" % ((time.perf_counter() - start) / checks * 1e6))
+    print()
+
+
+def main(checks=20000):
+    bench_operations("Default", get_definition(), checks)
+    bench_operations("Large", get_definition(extra_groups=400, extra_subgroups=200), checks)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
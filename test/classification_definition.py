@@ -0,0 +1,105 @@
+import itertools
+import random
+
+LEVELS = [
+    {'lvl': 100, 'name': 'TLP:CLEAR', 'short_name': 'TLP:C', 'aliases': ['UNRESTRICTED', 'OPEN']},
+    {'lvl': 110, 'name': 'TLP:GREEN', 'short_name': 'TLP:G', 'aliases': []},
+    {'lvl': 200, 'name': 'TLP:AMBER', 'short_name': 'TLP:A', 'aliases': ['RESTRICTED']},
+    {'lvl': 210, 'name': 'TLP:AMBER+STRICT', 'short_name': 'TLP:A+S', 'aliases': []},
+]
+
+REQUIRED = [
+    {'name': 'COMMERCIAL', 'short_name': 'CMR', 'aliases': []},
+    {'name': 'LEGAL', 'short_name': 'LE', 'aliases': ['LAW'], 'require_lvl': 200},
+    {'name': 'CONTROLLED', 'short_name': 'CTL', 'aliases': ['CC'], 'is_required_group': True},
+]
+
+GROUPS = [
+    {'name': 'DEPARTMENT 1', 'short_name': 'D1', 'aliases': ['DEPTS', 'ANY'], 'auto_select': True},
+    {'name': 'DEPARTMENT 2', 'short_name': 'D2', 'aliases': ['DEPTS']},
+    {'name': 'DEPARTMENT 3', 'short_name': 'D3', 'aliases': [], 'solitary_display_name': 'SOLO'},
+    {'name': 'INTERNAL', 'short_name': 'INT', 'aliases': []},
+]
+
+SUBGROUPS = [
+    {'name': 'TEAM 1', 'short_name': 'T1', 'aliases': [], 'auto_select': True},
+    {'name': 'TEAM 2', 'short_name': 'T2', 'aliases': [], 'require_group': 'D1'},
+    {'name': 'RESERVE', 'short_name': 'RSV', 'aliases': [], 'require_group': 'D2', 'limited_to_group': 'D2'},
+]
+
+
+def get_definition(enforce=True, extra_groups=0, extra_subgroups=0):
+    """
+    Classification definition shaped like the ones used in production.
+
+    extra_groups adds that many groups to the definition with an alias for every pair of them
+    and extra_subgroups adds that many subgroups, every other one requiring one of the groups.
+    """
+    groups = [dict(g) for g in GROUPS]
+    for i in range(extra_groups):
+        groups.append({'name': 'GROUP %03d' % i, 'short_name': 'G%03d' % i, 'aliases': ['PAIR%03d' % (i // 2)]})
+
+    subgroups = [dict(g) for g in SUBGROUPS]
+    for i in range(extra_subgroups):
+        subgroup = {'name': 'SUBGROUP %03d' % i, 'short_name': 'S%03d' % i, 'aliases': []}
+        if i % 2 and groups:
+            subgroup['require_group'] = groups[i % len(groups)]['short_name']
+        subgroups.append(subgroup)
+
+    return {
+        'enforce': enforce,
+        'dynamic_groups': False,
+        'dynamic_groups_type': 'email',
+        'levels': [dict(x) for x in LEVELS],
+        'required': [dict(x) for x in REQUIRED],
+        'groups': groups,
+        'subgroups': subgroups,
+        'restricted': 'TLP:A+S//CMR',
+        'unrestricted': 'TLP:C',
+    }
+
+
+def get_markings(definition, count=None, seed=0):
+    """
+    Returns classification markings made of every combination of the parts of the definition in long and
+    short format, or count random ones. Some of them are invalid on purpose.
+    """
+    rand = random.Random(seed)
+
+    def names(items, max_items):
+        out = [[]]
+        for n in range(1, max_items + 1):
+            for combo in itertools.combinations(items, n):
+                out.append([x['short_name'] for x in combo])
+                out.append([x['name'] for x in combo])
+        return out
+
+    def marking(lvl, req, groups, subgroups):
+        out = lvl
+        if req:
+            out += "//" + "/".join(req)
+        if groups:
+            out += "//REL TO " + ", ".join(groups)
+        if subgroups:
+            out += ("/" if groups else "//") + "/".join(subgroups)
+        return out
+
+    levels = [x['short_name'] for x in definition['levels']] + [x['name'] for x in definition['levels']] + \
+        [a for x in definition['levels'] for a in x.get('aliases', [])]
+    required = names(definition['required'], 2) + [['LAW'], ['CC']]
+    groups = names(definition['groups'][:6], 2) + [['DEPTS'], ['ANY'], ['UNKNOWN']]
+    subgroups = names(definition['subgroups'][:5], 2) + [['SOLO']]
+
+    if count is None:
+        return [marking(*parts) for parts in itertools.product(levels, required, groups, subgroups)]
+
+    all_groups = definition['groups']
+    all_subgroups = definition['subgroups']
+    out = []
+    for _ in range(count):
+        lvl = rand.choice(levels)
+        req = rand.choice(required)
+        grp = [x['short_name'] for x in rand.sample(all_groups, rand.randint(0, min(3, len(all_groups))))]
+        sub = [x['short_name'] for x in rand.sample(all_subgroups, rand.randint(0, min(2, len(all_subgroups))))]
+        out.append(marking(lvl, req, grp, sub))
+    return out
@@ -0,0 +1,91 @@
+import asyncio
+
+try:
+    import pytest
+
+    from assemblyline_client import get_async_client
+    from conftest import UI_HOST
+    from utils import random_id_from_collection
+except ImportError:
+    import pytest
+    import sys
+    if sys.version_info < (3, 0):
+        pytestmark = pytest.mark.skip
+    else:
+        raise
+
+
+def _run(coro_func):
+    async def _with_client():
+        async with await get_async_client(UI_HOST, auth=('admin', 'admin'), verify=False, retries=1) as client:
+            return await coro_func(client)
+
+    return asyncio.run(_with_client())
+
+
+def test_file_info(datastore):
+    file_id = random_id_from_collection(datastore, 'file')
+
+    async def _test(client):
+        return await client.file.info(file_id)
+
+    res = _run(_test)
+    assert res['sha256'] == file_id
+
+
+def test_concurrent_calls(datastore):
+    file_ids = [random_id_from_collection(datastore, 'file') for _ in range(10)]
+
+    async def _test(client):
+        return await asyncio.gather(*[client.file.info(file_id) for file_id in file_ids])
+
+    res = _run(_test)
+    assert [x['sha256'] for x in res] == file_ids
+
+
+def test_search_stream(datastore):
+    async def _test(client):
+        return [x async for x in client.search.stream.file("id:*", fl="id")]
+
+    res = _run(_test)
+    assert len(res) == datastore.file.search("id:*", rows=0)['total']
+
+
+def test_ontology(datastore):
+    submission_id = random_id_from_collection(datastore, 'submission')
+
+    async def _test(client):
+        return await client.ontology.submission(submission_id)
+
+    res = _run(_test)
+    assert isinstance(res, list)
+
+
+def test_submission_wait(datastore):
+    completed = datastore.submission.search('state:completed', rows=5, fl='sid', as_obj=False)['items']
+    sids = [x['sid'] for x in completed]
+
+    async def _test(client):
+        return [x async for x in client.submission.wait(sids, timeout=30, poll_interval=0.5)]
+
+    res = _run(_test)
+    assert sorted(x['sid'] for x in res) == sorted(sids)
+
+
+def test_pool_stats(datastore):
+    file_ids = [random_id_from_collection(datastore, 'file') for _ in range(10)]
+
+    async def _test(client):
+        res = [x async for x in client.bulk.file_info(file_ids, concurrency=4)]
+        return res, client.get_pool_stats()
+
+    res, stats = _run(_test)
+    assert len(res) == 10
+    assert len(stats) == 1
+    assert stats[0]['maxsize'] == 10
+
+    # The connection counts come from httpx internals and are left out when they are not available
+    if 'in_use' not in stats[0]:
+        pytest.skip("The connection pools of this httpx version cannot be inspected")
+    assert stats[0]['in_use'] == 0
+    assert 1 <= stats[0]['idle'] <= 4
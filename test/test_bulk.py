@@ -0,0 +1,46 @@
+try:
+    from utils import random_id_from_collection
+except ImportError:
+    import pytest
+    import sys
+    if sys.version_info < (3, 0):
+        pytestmark = pytest.mark.skip
+    else:
+        raise
+
+
+def test_file_info(datastore, client):
+    file_ids = {random_id_from_collection(datastore, 'file') for _ in range(10)}
+
+    res = list(client.bulk.file_info(file_ids, concurrency=4))
+    assert {key for key, _, _ in res} == file_ids
+    for key, result, error in res:
+        assert error is None
+        assert result['sha256'] == key
+
+
+def test_file_score_errors(datastore, client):
+    file_id = random_id_from_collection(datastore, 'file')
+
+    res = {key: (result, error) for key, result, error in client.bulk.file_score([file_id, "0" * 64])}
+    assert res[file_id][1] is None
+    assert res["0" * 64][0] is None
+    assert res["0" * 64][1].status_code == 404
+
+
+def test_badlist(datastore, client):
+    badlist_id = random_id_from_collection(datastore, 'badlist')
+
+    res = list(client.bulk.badlist([badlist_id]))
+    assert res[0][0] == badlist_id
+    assert res[0][1] == datastore.badlist.get(badlist_id, as_obj=False)
+    assert res[0][2] is None
+
+
+def test_safelist(datastore, client):
+    safelist_id = random_id_from_collection(datastore, 'safelist')
+
+    res = list(client.bulk.safelist([safelist_id]))
+    assert res[0][0] == safelist_id
+    assert res[0][1] == datastore.safelist.get(safelist_id, as_obj=False)
+    assert res[0][2] is None
@@ -0,0 +1,167 @@
+import random
+
+import pytest
+
+try:
+    from assemblyline_client.common.classification import Classification, InvalidClassification, InvalidDefinition
+    from assemblyline_client.common.classification_cache import ClassificationCache
+    from classification_definition import get_definition, get_markings
+except ImportError:
+    import sys
+    if sys.version_info < (3, 0):
+        pytestmark = pytest.mark.skip
+    else:
+        raise
+
+USER = "TLP:A//CMR/LE//REL TO D1, D3/T1/T2"
+USERS = [USER, "TLP:A+S//CMR/LE/CTL//REL TO D1, D2, D3, INT/T1/T2/RSV", "TLP:G//REL TO D2", "TLP:C"]
+
+
+def _call(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except InvalidClassification as e:
+        return 'InvalidClassification: %s' % e
+
+
+def _results(engine, user, c12n):
+    return (
+        _call(engine.normalize_classification, c12n),
+        _call(engine.normalize_classification, c12n, long_format=False),
+        _call(engine.is_accessible, user, c12n),
+        _call(engine.max_classification, user, c12n),
+        _call(engine.max_classification, c12n, user, long_format=False),
+        _call(engine.min_classification, user, c12n),
+        _call(engine.min_classification, c12n, user, long_format=False),
+        engine.is_valid(c12n),
+    )
+
+
+@pytest.fixture(scope='module')
+def markings():
+    return random.Random(1).sample(get_markings(get_definition()), 2000)
+
+
+def test_parts_cache(markings):
+    cached = Classification(get_definition(), compiled=False)
+    uncached = Classification(get_definition(), parts_cache_size=0, compiled=False)
+
+    # Second pass is served from the cache
+    for _ in range(2):
+        for c12n in markings:
+            assert _results(cached, USER, c12n) == _results(uncached, USER, c12n), c12n
+
+    stats = cached.get_cache_stats()
+    assert stats['hits'] > stats['misses'] > 0
+    assert uncached.get_cache_stats()['entries'] == 0
+
+    # Cached parts are not shared with the callers
+    _, _, groups, _ = cached._get_classification_parts(USER)
+    groups.append('D2')
+    assert cached._get_classification_parts(USER)[2] == ['DEPARTMENT 1', 'DEPARTMENT 3']
+
+
+def test_parts_cache_bounded():
+    engine = Classification(get_definition(), parts_cache_size=16)
+    for c12n in get_markings(get_definition())[:500]:
+        _call(engine.normalize_classification, c12n)
+    assert engine.get_cache_stats()['entries'] <= 16
+
+
+@pytest.mark.parametrize("dynamic_groups", [False, True])
+def test_compiled(markings, dynamic_groups):
+    definition = get_definition()
+    definition['dynamic_groups'] = dynamic_groups
+    compiled = Classification(definition)
+    reference = Classification(definition, parts_cache_size=0, compiled=False)
+
+    for c12n in markings:
+        for user in USERS + markings[:5]:
+            assert _results(compiled, user, c12n) == _results(reference, user, c12n), (user, c12n)
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_many(markings, compiled):
+    engine = Classification(get_definition(), compiled=compiled)
+    reference = Classification(get_definition(), parts_cache_size=0, compiled=False)
+    batch = [None, "TLP:C//REL TO UNKNOWN"] + [random.Random(2).choice(markings[:100]) for _ in range(1000)]
+
+    for user in USERS:
+        assert engine.is_accessible_many(user, batch, ignore_invalid=True) == \
+            [reference.is_accessible(user, c12n, ignore_invalid=True) for c12n in batch]
+    with pytest.raises(InvalidClassification):
+        engine.is_accessible_many(USER, batch)
+
+    valid = [c12n for c12n in markings if reference.is_valid(c12n)]
+    assert engine.normalize_many(valid + valid, long_format=False) == \
+        [reference.normalize_classification(c12n, long_format=False) for c12n in valid + valid]
+
+    assert engine.max_classification_many([]) is None
+    assert engine.max_classification_many([None, "tlp:c"]) == "tlp:c"
+    for size in (2, 3, 5):
+        for i in range(0, 200, size):
+            chunk = valid[i:i + size] + [None]
+            expected = chunk[0]
+            try:
+                for c12n in chunk[1:]:
+                    expected = reference.max_classification(expected, c12n, long_format=False)
+            except InvalidClassification:
+                with pytest.raises(InvalidClassification):
+                    engine.max_classification_many(chunk, long_format=False)
+            else:
+                assert engine.max_classification_many(chunk, long_format=False) == expected, chunk
+
+
+def test_dumps_loads(markings):
+    definition = get_definition(extra_groups=20)
+    engine = Classification(definition)
+    loaded = Classification.loads(engine.dumps())
+    assert loaded.UNRESTRICTED == engine.UNRESTRICTED
+    assert loaded.RESTRICTED == engine.RESTRICTED
+    for c12n in markings[:500]:
+        assert _results(loaded, USER, c12n) == _results(engine, USER, c12n), c12n
+
+    with pytest.raises(InvalidDefinition):
+        Classification.loads(engine.dumps(), definition_hash='0' * 64)
+    with pytest.raises(InvalidDefinition):
+        Classification.loads(b'{"format": 0}')
+
+
+def test_group_aliases():
+    engine = Classification(get_definition(extra_groups=4))
+    loaded = Classification.loads(engine.dumps())
+    for c12n, expected in [
+        ('TLP:A//REL TO D1, D2', 'TLP:A//REL DEPTS'),
+        ('TLP:A//REL TO DEPARTMENT 2, D1/T1', 'TLP:A//REL DEPTS/T1'),
+        ('TLP:A//REL TO PAIR001', 'TLP:A//REL D1, G002, G003'),
+    ]:
+        assert engine.normalize_classification(c12n, long_format=False) == expected
+        assert loaded.normalize_classification(c12n, long_format=False) == expected
+
+    assert engine.normalize_classification('TLP:A//REL TO D1, D2') == 'TLP:AMBER//REL TO DEPARTMENT 1, DEPARTMENT 2'
+
+
+def test_classification_cache(tmpdir):
+    server = 'https://localhost:443'
+    cache = ClassificationCache(str(tmpdir), max_age=60)
+    assert cache.lookup(server) is None
+
+    engine = cache.store(server, get_definition())
+    assert cache.lookup(server) is engine
+
+    # Another process loads the compiled engine from disk
+    other = ClassificationCache(str(tmpdir), max_age=60)
+    loaded = other.lookup(server)
+    assert loaded is not None and loaded is not engine
+    assert loaded.normalize_classification(USER) == engine.normalize_classification(USER)
+
+    # An expired definition is fetched again but the engine is only rebuilt when it changed
+    expired = ClassificationCache(str(tmpdir), max_age=-1)
+    assert expired.lookup(server) is None
+    expired.store(server, get_definition())
+    assert expired.get_stats()['builds'] == 0
+    expired.store(server, get_definition(extra_groups=2))
+    assert expired.get_stats()['builds'] == 1
+
+    other.invalidate(server)
+    assert other.lookup(server) is None
@@ -0,0 +1,185 @@
+try:
+    import json
+    import time
+
+    import pytest
+
+    from assemblyline_client import CircuitBreaker, CircuitOpenError, ClientError, RateLimiter, ResponseCache, \
+        RetryPolicy, get_client
+    from assemblyline_client.v4_client.common.json_stream import JSONStreamParser
+    from conftest import UI_HOST
+    from utils import random_id_from_collection
+except ImportError:
+    import pytest
+    import sys
+    if sys.version_info < (3, 0):
+        pytestmark = pytest.mark.skip
+    else:
+        raise
+
+
+def test_pool_settings(datastore):
+    client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, retries=1,
+                        pool_maxsize=4, pool_block=True)
+    file_ids = [random_id_from_collection(datastore, 'file') for _ in range(10)]
+
+    res = list(client.bulk.file_info(file_ids, concurrency=8))
+    assert len(res) == 10
+
+    stats = client.get_pool_stats()
+    assert len(stats) == 1
+    assert stats[0]['maxsize'] == 4
+    assert stats[0]['in_use'] == 0
+    assert 1 <= stats[0]['idle'] <= 4
+    assert stats[0]['requests'] >= 10
+
+
+def test_retry_policy(datastore):
+    retries = []
+    policy = RetryPolicy(max_retries=2, base_delay=0.01, retry_statuses={404: None}, on_retry=retries.append)
+    client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, retry_policy=policy)
+
+    file_id = random_id_from_collection(datastore, 'file')
+    assert client.file.info(file_id)['sha256'] == file_id
+    assert retries == []
+
+    try:
+        client.file.info('0' * 64)
+        assert False, "Request should have given up"
+    except ClientError as e:
+        assert e.status_code == 429
+
+    assert [r['attempt'] for r in retries] == [1, 2]
+    assert all(r['status_code'] == 404 for r in retries)
+    assert policy.counts == {404: 2}
+
+
+def test_circuit_breaker(datastore):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, retries=1, circuit_breaker=breaker)
+    file_id = random_id_from_collection(datastore, 'file')
+
+    # Client errors do not trip the circuit
+    for _ in range(3):
+        try:
+            client.file.info('0' * 64)
+        except ClientError as e:
+            assert e.status_code == 404
+    assert breaker.get_states()['api/v4/file/info']['state'] == 'closed'
+
+    # Two requests that got no response open the circuit
+    for _ in range(2):
+        breaker.after_request('api/v4/file/info', None)
+
+    try:
+        client.file.info(file_id)
+        assert False, "Circuit should be open"
+    except CircuitOpenError as e:
+        assert e.prefix == 'api/v4/file/info'
+        assert e.status_code == 503
+
+    # Other API paths are not affected
+    assert client.file.score(file_id)['file_info']['sha256'] == file_id
+
+    breaker.reset('api/v4/file/info')
+    assert client.file.info(file_id)['sha256'] == file_id
+
+
+def test_rate_limiter(datastore):
+    limiter = RateLimiter(window=1, burst=1, api_rate=10)
+    client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, rate_limiter=limiter)
+    file_ids = [random_id_from_collection(datastore, 'file') for _ in range(6)]
+
+    start = time.time()
+    res = list(client.bulk.file_info(file_ids, concurrency=6))
+    assert len(res) == 6
+    assert time.time() - start >= 0.5
+
+    stats = limiter.get_stats()
+    assert stats['api']['waits'] >= 5
+    assert stats['submission']['waits'] == 0
+
+
+def test_rate_limiter_quota_recovers():
+    limiter = RateLimiter(window=1, burst=2)
+
+    # An exhausted quota holds the calls until the next window instead of refusing them for good
+    limiter.update(0, None)
+    delay = limiter.acquire('api/v4/file/info/')
+    assert 0 < delay <= 1
+    assert limiter.acquire('api/v4/file/info/') == pytest.approx(delay, abs=0.01)
+    time.sleep(delay)
+    assert limiter.acquire('api/v4/file/info/') == 0.0
+
+    # The server reporting the quota again lifts the wait right away
+    limiter.update(0, None)
+    assert limiter.acquire('api/v4/submit/') > 0
+    limiter.update(1000, 1000)
+    assert limiter.acquire('api/v4/submit/') < 0.01
+
+
+def test_response_cache(datastore):
+    cache = ResponseCache(max_entries=2)
+    client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, retries=1, response_cache=cache)
+    file_id = random_id_from_collection(datastore, 'file')
+
+    first = client.file.info(file_id)
+    first['sha256'] = None
+    assert client.file.info(file_id)['sha256'] == file_id
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+    # Endpoints without a TTL are never cached
+    client.file.score(file_id)
+    client.file.score(file_id)
+    assert cache.get_stats()['hits'] == 1
+
+    with cache.bypass():
+        assert client.file.info(file_id)['sha256'] == file_id
+    assert cache.get_stats()['hits'] == 1
+
+    cache.invalidate('api/v4/file/info/')
+    assert cache.get_stats()['entries'] == 0
+    client.file.info(file_id)
+    assert cache.get_stats()['misses'] == 2
+
+    # Responses cached for a user are not served on behalf of another one
+    client.set_obo_token('token')
+    try:
+        client.file.info(file_id)
+    except ClientError:
+        pass
+    finally:
+        client.clear_obo_token()
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 3
+
+
+def test_json_stream_parser():
+    response = {'sid': 'abc', 'results': {'r1': {'score': 1.5e3}, 'r2': None}, 'errors': ['e1', '\u2603'],
+                'files': [], 'params': {'classification': 'TLP:C'}}
+    content = json.dumps({'api_response': response, 'api_status_code': 200}, ensure_ascii=False).encode()
+
+    # Chunks of a single byte cut the numbers, strings and multi-byte characters
+    for size in (1, 7, len(content)):
+        parser = JSONStreamParser([('api_response', 'results'), ('api_response', 'errors')])
+        items = []
+        for i in range(0, len(content), size):
+            items.extend(parser.feed(content[i:i + size]))
+        items.extend(parser.close())
+
+        assert items == [
+            (('api_response', 'sid'), 'abc'),
+            (('api_response', 'results', 'r1'), {'score': 1.5e3}),
+            (('api_response', 'results', 'r2'), None),
+            (('api_response', 'errors', 0), 'e1'),
+            (('api_response', 'errors', 1), '\u2603'),
+            (('api_response', 'files'), []),
+            (('api_response', 'params'), {'classification': 'TLP:C'}),
+            (('api_status_code',), 200),
+        ]
+
+    parser = JSONStreamParser([('api_response', 'results')])
+    parser.feed(content[:-1])
+    with pytest.raises(ClientError, match="Incomplete"):
+        parser.close()
@@ -1,8 +1,12 @@
 import hashlib
 import os
+import shutil
+import tempfile
 
 try:
     import cart
+    from assemblyline_client import ContentCache, get_client
+    from conftest import UI_HOST
     from utils import random_id_from_collection
 except ImportError:
     import pytest
@@ -92,6 +96,32 @@ def test_download_to_file_handle(datastore, client):
     finally:
         os.unlink(download_output)
 
+
+# noinspection PyUnusedLocal
+def test_download_content_cache(datastore):
+    file_id = random_id_from_collection(datastore, 'file')
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = ContentCache(cache_dir)
+        cache_client = get_client(UI_HOST, auth=('admin', 'admin'), verify=False, retries=1, content_cache=cache)
+
+        res = cache_client.file.download(file_id, encoding="raw")
+        assert hashlib.sha256(res).hexdigest() == file_id
+        assert cache.get_stats()['misses'] == 1
+
+        assert cache_client.file.download(file_id, encoding="raw") == res
+        download_output = os.path.join(cache_dir, 'output')
+        cache_client.file.download(file_id, encoding="raw", output=download_output)
+        assert open(download_output, 'rb').read() == res
+        assert cache.get_stats()['hits'] == 2
+
+        assert cache_client.file.download(file_id)[:4] == b"CART"
+        assert cache_client.file.download(file_id)[:4] == b"CART"
+        assert cache.get_stats()['hits'] == 3
+    finally:
+        shutil.rmtree(cache_dir)
+
+
 # noinspection PyUnusedLocal
 def test_delete_from_filestore(datastore, filestore, client):
     file_id = random_id_from_collection(datastore, 'file')
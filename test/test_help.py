@@ -1,3 +1,5 @@
+from assemblyline_client import ClassificationCache
+
 
 def test_classification_definition(client):
     res = client.help.classification_definition()
@@ -5,6 +7,18 @@ def test_classification_definition(client):
     assert "UNRESTRICTED" in res
 
 
+def test_classification_engine_cache(client, tmpdir):
+    cache = ClassificationCache(str(tmpdir))
+    client._connection.classification_cache = cache
+    try:
+        engine = client.get_classification_engine()
+        assert client.get_classification_engine() is engine
+        assert cache.get_stats() == {'engines': 1, 'hits': 1, 'misses': 1, 'builds': 1}
+        assert engine.UNRESTRICTED == client.get_classification_engine().UNRESTRICTED
+    finally:
+        client._connection.classification_cache = None
+
+
 def test_configuration(client):
     res = client.help.configuration()
     assert "services.categories" in res
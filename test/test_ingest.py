@@ -1,3 +1,7 @@
+import hashlib
+import json
+import os
+import shutil
 import tempfile
 
 from io import BytesIO
@@ -119,3 +123,58 @@ def test_ingest_url(datastore, client):
     url = 'https://raw.githubusercontent.com/CybercentreCanada/assemblyline-ui/master/README.md'
     res = client.ingest(url=url, params={"deep_scan": True, "ignore_cache": True, "priority": 100})
     assert res.get('ingest_id', None) is not None
+
+
+def test_ingest_bulk(datastore, client):
+    tmp_dir = tempfile.mkdtemp()
+    paths = []
+    for i in range(5):
+        paths.append(os.path.join(tmp_dir, "test_ingest_bulk_{}".format(i)))
+        with open(paths[-1], 'wb') as test_file:
+            test_file.write(get_random_phrase(wmin=15, wmax=50).encode() + str(i).encode())
+    missing = os.path.join(tmp_dir, "missing")
+    checkpoint = os.path.join(tmp_dir, "checkpoint")
+
+    try:
+        res = list(client.ingest.bulk(paths[:3] + [missing], workers=2, retry_delay=0, checkpoint=checkpoint))
+        assert len(res) == 4
+        for outcome in res:
+            if outcome.source == missing:
+                assert isinstance(outcome.error, FileNotFoundError)
+            else:
+                assert outcome.error is None
+                assert outcome.ingest_id is not None
+                with open(outcome.source, 'rb') as fh:
+                    assert outcome.sha256 == hashlib.sha256(fh.read()).hexdigest()
+
+        # Sources recorded in the checkpoint are not sent again
+        res = list(client.ingest.bulk(paths, workers=2, checkpoint=checkpoint))
+        assert sorted(outcome.source for outcome in res) == paths[3:]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_ingest_bulk_interrupted_checkpoint(datastore, client):
+    tmp_dir = tempfile.mkdtemp()
+    paths = []
+    for i in range(2):
+        paths.append(os.path.join(tmp_dir, "test_ingest_bulk_{}".format(i)))
+        with open(paths[-1], 'wb') as test_file:
+            test_file.write(get_random_phrase(wmin=15, wmax=50).encode() + str(i).encode())
+
+    # A run killed while writing its checkpoint leaves a partial last line
+    checkpoint = os.path.join(tmp_dir, "checkpoint")
+    with open(checkpoint, 'w') as fh:
+        fh.write(json.dumps({'key': paths[0], 'ingest_id': 'done', 'sha256': None}) + '\n')
+        fh.write('{"key": "' + paths[1][:5])
+
+    try:
+        res = list(client.ingest.bulk(paths, workers=2, checkpoint=checkpoint))
+        assert [outcome.source for outcome in res] == paths[1:]
+
+        with open(checkpoint) as fh:
+            assert [json.loads(line)['key'] for line in fh] == paths
+
+        assert list(client.ingest.bulk(paths, workers=2, checkpoint=checkpoint)) == []
+    finally:
+        shutil.rmtree(tmp_dir)
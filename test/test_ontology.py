@@ -58,6 +58,21 @@ def test_get_ontology_for_submission(datastore, client):
     assert any([record['file']['sha256'] == submission_data['files'][0]['sha256'] for record in res])
 
 
+def test_get_ontology_for_submission_iterate(datastore, client):
+    sid = random_id_from_collection(datastore, 'submission')
+    records = client.ontology.submission(sid)
+
+    res = client.ontology.submission(sid, iterate=True)
+    assert not isinstance(res, list)
+    assert list(res) == records
+
+    service = records[0]['service']['name']
+    res = list(client.ontology.submission(sid, iterate=True, fields=['file.sha256', 'service.name'],
+                                          filter=lambda r: r['service']['name'] == service))
+    assert res == [{'file': {'sha256': r['file']['sha256']}, 'service': {'name': service}}
+                   for r in records if r['service']['name'] == service]
+
+
 def test_get_ontology_for_submission_raw(datastore, client):
     sid = random_id_from_collection(datastore, 'submission')
 
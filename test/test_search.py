@@ -50,6 +50,12 @@ def test_heuristic(datastore, client):
     assert res['total'] > 1
 
 
+def test_iter_items(datastore, client):
+    res = client.search.file("id:*", rows=100, sort="id asc", fl="id")
+    items = list(client.search.iter_items('file', "id:*", rows=100, sort="id asc", fl="id"))
+    assert items == res['items']
+
+
 def test_result(datastore, client):
     result_id = random_id_from_collection(datastore, 'result')
     res = client.search.result("id:{}".format(result_id), fl="id")
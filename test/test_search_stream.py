@@ -1,4 +1,7 @@
 
+from assemblyline_client.v4_client.module.search.stream import hash_prefix_slices
+
+
 def _compare_values(a, b):
     assert len(a) == len(b)
     for idx, item_a in enumerate(a):
@@ -59,3 +62,27 @@ def test_workflow(datastore, client):
     res = sorted([x for x in client.search.stream.workflow("id:*")], key=lambda k: k['id'])
     assert len(res) > 0
     _compare_values(res, sorted(list(datastore.workflow.stream_search("id:*", as_obj=False)), key=lambda k: k['id']))
+
+
+def test_parallel_file(datastore, client):
+    res = sorted([x for x in client.search.stream.parallel("file", "id:*", hash_prefix_slices(), workers=4,
+                                                           page_size=10, max_queued=20)], key=lambda k: k['id'])
+    assert len(res) > 0
+    _compare_values(res, sorted(list(datastore.file.stream_search("id:*", as_obj=False)), key=lambda k: k['id']))
+
+
+def test_stream_stats(datastore, client):
+    stream = client.search.stream.file("id:*", fl="id")
+    res = list(stream)
+    assert len(res) > 0
+    assert stream.stats.completed
+    assert stream.stats.items == len(res)
+    assert stream.stats.pages >= 1
+
+
+def test_stream_early_close(datastore, client):
+    stream = client.search.stream.file("id:*", fl="id")
+    next(stream)
+    stream.close()
+    assert not stream.stats.completed
+    assert stream.stats.items == 1
@@ -19,6 +19,7 @@ try:
     from assemblyline.remote.datatypes.queues.named import NamedQueue
 
     from assemblyline_client.v4_client.common.utils import get_random_id
+    from assemblyline_client.v4_client.module.socketio import SubmissionWatcher
 except (ImportError, SyntaxError):
     import sys
     if sys.version_info < (3, 0):
@@ -171,6 +172,45 @@ def test_submission_ingested(datastore, client):
             pytest.fail("{} failed.".format(test))
 
 
+def test_watch_submissions(datastore, client):
+    submission_queue = CommsQueue('submissions', private=True)
+
+    completed = random_model_obj(SubmissionMessage).as_primitives()
+    completed['msg_type'] = "SubmissionCompleted"
+    started = random_model_obj(SubmissionMessage).as_primitives()
+    started['msg_type'] = "SubmissionStarted"
+
+    test_res_array = []
+    watcher = client.socketio.watch_submissions(test_res_array.append)
+    try:
+        assert watcher.wait_connected(timeout=10)
+        submission_queue.publish(started)
+        submission_queue.publish(completed)
+
+        end = time.time() + 5
+        while not test_res_array and time.time() < end:
+            time.sleep(0.1)
+    finally:
+        watcher.stop()
+
+    assert not watcher.connected.is_set()
+    assert test_res_array == [completed['msg']]
+
+
+def test_watch_submissions_refused(datastore, client):
+    # A refused connection stops the watcher instead of being retried forever
+    watcher = SubmissionWatcher(client.socketio._server, {"Cookie": "session=invalid"}, lambda _: None,
+                                reconnect_delay=0.1).start()
+    try:
+        watcher._thread.join(timeout=10)
+        assert not watcher._thread.is_alive()
+    finally:
+        watcher.stop()
+
+    assert not watcher.connected.is_set()
+    assert watcher.error.status_code == 403
+
+
 def test_watch_queue_messages(datastore, client):
     wq_data = {'wq_id': get_random_id()}
     wq = NamedQueue(wq_data['wq_id'], private=True)
@@ -1,5 +1,6 @@
 
 try:
+    from assemblyline_client import ClientError
     from utils import random_id_from_collection
 except ImportError:
     import pytest
@@ -45,6 +46,24 @@ def test_full_submission(datastore, client):
     assert 'errors' in res
 
 
+def test_full_submission_incremental(datastore, client):
+    submission_id = random_id_from_collection(datastore, 'submission', q="file_count:[2 TO *]")
+    full = client.submission.full(submission_id)
+
+    res = {}
+    for path, value in client.submission.full(submission_id, incremental=True):
+        if path[0] in ('results', 'file_infos'):
+            res.setdefault(path[0], {})[path[1]] = value
+        elif path[0] in ('errors', 'files'):
+            assert path[1] == len(res.setdefault(path[0], []))
+            res[path[0]].append(value)
+        else:
+            assert len(path) == 1
+            res[path[0]] = value
+
+    assert res == full
+
+
 def test_is_completed(datastore, client):
     submission_id = random_id_from_collection(datastore, 'submission')
     submissison_data = datastore.submission.get(submission_id)
@@ -53,6 +72,14 @@ def test_is_completed(datastore, client):
     assert res == (submissison_data.state == 'completed')
 
 
+def test_is_completed_many(datastore, client):
+    completed = datastore.submission.search('state:completed', rows=5, fl='sid', as_obj=False)['items']
+    sids = [x['sid'] for x in completed]
+
+    res = client.submission.is_completed_many(sids + ['missing_sid'])
+    assert sorted(res) == sorted(sids)
+
+
 def test_list(datastore, client):
     res = client.submission.list()
     assert res['total'] == datastore.submission.search('id:*', rows=0)['total']
@@ -109,3 +136,17 @@ def test_tree(datastore, client):
     for k in ['classification', 'filtered', 'tree']:
         assert k in res
     assert submission_data.files[0].sha256 in res['tree']
+
+
+def test_wait(datastore, client):
+    completed = datastore.submission.search('state:completed', rows=5, fl='sid', as_obj=False)['items']
+    sids = [x['sid'] for x in completed]
+
+    res = list(client.submission.wait(sids, timeout=30, push=False, poll_interval=0.5))
+    assert sorted(x['sid'] for x in res) == sorted(sids)
+
+    try:
+        list(client.submission.wait(['missing_sid'], timeout=1, push=False, poll_interval=0.5))
+        assert False, "Waiting should have timed out"
+    except ClientError as e:
+        assert e.status_code == 408
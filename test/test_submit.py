@@ -1,3 +1,4 @@
+import hashlib
 import os
 import tempfile
 
@@ -8,6 +9,7 @@ try:
     from assemblyline.common.uid import get_random_id
     from assemblyline.odm.randomizer import get_random_phrase
 
+    from assemblyline_client import ClientError
     from utils import random_id_from_collection
 
     config = forge.get_config()
@@ -71,6 +73,58 @@ def test_submit_path(datastore, client):
     assert res == datastore.submission.get(res['sid'], as_obj=False)
 
 
+def test_submit_path_progress(datastore, client):
+    content = os.urandom(1024 * 1024)
+    test_path = "/tmp/test_submit_{}.bin".format(get_random_id())
+    with open(test_path, 'wb') as test_file:
+        test_file.write(content)
+
+    progress = []
+    try:
+        res = client.submit(path=test_path, progress=lambda sent, total: progress.append((sent, total)))
+    finally:
+        os.unlink(test_path)
+    assert res is not None
+    assert res['files'][0]['size'] == len(content)
+    assert len(progress) > 1
+    assert progress[-1][0] == progress[-1][1] > len(content)
+
+
+def test_submit_hash_first(datastore, client):
+    file_id = random_id_from_collection(datastore, 'file')
+    content = client.file.download(file_id, encoding="raw")
+    fname = "test_submit_{}.bin".format(get_random_id())
+
+    res = client.submit(content=content, fname=fname, hash_first=True)
+    assert res['files'][0]['sha256'] == file_id
+    assert res['files'][0]['name'] == fname
+    assert file_id in client._connection.known_hashes
+
+    # Files the server does not have are still uploaded
+    new_content = get_random_phrase(wmin=15, wmax=50).encode() + get_random_id().encode()
+    res = client.submit(content=new_content, fname=fname, hash_first=True)
+    assert res['files'][0]['sha256'] == hashlib.sha256(new_content).hexdigest()
+
+
+def test_submit_hash_first_lookup_error(datastore, client, monkeypatch):
+    file_id = random_id_from_collection(datastore, 'file')
+    content = client.file.download(file_id, encoding="raw")
+    client._connection.known_hashes.discard(file_id)
+
+    # A file the user cannot look up is uploaded instead of failing the submission
+    get = client._connection.get
+
+    def forbidden_file_info(path, *args, **kw):
+        if path.startswith('api/v4/file/info/'):
+            raise ClientError("Forbidden", 403)
+        return get(path, *args, **kw)
+
+    monkeypatch.setattr(client._connection, 'get', forbidden_file_info)
+    res = client.submit(content=content, fname="test_submit_{}.bin".format(get_random_id()), hash_first=True)
+    assert res['files'][0]['sha256'] == file_id
+    assert file_id not in client._connection.known_hashes
+
+
 def test_submit_sha(datastore, client):
     file_id = random_id_from_collection(datastore, 'file')
     metadata = {"file_id": get_random_id(), "comment": "test"}
@@ -2,8 +2,11 @@ import os
 import re
 import sys
 
+from threading import Event
+
 try:
-    from assemblyline_client.submit import _main
+    from assemblyline_client.submit import FileFilter, SubmitJournal, SubmitPipeline, _main, iter_input_paths, \
+        parse_size
     from assemblyline_client.v4_client.common.submit_utils import al_result_to_text
     from utils import random_id_from_collection
     from io import StringIO
@@ -28,6 +31,118 @@ def test_submit(datastore):
     sys.stderr = old_stderr
 
 
+def test_submit_jobs(datastore):
+    old_stderr = sys.stderr
+    sys.stderr = mystderr = StringIO()
+
+    test_files = [os.path.join(os.path.dirname(__file__), name) for name in ('test_user.py', 'test_file.py')]
+    res = _main(['-a', '-n', '-i', '-u', 'admin', '-p', 'admin', '--jobs', '2'] + test_files)
+    stderr = mystderr.getvalue()
+    assert re.search(r'Sending file .*test_user.py for analysis\.\.\.\n', stderr) is not None
+    assert re.search(r'Sending file .*test_file.py for analysis\.\.\.\n', stderr) is not None
+    assert res == 0
+
+    sys.stderr = old_stderr
+
+
+def test_input_filters(tmpdir):
+    for name, size in (('a/x.exe', 10), ('a/y.log', 10), ('a/b/empty.exe', 0), ('a/b/big.exe', 5000)):
+        tmpdir.join(name).write_binary(b'x' * size, ensure=True)
+
+    errors = []
+    paths = list(iter_input_paths([str(tmpdir), str(tmpdir.join('missing'))], errors))
+    assert len(paths) == 4
+    assert errors == [str(tmpdir.join('missing'))]
+
+    file_filter = FileFilter(include=['*.exe'], max_size=parse_size('1k'), skip_empty=True)
+    assert [os.path.basename(p) for p in file_filter.filter(paths)] == ['x.exe']
+    assert file_filter.skipped == 3
+    assert parse_size('10M') == 10 * 1024 * 1024
+
+
+def test_state_journal(tmpdir):
+    path = str(tmpdir.join('state.db'))
+    journal = SubmitJournal(path)
+    journal.record('id1', 'completed', sid='sid1')
+    assert journal.get('id1') is None
+
+    journal.record('id1', 'submitted', path='/tmp/file1', sha256='a' * 64)
+    journal.record('id1', 'done', sid='sid1')
+    journal.record('id1', 'completed')
+    journal.set_value('nq', 'al_submit_test')
+    journal.close()
+
+    journal = SubmitJournal(path)
+    assert journal.get('id1') == {'path': '/tmp/file1', 'sha256': 'a' * 64, 'sid': 'sid1', 'status': 'done'}
+    assert journal.get_value('nq') == 'al_submit_test'
+    journal.close()
+
+
+def test_submit_resume(datastore, tmpdir):
+    old_stderr = sys.stderr
+    sys.stderr = mystderr = StringIO()
+
+    test_file = os.path.join(os.path.dirname(__file__), 'test_user.py')
+    arguments = ['-a', '-n', '-i', '-u', 'admin', '-p', 'admin', '--state', str(tmpdir.join('state.db')), test_file]
+    assert _main(arguments) == 0
+    assert _main(arguments) == 0
+    stderr = mystderr.getvalue()
+    assert len(re.findall(r'Sending file .*test_user.py for analysis', stderr)) == 1
+    assert re.search(r'Skipping .*test_user.py, it was already processed', stderr) is not None
+
+    sys.stderr = old_stderr
+
+
+class _NotifyingIngest(object):
+    # Ingests files and notifies their completion through the notification queue
+    def __init__(self, count):
+        self.ingested = []
+        self.notified = 0
+        self.count = count
+        self.all_ingested = Event()
+        self.ingested_first = None
+
+    def __call__(self, path=None, metadata=None, **_):
+        self.ingested.append((path, metadata['al_submit_id']))
+        if len(self.ingested) == self.count:
+            self.all_ingested.set()
+
+    def get_message_list(self, nq):
+        if self.ingested_first is None:
+            self.ingested_first = self.all_ingested.wait(10)
+        msgs = [{'submission': {'sid': 'sid_%s' % submission_id, 'files': [{'name': path}],
+                                'metadata': {'al_submit_id': submission_id}}}
+                for path, submission_id in self.ingested[self.notified:]]
+        self.notified += len(msgs)
+        return msgs
+
+
+class _NotifyingClient(object):
+    def __init__(self, count):
+        self.ingest = _NotifyingIngest(count)
+        self.submission = self
+
+    @staticmethod
+    def full(sid):
+        return {'sid': sid}
+
+
+def test_submit_async_not_throttled(tmpdir, capsys):
+    paths = []
+    for i in range(6):
+        paths.append(str(tmpdir.join('file%d' % i)))
+        tmpdir.join('file%d' % i).write_binary(b'x' * i)
+
+    # Files waiting for their analysis do not hold back the ingestion of the next ones
+    client = _NotifyingClient(len(paths))
+    pipeline = SubmitPipeline(client, None, {'verbose': False, 'json_output': True}, async_command=True,
+                              nq='al_submit_test')
+    assert pipeline.run(paths) == 0
+    assert client.ingest.ingested_first is True
+    assert sorted(p for p, _ in client.ingest.ingested) == paths
+    assert len(capsys.readouterr().out.splitlines()) == len(paths)
+
+
 def test_result_to_text(datastore, client):
     submission_id = random_id_from_collection(datastore, 'submission', q="file_count:[2 TO *]")
     data = client.submission.full(submission_id)